@@ -1,84 +1,652 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Request, Response, g, render_template, request, jsonify, stream_with_context, url_for
 import os
-import cv2
+import json
 import base64
-import tempfile
-from enGarde import analyze_engarde_pose
-from lunge import analyze_lunge_pose
+import functools
+import hashlib
+import time
+import io
+import zipfile
+from concurrent.futures import TimeoutError as InferenceTimeout
+import inference_pool
+import batch
+import criteria
+import jobs
+import landmark_archive
+import live
+import metrics
+from image_io import IMAGE_FORMATS
+from result_store import ResultStore
 
-app = Flask(__name__)
+try:
+    from flask_sock import Sock
+except ImportError:  # optional: without flask-sock there is no /live endpoint
+    Sock = None
+
+
+class AppRequest(Request):
+    # Batch uploads carry a whole session of photos, so they get their own limit
+    @property
+    def max_content_length(self):
+        if self.endpoint in ('analyze_batch', 'create_job'):
+            return app.config['BATCH_MAX_CONTENT_LENGTH']
+        return super().max_content_length
 
-# Configure upload folder
-UPLOAD_FOLDER = 'uploads'
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
 
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+app = Flask(__name__)
+app.request_class = AppRequest
+
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['BATCH_MAX_CONTENT_LENGTH'] = int(os.environ.get('BATCH_MAX_CONTENT_LENGTH', 512 * 1024 * 1024))
+app.config['INFERENCE_WORKERS'] = int(os.environ.get('INFERENCE_WORKERS', os.cpu_count() or 1))
+app.config['INFERENCE_MAX_IN_FLIGHT'] = int(os.environ.get('INFERENCE_MAX_IN_FLIGHT',
+                                                           2 * max(app.config['INFERENCE_WORKERS'], 1)))
+app.config['INFERENCE_TIMEOUT'] = float(os.environ.get('INFERENCE_TIMEOUT', 60))
+app.config['POSE_WARM_INSTANCES'] = int(os.environ.get('POSE_WARM_INSTANCES', 1))
+app.config['DEFAULT_RESPONSE_MODE'] = os.environ.get('DEFAULT_RESPONSE_MODE', 'inline')
+app.config['ANNOTATED_IMAGE_FORMAT'] = os.environ.get('ANNOTATED_IMAGE_FORMAT', 'jpeg')
+app.config['ANNOTATED_IMAGE_QUALITY'] = int(os.environ.get('ANNOTATED_IMAGE_QUALITY', 90))
+app.config['ANNOTATED_IMAGE_TTL'] = int(os.environ.get('ANNOTATED_IMAGE_TTL', 600))
+app.config['ANNOTATED_IMAGE_STORE_SIZE'] = int(os.environ.get('ANNOTATED_IMAGE_STORE_SIZE', 256))
+app.config['MAX_FENCERS'] = int(os.environ.get('MAX_FENCERS', 4))
+app.config['SERVER_TIMING'] = os.environ.get('SERVER_TIMING', 'false').lower() in ('1', 'true', 'yes')
+app.config['JOB_QUEUE_SIZE'] = int(os.environ.get('JOB_QUEUE_SIZE', 100))
+app.config['JOB_CONCURRENCY'] = int(os.environ.get('JOB_CONCURRENCY', 2))
+app.config['JOB_RESULT_TTL'] = int(os.environ.get('JOB_RESULT_TTL', 3600))
+app.config['JOB_RESULT_STORE_SIZE'] = int(os.environ.get('JOB_RESULT_STORE_SIZE', 1000))
+app.config['JOB_QUEUE_BYTES'] = int(os.environ.get('JOB_QUEUE_BYTES', 256 * 1024 * 1024))
+app.config['JOB_RESULT_STORE_BYTES'] = int(os.environ.get('JOB_RESULT_STORE_BYTES', 256 * 1024 * 1024))
+app.config['JOB_WEBHOOK_HOSTS'] = [host for host in os.environ.get('JOB_WEBHOOK_HOSTS', '').split(',') if host.strip()]
+app.config['JOB_WEBHOOK_TIMEOUT'] = float(os.environ.get('JOB_WEBHOOK_TIMEOUT', 10))
+app.config['LANDMARK_ARCHIVE_DIR'] = os.environ.get('LANDMARK_ARCHIVE_DIR') or None
+app.config['LIVE_MAX_SESSIONS'] = int(os.environ.get('LIVE_MAX_SESSIONS', 16))
+app.config['LIVE_WORKERS'] = int(os.environ.get('LIVE_WORKERS', max((os.cpu_count() or 1) // 2, 1)))
+app.config['LIVE_IDLE_TIMEOUT'] = float(os.environ.get('LIVE_IDLE_TIMEOUT', 30))
+app.config['LIVE_MAX_FRAME_BYTES'] = int(os.environ.get('LIVE_MAX_FRAME_BYTES', 1024 * 1024))
+# flask-sock's options for every WebSocket: oversized frames close the
+# connection, and pings notice browsers that vanished without closing
+app.config['SOCK_SERVER_OPTIONS'] = {'max_message_size': app.config['LIVE_MAX_FRAME_BYTES'], 'ping_interval': 25}
+
+inference_pool.configure(app.config['INFERENCE_WORKERS'], app.config['INFERENCE_MAX_IN_FLIGHT'],
+                         app.config['POSE_WARM_INSTANCES'])
+jobs.configure(app.config['JOB_QUEUE_SIZE'], app.config['JOB_CONCURRENCY'], app.config['JOB_RESULT_TTL'],
+               app.config['JOB_RESULT_STORE_SIZE'], app.config['JOB_WEBHOOK_HOSTS'],
+               app.config['JOB_WEBHOOK_TIMEOUT'], app.config['JOB_QUEUE_BYTES'], app.config['JOB_RESULT_STORE_BYTES'])
+landmark_archive.configure(app.config['LANDMARK_ARCHIVE_DIR'])
+live.configure(app.config['LIVE_MAX_SESSIONS'], app.config['LIVE_WORKERS'])
+
+# Annotated images served by /results/<id> for response=url
+annotated_images = ResultStore(app.config['ANNOTATED_IMAGE_STORE_SIZE'], app.config['ANNOTATED_IMAGE_TTL'])
+
+def create_app():
+    """
+    Application factory for WSGI servers, e.g. gunicorn 'app:create_app()'
+    Call it in each server worker after forking: it starts that worker's
+    inference pool in the background (MediaPipe is never loaded before the
+    fork), and /health/ready answers 503 until the pool is warm.
+    """
+    inference_pool.start_in_background()
+    return app
 
 @app.route('/')
 def home():
-    return render_template('index.html')
+    return render_template('index.html', stances=criteria.get().titles, live=Sock is not None,
+                           connections=live.OVERLAY_CONNECTIONS)
+
+RESPONSE_MODES = ('inline', 'url', 'binary', 'metrics')
+# 'auto' classifies the stance from the landmarks and gives feedback for it
+POSE_TYPES = tuple(criteria.get().stances) + ('auto',)
+# Speed tiers understood by pose_engine (lite/full/heavy models, or auto)
+POSE_TIERS = ('lite', 'full', 'heavy', 'auto')
+# Answers for analyses with nothing to give feedback on, by the error code
+# the worker reports; no annotated image is sent back for them
+ANALYSIS_ERRORS = {
+    'unreadable_image': 'Failed to analyze image',
+    'blank_image': 'The image is blank',
+    'no_person': 'No person detected in the image',
+    'no_pose': 'No pose detected in the image',
+}
+
+
+def _flag(name):
+    return request.values.get(name, 'false').lower() in ('1', 'true', 'yes')
+
+
+def _data_uri(data, mimetype):
+    return f'data:{mimetype};base64,{base64.b64encode(data).decode("utf-8")}'
+
+
+def _rejected(reason, message, status_code=200):
+    metrics.increment('analyze_errors_total', reason=reason)
+    return jsonify({'success': False, 'error': message, 'error_code': reason}), status_code
+
+
+def _analysis_options():
+    """
+    Read and validate the analysis options shared by /analyze and /jobs
+    (pose_type is checked here too)
+    Returns:
+        Tuple of (dict of pose_type, response_mode, image_format, quality,
+        tier and the rest, None), or (None, error response)
+    """
+    response_mode = request.values.get('response', app.config['DEFAULT_RESPONSE_MODE'])
+    image_format = request.values.get('image_format', app.config['ANNOTATED_IMAGE_FORMAT'])
+    quality = request.values.get('quality', app.config['ANNOTATED_IMAGE_QUALITY'], type=int)
+    tier = request.values.get('tier') or None
+    fencers = request.values.get('fencers', 1, type=int)
+    preview_side = request.values.get('preview_side', 0, type=int)
+    roi = _flag('roi') if 'roi' in request.values else None
+    athlete = request.values.get('athlete') or None
+    session = request.values.get('session', '')
+    pose_type = request.values.get('pose_type', 'en_garde')
+    if pose_type not in POSE_TYPES:
+        return None, _rejected('bad_request', f'pose_type must be one of {", ".join(POSE_TYPES)}', 400)
+    if response_mode not in RESPONSE_MODES:
+        return None, _rejected('bad_request', f'response must be one of {", ".join(RESPONSE_MODES)}', 400)
+    if image_format not in IMAGE_FORMATS:
+        return None, _rejected('bad_request', f'image_format must be one of {", ".join(IMAGE_FORMATS)}', 400)
+    if quality is None or not 1 <= quality <= 100:
+        return None, _rejected('bad_request', 'quality must be between 1 and 100', 400)
+    if tier is not None and tier not in POSE_TIERS:
+        return None, _rejected('bad_request', f'tier must be one of {", ".join(POSE_TIERS)}', 400)
+    if fencers is None or not 1 <= fencers <= app.config['MAX_FENCERS']:
+        return None, _rejected('bad_request', f"fencers must be between 1 and {app.config['MAX_FENCERS']}", 400)
+    if preview_side is None or preview_side < 0:
+        return None, _rejected('bad_request', 'preview_side must be a number of pixels', 400)
+    return {'pose_type': pose_type, 'response_mode': response_mode, 'image_format': image_format,
+            'quality': quality, 'tier': tier,
+            'fencers': fencers, 'preview_side': preview_side or None, 'roi': roi, 'athlete': athlete,
+            'session': session}, None
+
+
+def _submit_analysis(pose_type, image_data, options):
+    """Queue the single- or multi-fencer analysis the options ask for on the inference pool"""
+    args = (pose_type, image_data, options['response_mode'] != 'metrics', options['image_format'],
+            options['quality'], options['tier'])
+    if options['fencers'] > 1:
+        return inference_pool.submit(inference_pool.analyze_fencers_task, *args, options['fencers'],
+                                     options['preview_side'])
+    return inference_pool.submit(inference_pool.analyze_task, *args, options['preview_side'], options['roi'])
+
+
+def _url_builder():
+    # Usable after the request has ended, e.g. from a job thread
+    return app.url_map.bind('localhost', script_name=request.script_root or '/')
+
+
+def _analysis_payload(result, pose_type, response_mode, urls):
+    """
+    The /analyze JSON body for one analyze_task result
+    Parameters:
+        result: Dict from inference_pool.analyze_task
+        pose_type: Requested pose type; the result's own wins for 'auto'
+        response_mode: One of RESPONSE_MODES; 'binary' leaves the image out
+        urls: werkzeug MapAdapter used to build /results links
+    """
+    analysis = {
+        'success': True,
+        'feedback': result['feedback'],
+        'angles': result['angles'],
+        'pose_type': result.get('pose_type') or pose_type,
+        'model_complexity': result['model_complexity']
+    }
+    if result.get('classification'):
+        analysis['classification'] = result['classification']
+
+    if 'fencers' in result:
+        analysis['fencers'] = [fencer if response_mode == 'metrics' else
+                               {key: value for key, value in fencer.items() if key != 'landmarks'}
+                               for fencer in result['fencers']]
+
+    if response_mode == 'metrics':
+        analysis['landmarks'] = result['landmarks']
+    elif response_mode == 'url':
+        image_id = hashlib.blake2b(result['image'], digest_size=16).hexdigest()
+        annotated_images.put(image_id, (result['image'], result['image_type']))
+        analysis['annotated_image_url'] = urls.build('annotated_image', {'image_id': image_id})
+    elif response_mode == 'inline':
+        analysis['annotated_image'] = _data_uri(result['image'], result['image_type'])
+    return analysis
+
+
+def _archive_result(result, athlete, session):
+    """Store a single-fencer result's landmarks when archiving is on and the athlete is named"""
+    archive = landmark_archive.get_archive()
+    if archive is None or not athlete or result.get('landmarks') is None:
+        return
+    archive.append(result['landmarks'], result['image_size'], result['pose_type'], athlete, session)
+
+
+def _batch_line(result, include_images):
+    """One /analyze/batch NDJSON record for a batch.analyze_batch result"""
+    line = {key: result[key] for key in ('name', 'pose_type', 'status', 'feedback', 'angles')}
+    if result.get('error_code'):
+        line['error_code'] = result['error_code']
+    if result.get('classification'):
+        line['classification'] = result['classification']
+    if include_images and result['annotated_image'] is not None:
+        line['annotated_image'] = _data_uri(result['annotated_image'], 'image/jpeg')
+    return line
+
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+
+@app.after_request
+def record_request_timing(response):
+    if request.endpoint == 'analyze_pose':
+        elapsed = time.perf_counter() - g.started
+        metrics.observe('analyze_request_seconds', elapsed, status=str(response.status_code))
+        timings = g.get('timings')
+        if timings is not None and (app.config['SERVER_TIMING'] or _flag('server_timing')):
+            response.headers['Server-Timing'] = metrics.server_timing({**timings, 'total': elapsed})
+    return response
+
 
 @app.route('/analyze', methods=['POST'])
 def analyze_pose():
+    """
+    Analyze one image. Options (form fields or query parameters):
+        response: 'inline' (annotated image as a data URI), 'url' (link to
+            a cacheable /results/<id> image), 'binary' (the image itself as
+            the body, analysis JSON in the X-Pose-Analysis header) or
+            'metrics' (landmarks, angles and feedback only, nothing drawn)
+        image_format: 'jpeg' or 'webp'
+        quality: Encoder quality 1-100
+        include_original: Echo the uploaded image back as a data URI
+        pose_type: 'en_garde', 'lunge', or 'auto' to classify the stance
+            from the same landmarks (the response then carries the
+            detected pose_type and a classification with its confidence)
+        tier: 'lite', 'full' or 'heavy' model, or 'auto' to run lite and
+            escalate to heavy when key joints are poorly visible (server
+            default: POSE_TIER)
+        fencers: Number of fencers to look for (default 1). Above 1, each
+            fencer found is analyzed separately and listed under 'fencers'
+            with their box, facing direction, angles and feedback
+        athlete, session: Store the pose in the landmark archive under
+            these names (when LANDMARK_ARCHIVE_DIR is set; single fencer only)
+        preview_side: Draw the annotated image downscaled to this longest
+            side, e.g. for thumbnails (default: the analysis size)
+        roi: 'true' to locate the fencer on a downscaled copy and run the
+            pose model on a crop around them, for small subjects in wide
+            shots (server default: POSE_ROI; single fencer only)
+        server_timing: Add a Server-Timing header with per-stage durations
+            (always on with SERVER_TIMING)
+    """
     try:
         # Check if image file is present
         if 'image' not in request.files:
-            return jsonify({'success': False, 'error': 'No image file provided'})
+            return _rejected('bad_request', 'No image file provided')
         
         image_file = request.files['image']
-        pose_type = request.form.get('pose_type', 'en_garde')
         
         if image_file.filename == '':
-            return jsonify({'success': False, 'error': 'No image file selected'})
+            return _rejected('bad_request', 'No image file selected')
+
+        options, error = _analysis_options()
+        if error is not None:
+            return error
+        pose_type = options['pose_type']
+        response_mode = options['response_mode']
         
-        # Save uploaded image temporarily
-        temp_path = os.path.join(app.config['UPLOAD_FOLDER'], image_file.filename)
-        image_file.save(temp_path)
+        # Read the upload into memory; the worker decodes it once
+        started = time.perf_counter()
+        image_data = image_file.read()
+        g.timings = {'upload': time.perf_counter() - started}
         
         try:
-            # Analyze the pose based on type
-            if pose_type == 'en_garde':
-                annotated_image, feedback = analyze_engarde_pose(temp_path)
-            else:  # lunge
-                annotated_image, feedback = analyze_lunge_pose(temp_path)
-            
-            if annotated_image is None:
-                return jsonify({'success': False, 'error': 'Failed to analyze image'})
-            
-            # Convert images to base64 for web display
-            # Original image
-            original_image = cv2.imread(temp_path)
-            _, original_buffer = cv2.imencode('.jpg', original_image)
-            original_base64 = base64.b64encode(original_buffer).decode('utf-8')
+            # Analyze the pose on the inference pool
+            try:
+                future = _submit_analysis(pose_type, image_data, options)
+            except inference_pool.PoolSaturated as e:
+                metrics.increment('analyze_errors_total', reason='busy')
+                response = jsonify({'success': False, 'error': 'Server is busy, please retry shortly',
+                                    'error_code': 'busy'})
+                response.status_code = 503
+                response.headers['Retry-After'] = str(e.retry_after)
+                return response
+
+            started = time.perf_counter()
+            try:
+                result = future.result(timeout=app.config['INFERENCE_TIMEOUT'])
+            except InferenceTimeout:
+                return _rejected('timeout', 'Analysis timed out', 504)
+
+            # Whatever the worker did not spend in a stage was queueing and transfer
+            round_trip = time.perf_counter() - started
+            g.timings['queue'] = max(round_trip - sum(result['timings'].values()), 0.0)
+            g.timings.update(result['timings'])
+            metrics.record_analysis(pose_type, result)
             
-            # Annotated image
-            _, annotated_buffer = cv2.imencode('.jpg', annotated_image)
-            annotated_base64 = base64.b64encode(annotated_buffer).decode('utf-8')
+            if result['status'] != 'ok':
+                return _rejected(result['error_code'], ANALYSIS_ERRORS[result['error_code']])
+            _archive_result(result, options['athlete'], options['session'])
+
+            started = time.perf_counter()
+            analysis = _analysis_payload(result, pose_type, response_mode, _url_builder())
+            if response_mode == 'binary':
+                response = Response(result['image'], mimetype=result['image_type'])
+                response.headers['X-Pose-Analysis'] = json.dumps(analysis)
+                return response
+
+            # The client already has the original, so only echo it on request
+            if _flag('include_original'):
+                original_type = image_file.mimetype if image_file.mimetype.startswith('image/') else 'image/jpeg'
+                analysis['original_image'] = _data_uri(image_data, original_type)
             
-            return jsonify({
-                'success': True,
-                'original_image': f'data:image/jpeg;base64,{original_base64}',
-                'annotated_image': f'data:image/jpeg;base64,{annotated_base64}',
-                'feedback': feedback,
-                'pose_type': pose_type
-            })
+            response = jsonify(analysis)
+            g.timings['response'] = time.perf_counter() - started
+            return response
             
         except Exception as e:
-            return jsonify({'success': False, 'error': f'Analysis failed: {str(e)}'})
-        
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+            return _rejected('exception', f'Analysis failed: {str(e)}')
                 
     except Exception as e:
-        return jsonify({'success': False, 'error': f'Server error: {str(e)}'})
+        return _rejected('exception', f'Server error: {str(e)}')
+
+@app.route('/results/<image_id>')
+def annotated_image(image_id):
+    """Serve an annotated image produced with response=url"""
+    stored = annotated_images.get(image_id)
+    if stored is None:
+        return jsonify({'success': False, 'error': 'Result not found or expired'}), 404
+
+    data, mimetype = stored
+    response = Response(data, mimetype=mimetype)
+    # Ids are content hashes, so a given URL never changes
+    response.set_etag(image_id)
+    response.headers['Cache-Control'] = f"private, max-age={app.config['ANNOTATED_IMAGE_TTL']}, immutable"
+    return response.make_conditional(request)
+
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """
+    Analyze many images (files under 'images' and/or a zip under 'archive'),
+    streaming NDJSON; 'athlete' and 'session' archive the poses as for /analyze
+    """
+    pose_type = request.form.get('pose_type', 'en_garde')
+    include_images = request.form.get('include_images', 'false').lower() in ('1', 'true', 'yes')
+    tier = request.form.get('tier') or None
+    roi = _flag('roi') if 'roi' in request.values else None
+    athlete, session = request.form.get('athlete') or None, request.form.get('session', '')
+    if tier is not None and tier not in POSE_TIERS:
+        return _rejected('bad_request', f'tier must be one of {", ".join(POSE_TIERS)}', 400)
+    if pose_type not in POSE_TYPES:
+        return _rejected('bad_request', f'pose_type must be one of {", ".join(POSE_TYPES)}', 400)
+    uploads = [f for f in request.files.getlist('images') if f.filename]
+    archive = request.files.get('archive')
+
+    if not uploads and archive is None:
+        return _rejected('bad_request', 'No images provided', 400)
+    if archive is not None and not zipfile.is_zipfile(archive.stream):
+        return _rejected('bad_request', 'Archive is not a valid zip file', 400)
+
+    def items():
+        for image_file in uploads:
+            yield image_file.filename, image_file.read()
+        if archive is not None:
+            yield from batch.iter_zip(archive.stream)
+
+    def generate():
+        counts = {'ok': 0, 'no_pose': 0, 'error': 0}
+        for result in batch.analyze_batch(items(), pose_type, tier=tier, roi=roi):
+            counts[result['status']] += 1
+            metrics.record_analysis(pose_type, result)
+            _archive_result(result, athlete, session)
+            yield json.dumps(_batch_line(result, include_images)) + '\n'
+        yield json.dumps({'done': True, 'total': sum(counts.values()), **counts}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def _single_job(pose_type, image_data, options, original_type, urls):
+    """The work of a single-image job: what /analyze would have answered"""
+    response_mode = options['response_mode']
+    deadline = time.monotonic() + app.config['INFERENCE_TIMEOUT']
+    while True:
+        try:
+            future = _submit_analysis(pose_type, image_data, options)
+            break
+        except inference_pool.PoolSaturated as e:
+            # Jobs have nobody to send a 503 to, so they wait for a slot instead
+            if time.monotonic() + e.retry_after > deadline:
+                raise RuntimeError('Server is busy, no inference slot became free') from None
+            time.sleep(min(e.retry_after, 1))
+
+    try:
+        result = future.result(timeout=max(deadline - time.monotonic(), 1))
+    except InferenceTimeout:
+        metrics.increment('analyze_errors_total', reason='timeout')
+        raise RuntimeError('Analysis timed out') from None
+    metrics.record_analysis(pose_type, result)
+    if result['status'] != 'ok':
+        metrics.increment('analyze_errors_total', reason=result['error_code'])
+        return {'success': False, 'error': ANALYSIS_ERRORS[result['error_code']], 'error_code': result['error_code']}
+    _archive_result(result, options['athlete'], options['session'])
+
+    analysis = _analysis_payload(result, pose_type, response_mode, urls)
+    if original_type is not None:
+        analysis['original_image'] = _data_uri(image_data, original_type)
+    return analysis
+
+def _job_items(files, archive_data):
+    """(name, bytes) of a batch job's uploads, then of its zip's images as they are read"""
+    yield from files
+    if archive_data is not None:
+        yield from batch.iter_zip(io.BytesIO(archive_data))
+
+
+def _batch_job(pose_type, items, include_images, options):
+    """The work of a batch job: every /analyze/batch line, then the summary"""
+    results = []
+    counts = {'ok': 0, 'no_pose': 0, 'error': 0}
+    for result in batch.analyze_batch(items, pose_type, tier=options['tier'], roi=options['roi']):
+        counts[result['status']] += 1
+        metrics.record_analysis(pose_type, result)
+        _archive_result(result, options['athlete'], options['session'])
+        results.append(_batch_line(result, include_images))
+    return {'results': results, 'done': True, 'total': sum(counts.values()), **counts}
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """
+    Queue an analysis and return its id at once (202). Takes the /analyze
+    fields for one 'image', or the /analyze/batch fields ('images' and/or
+    'archive', include_images) for many. Optional callback_url receives the
+    finished job as a JSON POST if its host is in JOB_WEBHOOK_HOSTS.
+    Poll GET /jobs/<id> for the result.
+    """
+    image_file = request.files.get('image')
+    uploads = [f for f in request.files.getlist('images') if f.filename]
+    archive = request.files.get('archive')
+    callback_url = request.form.get('callback_url') or None
+
+    options, error = _analysis_options()
+    if error is not None:
+        return error
+    pose_type = options['pose_type']
+    if options['response_mode'] == 'binary':
+        return _rejected('bad_request', 'response=binary is not available for jobs', 400)
+    if callback_url is not None and not jobs.webhook_allowed(callback_url):
+        return _rejected('bad_request', 'callback_url host is not allowed', 400)
+
+    # Everything is read now: the upload streams close with the request
+    if image_file is not None and image_file.filename:
+        original_type = None
+        if _flag('include_original'):
+            original_type = image_file.mimetype if image_file.mimetype.startswith('image/') else 'image/jpeg'
+        image_data = image_file.read()
+        size = len(image_data)
+        run = functools.partial(_single_job, pose_type, image_data, options, original_type, _url_builder())
+    elif uploads or archive is not None:
+        if archive is not None and not zipfile.is_zipfile(archive.stream):
+            return _rejected('bad_request', 'Archive is not a valid zip file', 400)
+        files = [(f.filename, f.read()) for f in uploads]
+        archive_data = None
+        if archive is not None:
+            archive.stream.seek(0)
+            archive_data = archive.read()
+        size = sum(len(data) for _, data in files) + len(archive_data or b'')
+        # The zip stays compressed until the job runs
+        run = functools.partial(_batch_job, pose_type, _job_items(files, archive_data), _flag('include_images'),
+                                options)
+    else:
+        return _rejected('bad_request', 'No image file provided', 400)
+
+    try:
+        job_id = jobs.submit(run, callback_url, size)
+    except jobs.JobQueueFull as e:
+        metrics.increment('analyze_errors_total', reason='jobs_full')
+        response = jsonify({'success': False, 'error': 'Job queue is full, please retry shortly',
+                            'error_code': 'jobs_full'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+
+    status_url = url_for('job_status', job_id=job_id)
+    response = jsonify({'success': True, 'job_id': job_id, 'status': 'queued', 'status_url': status_url})
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    return response
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """
+    A job's status ('queued', 'running', 'done' or 'failed'); once done,
+    'result' holds the /analyze payload (or the batch lines and summary)
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found or expired'}), 404
+
+    response = jsonify(job)
+    if job['status'] in ('queued', 'running'):
+        response.headers['Retry-After'] = '1'
+    return response
+
+@app.route('/athletes/<athlete>/trend')
+def athlete_trend(athlete):
+    """
+    How one angle moved over time in the athlete's archived poses. Options:
+        angle: Any angle the criteria know, e.g. front_knee (the default)
+        days: Look back this many days (default 30), unless since is given
+        since, until: ISO 8601 dates or times (UTC unless an offset is given)
+        pose_type: Only poses stored as this stance, or 'neither'
+        bucket: 'hour', 'day' (default) or 'week'
+    """
+    archive = landmark_archive.get_archive()
+    if archive is None:
+        return jsonify({'success': False, 'error': 'Landmark archive is not enabled'}), 404
+
+    angle = request.args.get('angle', 'front_knee')
+    bucket = request.args.get('bucket', 'day')
+    pose_type = request.args.get('pose_type') or None
+    days = request.args.get('days', 30, type=float)
+    if angle not in criteria.get().angle_names:
+        return jsonify({'success': False,
+                        'error': f'angle must be one of {", ".join(criteria.get().angle_names)}'}), 400
+    if bucket not in landmark_archive.BUCKETS:
+        return jsonify({'success': False,
+                        'error': f'bucket must be one of {", ".join(landmark_archive.BUCKETS)}'}), 400
+    try:
+        until = landmark_archive.parse_time(request.args['until']) if request.args.get('until') else None
+        since = (landmark_archive.parse_time(request.args['since']) if request.args.get('since')
+                 else (until or time.time()) - (days or 30) * 86400)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'since and until must be ISO 8601 dates'}), 400
+
+    return jsonify({'success': True, 'athlete': athlete, 'angle': angle, 'bucket': bucket,
+                    'trend': archive.trend(athlete, angle, since, until, pose_type, bucket)})
+
+if Sock is not None:
+    sock = Sock(app)
+
+    @sock.route('/live')
+    def live_session(ws):
+        """
+        Live coaching: the browser streams camera frames as binary messages
+        and gets JSON deltas back for its own overlay (protocol in live.py)
+        Query parameters:
+            pose_type: 'en_garde', 'lunge' or 'auto' (default); a text
+                message {"pose_type": ...} switches it mid-session
+            model_complexity: 0, 1 or 2, defaults to the tracking model
+        """
+        pose_type = request.args.get('pose_type', 'auto')
+        model_complexity = request.args.get('model_complexity', type=int)
+        error = None
+        if pose_type not in POSE_TYPES:
+            error = f'pose_type must be one of {", ".join(POSE_TYPES)}'
+        elif model_complexity is not None and model_complexity not in (0, 1, 2):
+            error = 'model_complexity must be 0, 1 or 2'
+        if error is not None:
+            ws.send(live.encode({'type': 'error', 'error': error, 'error_code': 'bad_request'}))
+            ws.close(reason=live.POLICY_VIOLATION, message=error)
+            return
+        live.serve(ws, pose_type, model_complexity, app.config['LIVE_IDLE_TIMEOUT'], POSE_TYPES)
 
 @app.route('/health')
 def health_check():
-    return jsonify({'status': 'healthy', 'message': 'Flask app is running'})
+    archive = landmark_archive.get_archive()
+    return jsonify({'status': 'healthy', 'message': 'Flask app is running',
+                    'ready': inference_pool.ready(),
+                    'inference': inference_pool.stats(),
+                    'jobs': jobs.stats(),
+                    'landmark_archive': archive.stats() if archive is not None else None,
+                    'live': live.stats() if Sock is not None else None,
+                    'landmark_cache': inference_pool.cache_stats()})
+
+@app.route('/health/live')
+def liveness_check():
+    """The process is up and serving requests"""
+    return jsonify({'status': 'alive'})
+
+@app.route('/health/ready')
+def readiness_check():
+    """503 until every inference worker has loaded and warmed the pose model"""
+    if inference_pool.ready():
+        return jsonify({'status': 'ready'})
+    pool = inference_pool.stats()
+    response = jsonify({'status': 'draining' if pool['draining'] else 'starting', 'error': pool['start_error']})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Stage latency histograms, outcome counters and pool gauges in the Prometheus text format"""
+    if not metrics.ENABLED:
+        return jsonify({'success': False, 'error': 'Metrics are disabled'}), 404
+
+    pool = inference_pool.stats()
+    cache = inference_pool.cache_stats()
+    job_stats = jobs.stats()
+    gauges = {
+        'inference_workers': ("Inference worker processes", pool['workers']),
+        'inference_in_flight': ("Analyses running or queued", pool['in_flight']),
+        'inference_queue_depth': ("Analyses waiting for a worker", pool['queue_depth']),
+        'inference_completed': ("Analyses finished by the pool", pool['completed']),
+        'inference_rejected': ("Analyses rejected because the pool was full", pool['rejected']),
+        'jobs_queued': ("Jobs waiting for a dispatcher", job_stats['queued']),
+        'jobs_running': ("Jobs being analyzed", job_stats['running']),
+        'jobs_held_bytes': ("Upload bytes held by queued and running jobs", job_stats['held_bytes']),
+        'jobs_retained_bytes': ("Serialized size of the finished jobs kept for polling",
+                                job_stats['retained_bytes']),
+        'landmark_cache_hit_rate': ("Landmark cache hit rate summed over workers", cache['hit_rate']),
+    }
+    if Sock is not None:
+        live_stats = live.stats()
+        gauges['live_sessions'] = ("Open live coaching sessions", live_stats['sessions'])
+        gauges['live_sessions_queued'] = ("Live sessions with a frame waiting for a scheduler thread",
+                                          live_stats['queued'])
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
+    # Load the pose model in every worker while the server comes up;
+    # /health/ready answers 503 until they are warm. With the debug
+    # reloader only the child process that serves requests starts workers.
+    # Development server only; see gunicorn.conf.py for production serving
+    debug = os.environ.get('FLASK_DEBUG', '1').lower() in ('1', 'true', 'yes')
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true' or not debug:
+        inference_pool.start_in_background()
+    app.run(debug=debug, host=os.environ.get('HOST', '0.0.0.0'), port=int(os.environ.get('PORT', 5000)))
\ No newline at end of file
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Batch analysis of many fencing photos
+Fans images out over the inference pool and yields results as they finish.
+
+    python batch.py SESSION_DIR_OR_ZIP --pose-type lunge --output results/
+    python batch.py SESSION_DIR --archive poses/ --athlete ana --session 2026-10-18
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import criteria
+import inference_pool
+import landmark_archive
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff')
+SUMMARY_FIELDS = ['name', 'pose_type', 'status', 'feedback']
+
+
+def is_image_name(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS) and not os.path.basename(name).startswith('.')
+
+
+def iter_directory(path):
+    """Yield (name, image bytes) for every image in a directory, sorted by name"""
+    for name in sorted(os.listdir(path)):
+        full_path = os.path.join(path, name)
+        if os.path.isfile(full_path) and is_image_name(name):
+            with open(full_path, 'rb') as f:
+                yield name, f.read()
+
+
+def iter_zip(source):
+    """
+    Yield (name, image bytes) for every image in a zip archive
+    Parameters:
+        source: Path or binary file object of the archive
+    """
+    with zipfile.ZipFile(source) as archive:
+        for info in archive.infolist():
+            if not info.is_dir() and is_image_name(info.filename):
+                yield info.filename, archive.read(info)
+
+
+def analyze_batch(items, pose_type, window=None, tier=None, roi=None):
+    """
+    Analyze many images on the inference pool, at most `window` at a time
+    Parameters:
+        items: Iterable of (name, encoded image bytes)
+        pose_type: 'en_garde', 'lunge' or 'auto' (classified per image)
+        window: Maximum images in flight, defaults to the worker count so
+            single-image requests still find free slots
+        tier: 'lite', 'full', 'heavy' or 'auto', None for the worker default
+        roi: Run the model on a crop around each fencer, None for the
+            worker default (POSE_ROI)
+    Yields:
+        Dict per image with name, status, feedback, angles, landmarks and
+        annotated JPEG bytes, in completion order
+    """
+    inference_pool.start()
+    if window is None:
+        window = max(inference_pool.stats()['workers'], 1)
+
+    pending = {}
+
+    def drain(block):
+        done, _ = wait(pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for future in done:
+            name = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'status': 'error', 'feedback': [f"Error: {e}"], 'angles': None, 'image': None,
+                          'error_code': 'exception'}
+            yield {
+                'name': name,
+                'pose_type': result.get('pose_type', pose_type),
+                'classification': result.get('classification'),
+                'status': result['status'],
+                'feedback': result['feedback'],
+                'angles': result['angles'],
+                'annotated_image': result['image'],
+                'landmarks': result.get('landmarks'),
+                'image_size': result.get('image_size'),
+                'cache_hit': result.get('cache_hit'),
+                'error_code': result.get('error_code'),
+                'inference_saved': result.get('inference_saved'),
+                'timings': result.get('timings'),
+            }
+
+    for name, image_data in items:
+        while True:
+            if len(pending) >= window:
+                yield from drain(block=True)
+                continue
+            try:
+                future = inference_pool.submit(inference_pool.analyze_task, pose_type, image_data,
+                                               True, 'jpeg', None, tier, None, roi)
+                break
+            except inference_pool.PoolSaturated:
+                # Other requests hold every slot; wait for ours or back off briefly
+                if pending:
+                    yield from drain(block=True)
+                else:
+                    time.sleep(0.05)
+        pending[future] = name
+        yield from drain(block=False)
+
+    while pending:
+        yield from drain(block=True)
+
+
+def summary_row(result):
+    return {
+        'name': result['name'],
+        'pose_type': result['pose_type'],
+        'status': result['status'],
+        'feedback': '; '.join(result['feedback']),
+    }
+
+
+def annotated_filename(name):
+    stem = os.path.splitext(name.replace('/', '_'))[0]
+    return f"{stem}_annotated.jpg"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze a folder or zip of fencing photos")
+    parser.add_argument('source', help="Directory of images or a .zip archive")
+    parser.add_argument('--pose-type', choices=criteria.get().stances + ['auto'], default='en_garde',
+                        help="Stance to give feedback for; 'auto' classifies each photo")
+    parser.add_argument('--output', default='batch_output', help="Directory for annotated images and summary.csv")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--tier', choices=['lite', 'full', 'heavy', 'auto'], default=None,
+                        help="Pose model speed tier (default: POSE_TIER or heavy)")
+    parser.add_argument('--roi', action='store_true', default=None,
+                        help="Run the pose model on a crop around each fencer (default: POSE_ROI)")
+    parser.add_argument('--archive', help="Also store every pose found in this landmark archive directory")
+    parser.add_argument('--athlete', help="Athlete the photos show (required with --archive)")
+    parser.add_argument('--session', default='', help="Session name stored with the poses")
+    args = parser.parse_args()
+    if args.archive and not args.athlete:
+        parser.error("--archive needs --athlete")
+
+    if os.path.isdir(args.source):
+        items = iter_directory(args.source)
+    elif zipfile.is_zipfile(args.source):
+        items = iter_zip(args.source)
+    else:
+        sys.exit(f"{args.source} is neither a directory nor a zip archive")
+
+    os.makedirs(args.output, exist_ok=True)
+    inference_pool.configure(args.workers)
+    archive = landmark_archive.LandmarkArchive(args.archive) if args.archive else None
+
+    counts = {'ok': 0, 'no_pose': 0, 'error': 0}
+    start = time.perf_counter()
+    try:
+        with open(os.path.join(args.output, 'summary.csv'), 'w', newline='') as summary_file:
+            writer = csv.DictWriter(summary_file, fieldnames=SUMMARY_FIELDS)
+            writer.writeheader()
+
+            for result in analyze_batch(items, args.pose_type, tier=args.tier, roi=args.roi):
+                if result['annotated_image'] is not None:
+                    with open(os.path.join(args.output, annotated_filename(result['name'])), 'wb') as f:
+                        f.write(result['annotated_image'])
+                if archive is not None and result['landmarks'] is not None:
+                    archive.append(result['landmarks'], result['image_size'], result['pose_type'],
+                                   args.athlete, args.session)
+                row = summary_row(result)
+                writer.writerow(row)
+                counts[result['status']] += 1
+                # One JSON line per image, as soon as it finishes
+                print(json.dumps(row), flush=True)
+    finally:
+        inference_pool.shutdown_pool()
+
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    print(f"Analyzed {total} images in {elapsed:.1f}s "
+          f"({counts['ok']} ok, {counts['no_pose']} no pose, {counts['error']} errors)",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
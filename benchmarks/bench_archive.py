@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Landmark archive benchmark
+Fills a temporary archive with synthetic poses (many athletes, a few
+months of sessions) and reports append throughput, bulk re-score
+throughput and the latency of per-athlete trend queries.
+
+    python benchmarks/bench_archive.py [--rows 1000000] [--athletes 200] [--dir /tmp/archive]
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import landmark_archive
+from bench_render import synthetic_landmarks
+
+SESSION_ROWS = 5000
+
+
+def fill(archive, rows, athletes, days):
+    """Append rows in session-sized blocks spread over `days`; returns rows per second"""
+    rng = np.random.default_rng(0)
+    poses = synthetic_landmarks(SESSION_ROWS)
+    now = time.time()
+    started = time.perf_counter()
+    for first in range(0, rows, SESSION_ROWS):
+        count = min(SESSION_ROWS, rows - first)
+        day = rng.uniform(0, days)
+        pose_types = np.where(rng.random(count) < 0.5, 'en_garde', 'lunge')
+        archive.append_many(poses[:count], np.tile((1920, 1080), (count, 1)), pose_types,
+                            f"athlete{rng.integers(athletes)}", f"session{first // SESSION_ROWS}",
+                            now - (day + rng.uniform(0, 0.05, count)) * 86400)
+    return rows / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--athletes', type=int, default=200)
+    parser.add_argument('--days', type=float, default=90)
+    parser.add_argument('--dir', help="Archive directory (default: a temporary one, removed afterwards)")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    directory = args.dir or tempfile.mkdtemp(prefix='landmark_archive_')
+    try:
+        archive = landmark_archive.LandmarkArchive(directory)
+        if len(archive) < args.rows:
+            rate = fill(archive, args.rows - len(archive), args.athletes, args.days)
+            print(f"append: {rate:,.0f} poses/s")
+        stats = archive.stats()
+        print(f"{stats['poses']:,} poses, {stats['athletes']} athletes, {stats['sessions']} sessions, "
+              f"{stats['bytes'] / 1e6:,.0f} MB")
+
+        started = time.perf_counter()
+        summary, _ = archive.rescore()
+        elapsed = time.perf_counter() - started
+        scored = sum(totals['poses'] for totals in summary.values())
+        print(f"rescore: {scored:,} poses in {elapsed:.2f}s ({scored / elapsed:,.0f} poses/s)")
+
+        athlete = archive.athletes()[0]
+        since = time.time() - 30 * 86400
+        for label, query in (
+                ('select athlete, 30 days', lambda: archive.select(athlete=athlete, since=since)),
+                ('trend front_knee, 30 days', lambda: archive.trend(athlete, 'front_knee', since)),
+                ('trend front_knee, all time, weekly', lambda: archive.trend(athlete, 'front_knee', bucket='week'))):
+            runs = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                query()
+                runs.append((time.perf_counter() - started) * 1000)
+            print(f"{label}: {statistics.median(runs):.1f} ms")
+    finally:
+        if not args.dir:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Pose criteria benchmark
+Times the compiled criteria on synthetic poses: feedback for one stance
+against feedback for every stance on a single frame, and the batched
+rule check and profile distances over many frames.
+
+    python benchmarks/bench_criteria.py [--frames 100000] [--repeat 200]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import criteria
+from bench_render import synthetic_landmarks
+
+WIDTH, HEIGHT = 1920, 1080
+
+
+def median_ms(function, repeat):
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        runs.append((time.perf_counter() - started) * 1000)
+    return statistics.median(runs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--frames', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--criteria', help="Criteria file (default: criteria.json or POSE_CRITERIA)")
+    args = parser.parse_args()
+
+    compiled = criteria.load(args.criteria)
+    points = synthetic_landmarks(args.frames)[:, :, :2] * (WIDTH, HEIGHT)
+    print(f"{len(compiled.stances)} stances, {len(compiled.rule_names)} rules, "
+          f"{len(compiled.angle_names)} angles")
+
+    angles = compiled.compute_angles(points[0], HEIGHT)
+    stance = compiled.stances[0]
+    for label, query in (
+            (f"evaluate {stance}, 1 frame", lambda: compiled.evaluate(stance, angles)),
+            ('evaluate_all, 1 frame', lambda: compiled.evaluate_all(angles)),
+            ('profile_distance, 1 frame', lambda: compiled.profile_distance(angles))):
+        print(f"{label}: {median_ms(query, args.repeat) * 1000:.1f} us")
+
+    repeat = max(args.repeat // 20, 3)
+    batch = compiled.compute_angles(points, np.full(args.frames, HEIGHT, dtype=np.float64))
+    for label, query in (
+            ('compute_angles', lambda: compiled.compute_angles(points, np.full(args.frames, HEIGHT, dtype=np.float64))),
+            ('check, every rule', lambda: compiled.check(batch)),
+            ('profile_distance', lambda: compiled.profile_distance(batch))):
+        elapsed = median_ms(query, repeat)
+        print(f"{label}, {args.frames:,} frames: {elapsed:.1f} ms ({args.frames / elapsed * 1000:,.0f} frames/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Adaptive downscaling benchmark
+Analyzes phone-sized JPEGs at several MAX_IMAGE_SIDE settings and reports
+decode time, total analysis time, peak memory and how far the resulting
+angles move from the full-resolution analysis. The 'jitter' row analyzes the
+full-resolution image cropped by two pixels: the model's own noise, which
+the drift of each setting should be read against.
+
+    python benchmarks/bench_downscale.py --images DIR [--size 4032] [--sides 0,1920,1280,960,640]
+"""
+
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import image_io
+import landmark_cache
+import pipeline
+import pose_engine
+
+# Joint angles that do not depend on the facing direction. Front/back angles
+# swap sides when facing flips between two runs, and forearm_horizontal jumps
+# from about 180 to 0 when the wrist crosses the elbow's height, so comparing
+# those by name measured the angle definitions rather than the resolution
+COMPARED_ANGLES = ['right_knee', 'left_knee', 'right_elbow', 'left_elbow', 'spine_vertical']
+
+
+def load_jpegs(image_dir, size, count):
+    """JPEG-encode each image with its longest side scaled up to at least `size`"""
+    encoded = []
+    for path in sorted(glob.glob(os.path.join(image_dir, '*')))[:count]:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        scale = max(1.0, size / max(image.shape[:2]))
+        if scale > 1.0:
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+        _, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 92])
+        _, shifted = cv2.imencode('.jpg', image[:, 2:], [cv2.IMWRITE_JPEG_QUALITY, 92])
+        encoded.append((os.path.basename(path), buffer.tobytes(), shifted.tobytes()))
+    return encoded
+
+
+def run(data, max_side):
+    """Decode time (ms), analysis time (ms), peak traced memory (MB) and angles"""
+    start = time.perf_counter()
+    image_io.decode_scaled(data, max_side)
+    decode_ms = (time.perf_counter() - start) * 1000
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    analysis = pipeline.analyze(data, 'lunge', max_side=max_side)
+    total_ms = (time.perf_counter() - start) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return decode_ms, total_ms, peak / 2**20, analysis.angles
+
+
+def angle_error(angles, reference):
+    if angles is None or reference is None:
+        return None
+    return np.array([abs(angles[name] - reference[name]) for name in COMPARED_ANGLES])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--images', required=True, help='Directory of photos with a fencer in them')
+    parser.add_argument('--size', type=int, default=4032, help='Upscale smaller images to this longest side')
+    parser.add_argument('--sides', default='0,1920,1280,960,640', help='Comma-separated max sides (0 = full)')
+    parser.add_argument('--count', type=int, default=10)
+    parser.add_argument('--model-complexity', type=int, default=pose_engine.POSE_SETTINGS['model_complexity'])
+    args = parser.parse_args()
+
+    pose_engine.POSE_SETTINGS['model_complexity'] = args.model_complexity
+    # Every run must go through the model
+    landmark_cache.configure(max_entries=0)
+    sides = [int(side) for side in args.sides.split(',')]
+    if 0 not in sides:
+        sides.insert(0, 0)
+
+    images = load_jpegs(args.images, args.size, args.count)
+    if not images:
+        sys.exit("No images to benchmark")
+
+    pose_engine.warm_up()
+    print(f"{len(images)} images, longest side >= {args.size}, model_complexity={args.model_complexity}")
+    print(f"{'max side':>9} {'decode ms':>10} {'total ms':>9} {'peak MB':>8} {'mean err':>9} {'max err':>8} {'found':>6}")
+
+    reference = {name: run(data, 0)[3] for name, data, _ in images}
+    for side in ['jitter'] + sides:
+        decode, total, peak, errors = [], [], [], []
+        found = 0
+        for name, data, shifted in images:
+            decode_ms, total_ms, peak_mb, angles = run(shifted, 0) if side == 'jitter' else run(data, side)
+            decode.append(decode_ms)
+            total.append(total_ms)
+            peak.append(peak_mb)
+            found += angles is not None
+            error = angle_error(angles, reference[name])
+            if error is not None:
+                errors.append(error)
+
+        errors = np.concatenate(errors) if errors else np.array([np.nan])
+        print(f"{side or 'full':>9} {statistics.median(decode):10.1f} {statistics.median(total):9.1f} "
+              f"{max(peak):8.1f} {errors.mean():9.1f} {errors.max():8.1f} {found:>3}/{len(images)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Live coaching benchmark
+Opens several /live sessions against a running server and streams frames
+into each at a fixed rate, as a camera would, without waiting for results.
+For every session count it reports the result rate per session, the share
+of frames the server dropped for a newer one, latency from sending a frame
+to receiving its result, and the size of the result messages. With
+latest-frame-wins scheduling latency should stay flat as sessions are
+added, while the drop share rises instead.
+
+    python benchmarks/bench_live.py --images DIR [--url ws://127.0.0.1:5000/live] [--sessions 1,4,8,16] [--fps 15]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+import cv2
+import simple_websocket
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import image_io
+from bench_tiers import load_images
+
+FRAME_SIDE = 640
+
+
+def encode_frames(images):
+    return [cv2.imencode('.jpg', image_io.downscale(image, FRAME_SIDE), [cv2.IMWRITE_JPEG_QUALITY, 80])[1].tobytes()
+            for _, image in images]
+
+
+def stream(url, frames, fps, seconds, results):
+    """Send frames at fps for seconds on one session; appends its numbers to results"""
+    ws = simple_websocket.Client.connect(url)
+    try:
+        ready = json.loads(ws.receive(timeout=30))
+        if ready.get('type') != 'ready':
+            results.append({'error': ready.get('error_code', 'not ready')})
+            return
+        sent = {}
+        latencies, sizes, dropped, errors = [], [], 0, 0
+        lock = threading.Lock()
+        done = threading.Event()
+
+        def receive():
+            nonlocal dropped, errors
+            while not done.is_set():
+                try:
+                    message = ws.receive(timeout=0.5)
+                except simple_websocket.ConnectionClosed:
+                    return
+                if message is None:
+                    continue
+                received = time.perf_counter()
+                data = json.loads(message)
+                if data.get('type') == 'error':
+                    errors += 1
+                    continue
+                with lock:
+                    started = sent.pop(data['frame'], None)
+                if started is not None:
+                    latencies.append((received - started) * 1000)
+                    sizes.append(len(message))
+                dropped = data.get('dropped', dropped)
+
+        receiver = threading.Thread(target=receive, daemon=True)
+        receiver.start()
+        interval = 1 / fps
+        began = time.perf_counter()
+        count = 0
+        while time.perf_counter() - began < seconds:
+            count += 1
+            with lock:
+                sent[count] = time.perf_counter()
+            ws.send(frames[count % len(frames)])
+            time.sleep(max(0.0, began + count * interval - time.perf_counter()))
+        # Let the last result come back before counting
+        time.sleep(1.0)
+        done.set()
+        receiver.join()
+        results.append({'sent': count, 'results': len(latencies), 'dropped': dropped, 'errors': errors,
+                        'latencies': latencies, 'sizes': sizes, 'seconds': seconds})
+    finally:
+        ws.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--images', required=True, help="Directory of photos streamed as frames")
+    parser.add_argument('--count', type=int, default=20)
+    parser.add_argument('--url', default='ws://127.0.0.1:5000/live?pose_type=auto')
+    parser.add_argument('--sessions', default='1,4,8,16', help="Session counts to run, one round each")
+    parser.add_argument('--fps', type=float, default=15.0, help="Frames sent per second on each session")
+    parser.add_argument('--seconds', type=float, default=10.0)
+    args = parser.parse_args()
+
+    frames = encode_frames(load_images(args.images, args.count))
+    if not frames:
+        sys.exit("No readable photos")
+
+    print(f"{'sessions':>8} {'results/s':>9} {'dropped':>8} {'p50 ms':>7} {'p95 ms':>7} {'bytes':>6} {'refused':>7}")
+    for count in (int(value) for value in args.sessions.split(',')):
+        results = []
+        threads = [threading.Thread(target=stream, args=(args.url, frames, args.fps, args.seconds, results))
+                   for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        served = [result for result in results if 'error' not in result]
+        latencies = sorted(latency for result in served for latency in result['latencies'])
+        sizes = [size for result in served for size in result['sizes']]
+        if not latencies:
+            print(f"{count:>8} {'-':>9} {'-':>8} {'-':>7} {'-':>7} {'-':>6} {len(results) - len(served):>7}")
+            continue
+        rate = statistics.mean(result['results'] / result['seconds'] for result in served)
+        dropped = sum(result['dropped'] for result in served) / sum(result['sent'] for result in served)
+        print(f"{count:>8} {rate:>9.1f} {dropped:>8.0%} {statistics.median(latencies):>7.0f} "
+              f"{latencies[int(len(latencies) * 0.95)]:>7.0f} {statistics.mean(sizes):>6.0f} "
+              f"{len(results) - len(served):>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Pose engine cold-start benchmark
+Compares building a fresh mp_pose.Pose per image (the old per-request path)
+against the pre-warmed instances from pose_engine on a fixed image set.
+
+    python benchmarks/bench_pose_engine.py [--images DIR] [--model-complexity N]
+"""
+
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pose_engine
+
+
+def load_images(image_dir, count):
+    """Load images from a directory, or build a fixed synthetic set"""
+    if image_dir:
+        paths = sorted(glob.glob(os.path.join(image_dir, '*')))
+        images = [cv2.imread(p) for p in paths]
+        return [img for img in images if img is not None][:count]
+
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, size=(720, 1280, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def time_calls(images, fn):
+    timings = []
+    for image in images:
+        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        start = time.perf_counter()
+        fn(image_rgb)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def cold_process(image_rgb):
+    with pose_engine.mp_pose.Pose(**pose_engine.POSE_SETTINGS) as pose:
+        return pose.process(image_rgb)
+
+
+def report(name, timings):
+    print(f"{name:>8}: mean {statistics.mean(timings):7.1f} ms  "
+          f"median {statistics.median(timings):7.1f} ms  max {max(timings):7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--images', help='Directory of images (default: synthetic 720p set)')
+    parser.add_argument('--count', type=int, default=10)
+    parser.add_argument('--model-complexity', type=int, default=pose_engine.POSE_SETTINGS['model_complexity'])
+    args = parser.parse_args()
+
+    pose_engine.POSE_SETTINGS['model_complexity'] = args.model_complexity
+    images = load_images(args.images, args.count)
+    if not images:
+        sys.exit("No images to benchmark")
+
+    print(f"{len(images)} images, model_complexity={args.model_complexity}")
+    report('cold', time_calls(images, cold_process))
+
+    start = time.perf_counter()
+    pose_engine.warm_up()
+    print(f"{'warm-up':>8}: {(time.perf_counter() - start) * 1000:7.1f} ms (once, at startup)")
+    report('pooled', time_calls(images, pose_engine.process))
+
+
+if __name__ == '__main__':
+    main()
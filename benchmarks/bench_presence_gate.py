@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Presence gate benchmark
+Times the presence gate against a pose model pass on synthetic images
+without anyone in them (blank frames, noise, a screenshot-like page) and,
+with --images, on real photos: for each image it reports whether the gate
+lets it through, whether the model finds a pose, and the latency of both.
+A photo the model finds a pose in but the gate rejects is a false
+rejection and is counted separately.
+
+    python benchmarks/bench_presence_gate.py [--images DIR] [--tier heavy] [--repeat 5]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import image_io
+import landmark_cache
+import pose_engine
+import presence_gate
+from bench_tiers import load_images
+
+
+def synthetic_images():
+    rng = np.random.default_rng(0)
+    page = np.full((1080, 1920, 3), 245, dtype=np.uint8)
+    for row in range(12):
+        cv2.putText(page, f"Line {row} of a document that is not a fencer", (80, 120 + row * 75),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.6, (20, 20, 20), 3)
+    return [
+        ('black', np.zeros((1080, 1920, 3), dtype=np.uint8)),
+        ('grey', np.full((1080, 1920, 3), 128, dtype=np.uint8)),
+        ('noise', rng.integers(0, 256, (1080, 1920, 3), dtype=np.uint8)),
+        ('gradient', np.tile(np.linspace(0, 255, 1920, dtype=np.uint8)[None, :, None], (1080, 1, 3))),
+        ('document', page),
+    ]
+
+
+def median_ms(function, repeat):
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        runs.append((time.perf_counter() - started) * 1000)
+    return statistics.median(runs), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--images', help="Directory of real photos to check for false rejections")
+    parser.add_argument('--count', type=int, default=50)
+    parser.add_argument('--tier', default='heavy', choices=sorted(pose_engine.TIERS) + [pose_engine.AUTO_TIER])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    # Every model pass should run the model, not read an earlier result
+    landmark_cache.configure(max_entries=0)
+    pose_engine.warm_up(tier=args.tier)
+    presence_gate.warm_up()
+
+    images = synthetic_images() + (load_images(args.images, args.count) if args.images else [])
+    gate_total = model_total = saved = 0.0
+    false_rejections = 0
+    print(f"{'image':<24} {'gate':>10} {'gate ms':>8} {'pose':>5} {'model ms':>9}")
+    for name, image in images:
+        # The pipeline gates and detects on the image reduced to MAX_IMAGE_SIDE
+        image = image_io.downscale(image, image_io.MAX_IMAGE_SIDE)
+        gate_ms, error = median_ms(lambda: presence_gate.check(image), args.repeat)
+        rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        model_ms, (landmarks, _) = median_ms(lambda: pose_engine.detect_tiered(rgb, args.tier), args.repeat)
+        found = landmarks is not None
+        gate_total += gate_ms
+        model_total += model_ms
+        if error is not None:
+            saved += model_ms
+            false_rejections += found
+        print(f"{name[:24]:<24} {error or 'pass':>10} {gate_ms:>8.1f} {'yes' if found else 'no':>5} {model_ms:>9.1f}")
+
+    print(f"gate: {gate_total / len(images):.1f} ms per image, model: {model_total / len(images):.1f} ms per image")
+    print(f"model time avoided: {saved:.0f} ms over {len(images)} images; false rejections: {false_rejections}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Overlay rendering benchmark
+Times drawing the skeleton, stance label and angle arcs onto a frame with
+the previous mediapipe draw_landmarks path (a fresh style dict, protobuf
+landmarks and an image copy per call) against renderer: in place, on a
+downscaled preview, and batched over video frames. Also counts the pixels
+where renderer's overlay differs from mediapipe's.
+
+    python benchmarks/bench_render.py [--sizes 1920x1080,3840x2160] [--frames 64] [--batch 8]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import kinematics
+import pipeline
+import pose_engine
+import renderer
+
+# A lunge in normalized coordinates, facing right (x, y per landmark)
+LUNGE = [
+    (0.62, 0.22), (0.63, 0.21), (0.63, 0.21), (0.64, 0.21), (0.61, 0.21), (0.61, 0.21), (0.60, 0.21),
+    (0.64, 0.22), (0.60, 0.22), (0.63, 0.24), (0.61, 0.24), (0.63, 0.30), (0.57, 0.30), (0.72, 0.31),
+    (0.50, 0.34), (0.82, 0.31), (0.44, 0.30), (0.84, 0.31), (0.43, 0.29), (0.84, 0.30), (0.43, 0.28),
+    (0.83, 0.31), (0.44, 0.29), (0.58, 0.50), (0.54, 0.50), (0.70, 0.62), (0.42, 0.64), (0.72, 0.80),
+    (0.30, 0.78), (0.71, 0.82), (0.29, 0.80), (0.76, 0.83), (0.27, 0.81),
+]
+
+
+def synthetic_landmarks(count, seed=0):
+    """(count, 33, 4) landmarks jittered around LUNGE, a few poorly visible"""
+    rng = np.random.default_rng(seed)
+    landmarks = np.zeros((count, kinematics.NUM_LANDMARKS, 4))
+    landmarks[..., :2] = np.array(LUNGE) + rng.normal(0, 0.01, (count, kinematics.NUM_LANDMARKS, 2))
+    landmarks[..., 3] = rng.uniform(0.3, 1.0, (count, kinematics.NUM_LANDMARKS))
+    # Landmarks arrive as float32 protobuf fields
+    return landmarks.astype(np.float32).astype(np.float64)
+
+
+def mediapipe_render(image, landmarks, angles, label):
+    """The overlay as pipeline.render drew it with mediapipe's drawing utilities"""
+    from mediapipe.python.solutions import drawing_styles, drawing_utils, pose as mp_pose
+
+    annotated_image = image.copy()
+    drawing_utils.draw_landmarks(
+        annotated_image,
+        pose_engine.array_to_landmarks(landmarks),
+        mp_pose.POSE_CONNECTIONS,
+        landmark_drawing_spec=drawing_styles.get_default_pose_landmarks_style()
+    )
+    cv2.putText(annotated_image, label, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+    image_height, image_width = image.shape[:2]
+    points = kinematics.landmarks_to_array(landmarks, image_width, image_height)
+    for a, b, c, name in renderer.DRAWN_ANGLES:
+        renderer.draw_angle(annotated_image, points[a], points[b], points[c], f"{angles[name]:.1f} deg")
+    return annotated_image
+
+
+def time_per_frame(draw, frames, repeat):
+    """Median over repeats of the mean ms per frame"""
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        draw()
+        runs.append((time.perf_counter() - start) * 1000 / frames)
+    return statistics.median(runs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1920x1080,3840x2160')
+    parser.add_argument('--frames', type=int, default=64)
+    parser.add_argument('--batch', type=int, default=8, help='Frames per render_batch call')
+    parser.add_argument('--preview', type=int, default=640, help='Longest side of the preview')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    landmarks = synthetic_landmarks(args.frames)
+    label = pipeline.stance_label('lunge')
+    print(f"{args.frames} frames, batches of {args.batch}, preview {args.preview}px")
+    print(f"{'size':>10} {'mediapipe':>10} {'in place':>9} {'preview':>8} {'batched':>8} {'diff px':>8}")
+
+    for size in args.sizes.split(','):
+        width, height = (int(v) for v in size.split('x'))
+        base = np.random.default_rng(1).integers(0, 256, (height, width, 3), dtype=np.uint8)
+        angles = [pipeline.measure(pipeline.PoseRecord(frame, width, height)) for frame in landmarks]
+        # Fresh buffers per run would dominate at 4K; drawing over earlier
+        # overlays costs the same
+        frames = [base.copy() for _ in range(min(args.batch, args.frames))]
+
+        def old():
+            for index in range(args.frames):
+                mediapipe_render(base, landmarks[index], angles[index], label)
+
+        def in_place():
+            for index in range(args.frames):
+                renderer.render(frames[index % len(frames)], landmarks[index], angles[index], label, in_place=True)
+
+        def preview():
+            for index in range(args.frames):
+                renderer.render(base, landmarks[index], angles[index], label, max_side=args.preview)
+
+        def batched():
+            for start in range(0, args.frames, args.batch):
+                chunk = slice(start, start + args.batch)
+                count = len(landmarks[chunk])
+                renderer.render_batch(frames[:count], landmarks[chunk], angles[chunk], [label] * count)
+
+        timings = [time_per_frame(draw, args.frames, args.repeat) for draw in (old, in_place, preview, batched)]
+
+        expected = mediapipe_render(base, landmarks[0], angles[0], label)
+        actual = renderer.render(base, landmarks[0], angles[0], label)
+        different = int(np.any(expected != actual, axis=2).sum())
+        print(f"{size:>10} " + ' '.join(f"{ms:{column}.2f}" for ms, column in zip(timings, (10, 9, 8, 8)))
+              + f" {different:8d}")
+
+
+if __name__ == '__main__':
+    main()
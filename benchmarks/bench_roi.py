@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+ROI inference benchmark
+Places every photo (one fencer each) small in a wide synthetic gym shot,
+at several subject heights and slightly jittered positions, and runs
+pipeline.analyze on the encoded shot with full-frame and ROI inference.
+For each subject height it reports how often a pose was found, median
+latency, the mean angle error against the photo analyzed on its own, and
+the angle jitter across positions (mean standard deviation, degrees).
+
+    python benchmarks/bench_roi.py --images DIR [--scene 3840x2160] [--heights 0.5,0.3,0.2,0.12] [--tier heavy]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import landmark_cache
+import pipeline
+import pose_engine
+import presence_gate
+from bench_tiers import COMPARED_ANGLES, load_images
+
+POSITIONS = 5
+
+
+def background(width, height, seed=0):
+    """A floor, a wall and some low-contrast clutter, identical on every run"""
+    rng = np.random.default_rng(seed)
+    scene = np.empty((height, width, 3), dtype=np.uint8)
+    scene[:height * 2 // 3] = (150, 160, 170)
+    scene[height * 2 // 3:] = (60, 90, 120)
+    clutter = cv2.GaussianBlur(rng.integers(0, 256, (height // 8, width // 8, 3), dtype=np.uint8), (0, 0), 3)
+    scene = cv2.addWeighted(scene, 0.8, cv2.resize(clutter, (width, height)), 0.2, 0)
+    return scene
+
+
+def place(scene, subject, subject_height, x, y):
+    """Copy of scene with subject scaled to subject_height pixels pasted with its top left at (x, y)"""
+    height, width = subject.shape[:2]
+    subject_width = max(1, round(width * subject_height / height))
+    shot = scene.copy()
+    x = min(x, scene.shape[1] - subject_width)
+    y = min(y, scene.shape[0] - subject_height)
+    shot[y:y + subject_height, x:x + subject_width] = cv2.resize(subject, (subject_width, subject_height),
+                                                                 interpolation=cv2.INTER_AREA)
+    return shot
+
+
+def angle_vector(analysis):
+    if analysis.angles is None:
+        return None
+    return np.array([analysis.angles[name] for name in COMPARED_ANGLES])
+
+
+def run(data, tier, roi, repeat):
+    """Median latency (ms) of analyze on encoded bytes, and its angles"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        analysis = pipeline.analyze(data, 'en_garde', draw=False, tier=tier, roi=roi)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), angle_vector(analysis)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--images', required=True, help="Directory of photos showing one fencer each")
+    parser.add_argument('--count', type=int, default=20)
+    parser.add_argument('--scene', default='3840x2160', help="Size of the wide shot, WIDTHxHEIGHT")
+    parser.add_argument('--heights', default='0.5,0.3,0.2,0.12', help="Subject heights as a share of the shot")
+    parser.add_argument('--tier', default=None, choices=sorted(pose_engine.TIERS) + [pose_engine.AUTO_TIER])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    scene_width, scene_height = (int(v) for v in args.scene.lower().split('x'))
+    heights = [float(v) for v in args.heights.split(',')]
+    # Every run should reach the model rather than an earlier result
+    landmark_cache.configure(max_entries=0)
+    pose_engine.warm_up(tier=args.tier)
+    presence_gate.warm_up()
+
+    subjects = []
+    for name, image in load_images(args.images, args.count):
+        reference = angle_vector(pipeline.analyze(image, 'en_garde', draw=False, max_side=0, tier=args.tier))
+        if reference is None:
+            print(f"skipping {name}: no pose on its own")
+            continue
+        subjects.append((name, image, reference))
+    if not subjects:
+        sys.exit("No photo with a detectable pose")
+
+    scene = background(scene_width, scene_height)
+    rng = np.random.default_rng(1)
+    print(f"{len(subjects)} photos in a {scene_width}x{scene_height} shot, {POSITIONS} positions each")
+    print(f"{'height':>6} {'mode':>6} {'found':>6} {'ms':>7} {'error':>6} {'jitter':>6}")
+    for share in heights:
+        subject_height = round(scene_height * share)
+        shots = []
+        for _, image, reference in subjects:
+            x, y = rng.integers(0, scene_width // 2), rng.integers(0, scene_height - subject_height + 1)
+            for _ in range(POSITIONS):
+                # A few pixels of jitter: a stable estimate should barely move
+                shot = place(scene, image, subject_height, int(x + rng.integers(0, 8)), int(y + rng.integers(0, 8)))
+                shots.append((cv2.imencode('.jpg', shot, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes(), reference))
+
+        for mode, roi in (('full', False), ('roi', True)):
+            latencies, errors, found = [], [], 0
+            per_subject = {}
+            for index, (data, reference) in enumerate(shots):
+                elapsed, angles = run(data, args.tier, roi, args.repeat)
+                latencies.append(elapsed)
+                if angles is not None:
+                    found += 1
+                    errors.append(np.abs(angles - reference).mean())
+                    per_subject.setdefault(index // POSITIONS, []).append(angles)
+            jitter = [np.stack(runs).std(axis=0).mean() for runs in per_subject.values() if len(runs) > 1]
+            print(f"{share:>6.2f} {mode:>6} {found / len(shots):>6.0%} {statistics.median(latencies):>7.1f} "
+                  f"{np.mean(errors) if errors else float('nan'):>6.1f} "
+                  f"{np.mean(jitter) if jitter else float('nan'):>6.2f}")
+
+
+if __name__ == '__main__':
+    main()
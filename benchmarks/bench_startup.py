@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark
+Measures, in fresh interpreters, how long each module takes to import, how
+long the CLIs take to print --help, and the time to the first /analyze
+response with and without preloading the model.
+
+    python benchmarks/bench_startup.py [--root CHECKOUT] [--image PHOTO] [--runs 3]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ['app', 'enGarde', 'lunge', 'pipeline', 'video', 'batch']
+CLIS = ['batch.py', 'video.py']
+
+IMPORT_SCRIPT = """
+import time
+started = time.perf_counter()
+import {module}
+print(time.perf_counter() - started)
+"""
+
+# Prints seconds for: importing app, preloading (0 if skipped), the first and a second response
+FIRST_RESPONSE_SCRIPT = """
+import io, json, sys, time
+started = time.perf_counter()
+import app as app_module
+import inference_pool
+imported = time.perf_counter()
+if {preload}:
+    inference_pool.start()
+preloaded = time.perf_counter()
+client = app_module.app.test_client()
+with open({image!r}, 'rb') as f:
+    data = f.read()
+timings = []
+for _ in range(2):
+    request_started = time.perf_counter()
+    response = client.post('/analyze', data={{'pose_type': 'lunge', 'response': 'metrics',
+                                               'image': (io.BytesIO(data), 'image.jpg')}})
+    assert response.status_code == 200, response.status_code
+    timings.append(time.perf_counter() - request_started)
+print(json.dumps([imported - started, preloaded - imported, *timings]))
+"""
+
+
+def run_python(root, code, args=(), env=None):
+    result = subprocess.run([sys.executable, *(['-c', code] if code else []), *args], cwd=root,
+                            capture_output=True, text=True, env={**os.environ, **(env or {})})
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else 'failed')
+    return result.stdout.strip().splitlines()[-1] if result.stdout.strip() else ''
+
+
+def median_ms(samples):
+    return round(statistics.median(samples) * 1000, 1)
+
+
+def synthetic_image(path):
+    import cv2
+    import numpy as np
+
+    image = np.random.default_rng(0).integers(0, 256, size=(720, 1280, 3), dtype=np.uint8)
+    cv2.imwrite(path, image)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--root', default=ROOT, help='Checkout to measure (default: this one)')
+    parser.add_argument('--image', help='Photo for the first-response test (default: synthetic 720p frame)')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=0, help='INFERENCE_WORKERS for the first-response test')
+    args = parser.parse_args()
+
+    root = os.path.abspath(args.root)
+    image = os.path.abspath(args.image) if args.image else synthetic_image(os.path.join('/tmp', 'bench_startup.jpg'))
+    env = {'INFERENCE_WORKERS': str(args.workers), 'LANDMARK_CACHE_SIZE': '0', 'LANDMARK_CACHE_DIR': ''}
+    report = {'root': root, 'import_ms': {}, 'cli_help_ms': {}, 'first_response_ms': {}}
+
+    for module in MODULES:
+        samples = [float(run_python(root, IMPORT_SCRIPT.format(module=module))) for _ in range(args.runs)]
+        report['import_ms'][module] = median_ms(samples)
+
+    for cli in CLIS:
+        samples = []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            run_python(root, None, [cli, '--help'])
+            samples.append(time.perf_counter() - started)
+        report['cli_help_ms'][cli] = median_ms(samples)
+
+    for preload in (False, True):
+        runs = [json.loads(run_python(root, FIRST_RESPONSE_SCRIPT.format(preload=preload, image=image), env=env))
+                for _ in range(args.runs)]
+        import_s, preload_s, first_s, second_s = zip(*runs)
+        report['first_response_ms']['preloaded' if preload else 'lazy'] = {
+            'import_app': median_ms(import_s),
+            'preload': median_ms(preload_s),
+            'first_response': median_ms(first_s),
+            'second_response': median_ms(second_s),
+        }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Headless benchmark suite for the analysis pipeline
+Runs a fixed corpus of synthetic (and optional sample) images at several
+resolutions through the pipeline stages, the analyze_engarde_pose and
+analyze_lunge_pose entry points and the Flask /analyze route, reporting
+p50/p95/p99 latency per stage, throughput under concurrent clients and
+peak RSS. Results are written as JSON so runs can be diffed across commits.
+
+    python benchmarks/bench_suite.py --output before.json
+    python benchmarks/bench_suite.py --output after.json --compare before.json
+"""
+
+import argparse
+import glob
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+RESOLUTIONS = {
+    '480p': (640, 480),
+    '720p': (1280, 720),
+    '1080p': (1920, 1080),
+    '12mp': (4032, 3024),
+}
+STAGES = ['decode', 'inference', 'feedback', 'drawing', 'encode', 'total']
+
+
+def synthetic_sources(seed=0):
+    """A noise frame and a drawn figure on a gradient, identical on every run"""
+    rng = np.random.default_rng(seed)
+    noise = rng.integers(0, 256, size=(480, 640, 3), dtype=np.uint8)
+
+    figure = np.tile(np.linspace(40, 200, 640, dtype=np.uint8)[None, :, None], (480, 1, 3))
+    joints = {'head': (320, 90), 'neck': (320, 140), 'hip': (320, 270),
+              'front_hand': (470, 160), 'back_hand': (200, 110),
+              'front_knee': (400, 340), 'front_foot': (430, 440),
+              'back_knee': (250, 350), 'back_foot': (190, 440)}
+    cv2.circle(figure, joints['head'], 35, (60, 90, 200), -1)
+    for a, b in [('neck', 'hip'), ('neck', 'front_hand'), ('neck', 'back_hand'), ('hip', 'front_knee'),
+                 ('front_knee', 'front_foot'), ('hip', 'back_knee'), ('back_knee', 'back_foot')]:
+        cv2.line(figure, joints[a], joints[b], (30, 30, 30), 18)
+    return [('noise', noise), ('figure', figure)]
+
+
+def build_corpus(image_dir, resolutions, seed=0):
+    """
+    JPEG-encode every source image at every resolution
+    Returns:
+        List of (name, resolution label, JPEG bytes)
+    """
+    sources = synthetic_sources(seed)
+    if image_dir:
+        for path in sorted(glob.glob(os.path.join(image_dir, '*'))):
+            image = cv2.imread(path)
+            if image is not None:
+                sources.append((os.path.splitext(os.path.basename(path))[0], image))
+
+    corpus = []
+    for name, image in sources:
+        for label in resolutions:
+            width, height = RESOLUTIONS[label]
+            scale = min(width / image.shape[1], height / image.shape[0])
+            interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+            resized = cv2.resize(image, None, fx=scale, fy=scale, interpolation=interpolation)
+            _, buffer = cv2.imencode('.jpg', resized, [cv2.IMWRITE_JPEG_QUALITY, 90])
+            corpus.append((name, label, buffer.tobytes()))
+    return corpus
+
+
+def summarize(samples_ms):
+    """Latency distribution of a list of millisecond timings"""
+    if not samples_ms:
+        return {'n': 0}
+    samples = np.asarray(samples_ms)
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {'n': len(samples), 'mean': round(float(samples.mean()), 2), 'p50': round(float(p50), 2),
+            'p95': round(float(p95), 2), 'p99': round(float(p99), 2), 'max': round(float(samples.max()), 2)}
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its finished children, in MB"""
+    scale = 1 / 1024 if sys.platform != 'darwin' else 1 / 2**20  # ru_maxrss is KB on Linux
+    return {'self': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale, 1),
+            'children': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale, 1)}
+
+
+def bench_stages(corpus, pose_type, repeat):
+    """Time decode -> inference -> feedback -> drawing -> encode separately"""
+    import image_io
+    import pipeline
+
+    timings = {stage: [] for stage in STAGES}
+    by_resolution = {}
+    detected = 0
+
+    for _, label, data in corpus:
+        for _ in range(repeat):
+            stage_ms = {}
+            start = last = time.perf_counter()
+
+            def lap(stage):
+                nonlocal last
+                now = time.perf_counter()
+                stage_ms[stage] = (now - last) * 1000
+                last = now
+
+            image, full_size = image_io.decode_scaled(data, image_io.MAX_IMAGE_SIDE)
+            lap('decode')
+            record = pipeline.detect(image, full_size)
+            lap('inference')
+            if record is not None:
+                angles = pipeline.measure(record)
+                pipeline.evaluate(pose_type, angles)
+                lap('feedback')
+                annotated_image = pipeline.render(image, record, angles, pose_type)
+                lap('drawing')
+                image_io.encode_image(annotated_image)
+                lap('encode')
+            stage_ms['total'] = (time.perf_counter() - start) * 1000
+
+            for stage, elapsed in stage_ms.items():
+                timings[stage].append(elapsed)
+            by_resolution.setdefault(label, []).append(stage_ms['total'])
+        detected += record is not None
+
+    return {'stages': {stage: summarize(samples) for stage, samples in timings.items()},
+            'total_by_resolution': {label: summarize(samples) for label, samples in by_resolution.items()},
+            'pose_found': f"{detected}/{len(corpus)}"}
+
+
+def bench_entry_points(corpus, repeat):
+    """Time analyze_engarde_pose and analyze_lunge_pose on image files"""
+    from enGarde import analyze_engarde_pose
+    from lunge import analyze_lunge_pose
+
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = []
+        for index, (name, label, data) in enumerate(corpus):
+            path = os.path.join(temp_dir, f"{index:03d}_{name}_{label}.jpg")
+            with open(path, 'wb') as f:
+                f.write(data)
+            paths.append(path)
+
+        for entry_point in (analyze_engarde_pose, analyze_lunge_pose):
+            samples = []
+            for path in paths:
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    entry_point(path)
+                    samples.append((time.perf_counter() - start) * 1000)
+            results[entry_point.__name__] = summarize(samples)
+    return results
+
+
+def bench_http(corpus, clients, requests_per_client, response_mode):
+    """
+    Drive /analyze through the Flask test client from concurrent threads
+    Returns:
+        Dict per client count with latency, throughput and status codes
+    """
+    import app as app_module
+
+    results = {}
+    for client_count in clients:
+        latencies = []
+        statuses = {}
+        lock = threading.Lock()
+
+        def client(offset):
+            test_client = app_module.app.test_client()
+            for i in range(requests_per_client):
+                name, label, data = corpus[(offset + i) % len(corpus)]
+                start = time.perf_counter()
+                response = test_client.post('/analyze', data={
+                    'pose_type': 'lunge', 'response': response_mode,
+                    'image': (io.BytesIO(data), f"{name}_{label}.jpg")})
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(client_count)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+
+        results[str(client_count)] = {
+            'latency': summarize(latencies),
+            'throughput_rps': round(len(latencies) / wall, 2),
+            'status_codes': {str(code): count for code, count in sorted(statuses.items())},
+        }
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment():
+    import mediapipe
+
+    import image_io
+    import pose_engine
+
+    return {
+        'commit': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'mediapipe': mediapipe.__version__,
+        'model_complexity': pose_engine.POSE_SETTINGS['model_complexity'],
+        'tier': pose_engine.DEFAULT_TIER,
+        'max_image_side': image_io.MAX_IMAGE_SIDE,
+    }
+
+
+def p50_entries(report, path=()):
+    """Yield (path, p50) for every latency summary in a report"""
+    if isinstance(report, dict):
+        if 'p50' in report:
+            yield '.'.join(path), report['p50']
+        for key, value in report.items():
+            yield from p50_entries(value, path + (key,))
+
+
+def compare(report, baseline):
+    """Print p50 changes against a baseline report"""
+    previous = dict(p50_entries(baseline))
+    print(f"\np50 vs {baseline['environment'].get('commit')}:")
+    for path, p50 in p50_entries(report):
+        if path in previous and previous[path]:
+            change = (p50 - previous[path]) / previous[path] * 100
+            print(f"  {path:<55} {previous[path]:9.1f} -> {p50:9.1f} ms ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--images', help='Directory of sample photos added to the synthetic corpus')
+    parser.add_argument('--resolutions', default=','.join(RESOLUTIONS), help='Comma-separated labels')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per image for the stage benchmarks')
+    parser.add_argument('--clients', default='1,4', help='Comma-separated concurrent client counts for /analyze')
+    parser.add_argument('--requests', type=int, default=10, help='Requests per client')
+    parser.add_argument('--workers', type=int, default=0, help='Inference worker processes for /analyze (0 = inline)')
+    parser.add_argument('--response', default='metrics', help='/analyze response mode')
+    parser.add_argument('--model-complexity', type=int, default=None)
+    parser.add_argument('--skip-http', action='store_true')
+    parser.add_argument('--output', help='Write the JSON report to this path')
+    parser.add_argument('--compare', help='Baseline JSON report to compare p50 latencies against')
+    args = parser.parse_args()
+
+    clients = [int(count) for count in args.clients.split(',')]
+    # Measure the model, not the landmark cache; settings reach spawned workers through the environment
+    os.environ['LANDMARK_CACHE_SIZE'] = '0'
+    os.environ['LANDMARK_CACHE_DIR'] = ''
+    os.environ['INFERENCE_WORKERS'] = str(args.workers)
+    os.environ.setdefault('INFERENCE_MAX_IN_FLIGHT', str(max(clients + [args.workers * 2, 1])))
+
+    import inference_pool
+    import landmark_cache
+    import pose_engine
+
+    landmark_cache.configure(max_entries=0)
+    if args.model_complexity is not None:
+        pose_engine.POSE_SETTINGS['model_complexity'] = args.model_complexity
+        os.environ.setdefault('POSE_TIER', {v: k for k, v in pose_engine.TIERS.items()}[args.model_complexity])
+    pose_engine.warm_up()
+
+    corpus = build_corpus(args.images, args.resolutions.split(','))
+    print(f"{len(corpus)} images, {args.repeat} runs each", file=sys.stderr)
+
+    report = {'environment': environment(), 'corpus': [f"{name}@{label}" for name, label, _ in corpus]}
+    report['stages'] = {pose_type: bench_stages(corpus, pose_type, args.repeat) for pose_type in ('en_garde', 'lunge')}
+    report['entry_points'] = bench_entry_points(corpus, args.repeat)
+    if not args.skip_http:
+        inference_pool.configure(args.workers, int(os.environ['INFERENCE_MAX_IN_FLIGHT']))
+        inference_pool.start()
+        try:
+            report['http'] = bench_http(corpus, clients, args.requests, args.response)
+        finally:
+            inference_pool.shutdown_pool()
+    report['peak_rss_mb'] = peak_rss_mb()
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Pose model tier benchmark
+Runs every image through each speed tier (lite, full, heavy, auto) and
+reports latency and how far the angles move from the reference tier.
+
+    python benchmarks/bench_tiers.py --images DIR [--tiers lite,full,heavy,auto] [--reference heavy]
+"""
+
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import landmark_cache
+import pipeline
+import pose_engine
+
+# Angles the feedback rules read
+COMPARED_ANGLES = ['front_knee', 'back_knee', 'front_elbow', 'back_elbow',
+                   'spine_vertical', 'forearm_horizontal', 'arm_leg_alignment']
+
+
+def load_images(image_dir, count):
+    paths = sorted(glob.glob(os.path.join(image_dir, '*')))
+    images = [(os.path.basename(p), cv2.imread(p)) for p in paths]
+    return [(name, image) for name, image in images if image is not None][:count]
+
+
+def run(image, tier, repeat):
+    """Median latency (ms) of detect + measure, with the angles and model used"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        record = pipeline.detect(image, tier=tier)
+        angles = pipeline.measure(record) if record is not None else None
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), angles, record.model_complexity if record is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--images', required=True, help='Directory of reference photos')
+    parser.add_argument('--tiers', default='lite,full,heavy,auto')
+    parser.add_argument('--reference', default='heavy', help='Tier the angle deltas are measured against')
+    parser.add_argument('--count', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    # Every run must go through the model
+    landmark_cache.configure(max_entries=0)
+    tiers = args.tiers.split(',')
+    images = load_images(args.images, args.count)
+    if not images:
+        sys.exit("No images to benchmark")
+
+    for tier in dict.fromkeys(tiers + [args.reference]):
+        pose_engine.warm_up(tier=tier)
+
+    reference = {name: run(image, args.reference, 1)[1] for name, image in images}
+    print(f"{len(images)} images, reference tier {args.reference}, "
+          f"auto escalates below visibility {pose_engine.AUTO_MIN_VISIBILITY}")
+    print(f"{'tier':>6} {'median ms':>10} {'mean delta':>11} {'max delta':>10} {'found':>6} {'escalated':>10}")
+
+    for tier in tiers:
+        latencies, deltas = [], []
+        found = escalated = 0
+        for name, image in images:
+            latency, angles, model_complexity = run(image, tier, args.repeat)
+            latencies.append(latency)
+            if angles is None:
+                continue
+            found += 1
+            escalated += tier == pose_engine.AUTO_TIER and model_complexity != pose_engine.TIERS['lite']
+            if reference[name] is not None:
+                deltas.append([abs(angles[key] - reference[name][key]) for key in COMPARED_ANGLES])
+
+        deltas = np.array(deltas) if deltas else np.array([np.nan])
+        print(f"{tier:>6} {statistics.median(latencies):10.1f} {deltas.mean():11.1f} {deltas.max():10.1f} "
+              f"{found:>3}/{len(images)} {escalated if tier == pose_engine.AUTO_TIER else '-':>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+"""
+Declarative pose criteria
+Stances are defined in a JSON file (criteria.json by default, or the path
+in POSE_CRITERIA) and compiled once into flat arrays, so every rule of
+every stance is checked against one frame or a batch of frames with a few
+numpy operations. The file has two sections:
+
+    "angles": extra joint angles, name -> {"joints": [a, b, c], "side": s}
+        measured at b. Joints are shoulder, elbow, wrist, hip, knee, ankle,
+        heel or foot_index; side is "front" or "back" (resolved per frame
+        from the facing direction, as kinematics.compute_angles does for
+        front_knee and friends), "right" or "left".
+    "stances": name -> {
+        "title": name shown in the web form,
+        "label": text drawn on annotated images,
+        "profile": angle -> [low, high] typical of the stance, used by
+            stance_classifier for pose_type 'auto' (optional; stances
+            without one are never picked automatically),
+        "rules": list of {"name", "angle", "message", and one check}:
+            "below": x / "above": x     broken when the angle is outside
+            "abs": true                 compare the absolute angle
+            "target": t, "tolerance": d broken when |angle - t| > d
+        }
+
+Messages are format strings given the measured angle as {value}. A new
+stance such as a fleche or a retreat is one more entry under "stances".
+"""
+
+import json
+import os
+import threading
+
+import numpy as np
+
+import kinematics
+
+CRITERIA_PATH = os.environ.get('POSE_CRITERIA') or os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                 'criteria.json')
+
+# Joints custom angles may use: (right landmark, left landmark)
+JOINTS = {
+    'shoulder': (kinematics.RIGHT_SHOULDER, kinematics.LEFT_SHOULDER),
+    'elbow': (kinematics.RIGHT_ELBOW, kinematics.LEFT_ELBOW),
+    'wrist': (kinematics.RIGHT_WRIST, kinematics.LEFT_WRIST),
+    'hip': (kinematics.RIGHT_HIP, kinematics.LEFT_HIP),
+    'knee': (kinematics.RIGHT_KNEE, kinematics.LEFT_KNEE),
+    'ankle': (kinematics.RIGHT_ANKLE, kinematics.LEFT_ANKLE),
+    'heel': (kinematics.RIGHT_HEEL, kinematics.LEFT_HEEL),
+    'foot_index': (kinematics.RIGHT_FOOT_INDEX, kinematics.LEFT_FOOT_INDEX),
+}
+SIDES = ('front', 'back', 'right', 'left')
+RULE_KEYS = {'name', 'angle', 'message', 'below', 'above', 'abs', 'target', 'tolerance'}
+# Rules per stance; landmark_archive keeps a pose's broken rules as one 64-bit mask
+MAX_RULES = 64
+
+_lock = threading.Lock()
+_criteria = None
+
+
+class Criteria:
+    """A compiled criteria file; see the module docstring for the format"""
+
+    def __init__(self, config):
+        custom = config.get('angles', {})
+        stances = config.get('stances')
+        if not stances:
+            raise ValueError("criteria: no stances defined")
+
+        self.angle_names = list(kinematics.ANGLE_NAMES)
+        self._custom = []  # (name, right (a, b, c), left (a, b, c), side)
+        for name, spec in custom.items():
+            joints, side = spec.get('joints'), spec.get('side')
+            if name in self.angle_names or name == 'facing_right':
+                raise ValueError(f"criteria: angle {name!r} is already defined")
+            if not isinstance(joints, list) or len(joints) != 3 or not all(joint in JOINTS for joint in joints):
+                raise ValueError(f"criteria: angle {name!r} needs three joints from {', '.join(JOINTS)}")
+            if side not in SIDES:
+                raise ValueError(f"criteria: angle {name!r} side must be one of {', '.join(SIDES)}")
+            self._custom.append((name, tuple(JOINTS[joint][0] for joint in joints),
+                                 tuple(JOINTS[joint][1] for joint in joints), side))
+            self.angle_names.append(name)
+        columns = {name: index for index, name in enumerate(self.angle_names)}
+
+        self.stances = list(stances)
+        self.titles, self.labels = {}, {}
+        self._rules = {}  # stance -> slice of the rule arrays
+        rules, profiles = [], []
+        for stance_index, (stance, spec) in enumerate(stances.items()):
+            self.titles[stance] = spec.get('title', stance.replace('_', ' ').title())
+            self.labels[stance] = spec.get('label', f"Stance: {stance}")
+            first = len(rules)
+            for rule in spec.get('rules', []):
+                rules.append(self._compile_rule(stance, rule, columns))
+            names = [rule['name'] for rule in rules[first:]]
+            if len(set(names)) != len(names):
+                raise ValueError(f"criteria: {stance} has two rules with the same name")
+            if len(names) > MAX_RULES:
+                raise ValueError(f"criteria: {stance} has more than {MAX_RULES} rules")
+            self._rules[stance] = slice(first, len(rules))
+            for angle, (low, high) in spec.get('profile', {}).items():
+                if angle not in columns:
+                    raise ValueError(f"criteria: {stance} profile uses unknown angle {angle!r}")
+                profiles.append((stance_index, columns[angle], low, high))
+
+        self.rule_names = [rule['name'] for rule in rules]
+        self.rule_stances = [rule['stance'] for rule in rules]
+        self._messages = [rule['message'] for rule in rules]
+        self._rule_angle = np.array([rule['column'] for rule in rules], dtype=np.intp)
+        self._rule_center = np.array([rule['center'] for rule in rules], dtype=np.float64)
+        self._rule_abs = np.array([rule['abs'] for rule in rules], dtype=bool)
+        self._rule_low = np.array([rule['low'] for rule in rules], dtype=np.float64)
+        self._rule_high = np.array([rule['high'] for rule in rules], dtype=np.float64)
+
+        # Profile ranges, and which stance each belongs to as a (K, S) matrix
+        # so the distances of every stance come out of one matrix product
+        self.classified_stances = [self.stances[index] for index in sorted({entry[0] for entry in profiles})]
+        self._profile_angle = np.array([entry[1] for entry in profiles], dtype=np.intp)
+        self._profile_low = np.array([entry[2] for entry in profiles], dtype=np.float64)
+        self._profile_high = np.array([entry[3] for entry in profiles], dtype=np.float64)
+        self._profile_stance = np.zeros((len(profiles), len(self.classified_stances)))
+        for row, entry in enumerate(profiles):
+            self._profile_stance[row, self.classified_stances.index(self.stances[entry[0]])] = 1.0
+
+    @staticmethod
+    def _compile_rule(stance, rule, columns):
+        where = f"criteria: {stance} rule {rule.get('name')!r}"
+        unknown = set(rule) - RULE_KEYS
+        if unknown:
+            raise ValueError(f"{where} has unknown keys {', '.join(sorted(unknown))}")
+        if not rule.get('name') or not rule.get('message'):
+            raise ValueError(f"{where} needs a name and a message")
+        if rule.get('angle') not in columns:
+            raise ValueError(f"{where} uses unknown angle {rule.get('angle')!r}")
+        if 'target' in rule:
+            if 'tolerance' not in rule or 'below' in rule or 'above' in rule:
+                raise ValueError(f"{where}: target needs a tolerance and no below/above")
+            center, use_abs, low, high = rule['target'], True, -np.inf, rule['tolerance']
+        elif 'below' in rule or 'above' in rule:
+            center, use_abs = 0.0, bool(rule.get('abs', False))
+            low, high = rule.get('below', -np.inf), rule.get('above', np.inf)
+        else:
+            raise ValueError(f"{where} needs below, above or target")
+        try:
+            rule['message'].format(value=0.0)
+        except (KeyError, IndexError, ValueError) as e:
+            raise ValueError(f"{where} has a bad message: {e}") from None
+        return {'stance': stance, 'name': rule['name'], 'message': rule['message'], 'column': columns[rule['angle']],
+                'center': float(center), 'abs': use_abs, 'low': float(low), 'high': float(high)}
+
+    def compute_angles(self, points, image_height):
+        """
+        kinematics.compute_angles plus the custom angles of this file
+        Parameters:
+            points: (33, >=2) or (N, 33, >=2) pixel coordinates
+            image_height: Height of the image(s), scalar or shape (N,)
+        Returns:
+            Dict of arrays shaped () or (N,)
+        """
+        angles = kinematics.compute_angles(points, image_height)
+        if self._custom:
+            points = np.asarray(points, dtype=np.float64)
+            facing_right = angles['facing_right']
+            for name, right, left, side in self._custom:
+                right_angle = kinematics.joint_angle(*(points[..., index, :2] for index in right))
+                left_angle = kinematics.joint_angle(*(points[..., index, :2] for index in left))
+                if side in ('front', 'back'):
+                    angles[name] = np.where(facing_right == (side == 'front'), right_angle, left_angle)
+                else:
+                    angles[name] = right_angle if side == 'right' else left_angle
+        return angles
+
+    def _values(self, angles, columns):
+        return np.stack([np.asarray(angles[self.angle_names[column]], dtype=np.float64) for column in columns],
+                        axis=-1)
+
+    def check(self, angles):
+        """
+        Every rule of every stance in one pass
+        Parameters:
+            angles: Dict from compute_angles, values shaped () or (N,)
+        Returns:
+            Boolean array (..., rules), True where a rule is broken; columns
+            follow rule_names / rule_stances
+        """
+        # NaN angles (e.g. from coincident joints) break no rule
+        values = self._values(angles, self._rule_angle) - self._rule_center
+        values = np.where(self._rule_abs, np.abs(values), values)
+        return (values < self._rule_low) | (values > self._rule_high)
+
+    def faults(self, stance, angles, broken=None):
+        """
+        One stance's rules as a dict of rule name to boolean arrays
+        Parameters:
+            broken: Result of check() to reuse instead of checking again
+        """
+        rules = self._rules[stance]
+        broken = self.check(angles) if broken is None else broken
+        return dict(zip(self.rule_names[rules], np.moveaxis(broken[..., rules], -1, 0)))
+
+    def _messages_for(self, stance, angles, broken):
+        rules = self._rules[stance]
+        return [self._messages[index].format(value=float(angles[self.angle_names[self._rule_angle[index]]]))
+                for index in range(rules.start, rules.stop) if broken[index]]
+
+    def evaluate(self, stance, angles):
+        """Feedback messages for one frame in the given stance"""
+        return self._messages_for(stance, angles, self.check(angles))
+
+    def evaluate_all(self, angles):
+        """Feedback messages of every stance for one frame, from a single check"""
+        broken = self.check(angles)
+        return {stance: self._messages_for(stance, angles, broken) for stance in self.stances}
+
+    def profile_distance(self, angles):
+        """
+        How far a pose is from each stance's profile, vectorized
+        Returns:
+            Array (..., len(classified_stances)) of the summed squared
+            degrees by which the profile angles fall outside their ranges
+        """
+        values = self._values(angles, self._profile_angle)
+        outside = np.maximum(self._profile_low - values, 0) + np.maximum(values - self._profile_high, 0)
+        return (outside ** 2) @ self._profile_stance
+
+
+def load(path=None):
+    """
+    Read and compile a criteria file, making it the one get() returns
+    Raises:
+        ValueError: if the file does not describe valid criteria
+    """
+    global _criteria
+    with open(path or CRITERIA_PATH) as f:
+        compiled = Criteria(json.load(f))
+    with _lock:
+        _criteria = compiled
+    return compiled
+
+
+def get():
+    """The compiled criteria, loading CRITERIA_PATH on first use"""
+    return _criteria if _criteria is not None else load()
@@ -0,0 +1,83 @@
+"""
+Production serving with gunicorn; every setting comes from the environment
+
+    gunicorn            # picks up this file from the working directory
+
+Each gunicorn worker builds the app through create_app after forking and
+starts its own inference pool, so MediaPipe is never loaded in the master.
+Threads only wait on the pool, so keep WEB_THREADS at or above
+INFERENCE_MAX_IN_FLIGHT and let the pool's admission control answer 503s.
+Every open /live session holds a thread for as long as it is connected, so
+the default adds LIVE_MAX_SESSIONS on top.
+"""
+
+import os
+import signal
+import time
+
+wsgi_app = 'app:create_app()'
+# Never import the app in the master: models must load after the fork
+preload_app = False
+
+bind = os.environ.get('BIND', f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', '5000')}")
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', 8 + int(os.environ.get('LIVE_MAX_SESSIONS', 16))))
+
+# Long inferences answer 504 after INFERENCE_TIMEOUT; gunicorn only steps in
+# when a worker stops responding well past that
+_inference_timeout = float(os.environ.get('INFERENCE_TIMEOUT', 60))
+timeout = int(os.environ.get('WEB_TIMEOUT', _inference_timeout + 30))
+# On SIGTERM workers stop accepting connections and finish in-flight
+# requests for up to this long before exiting
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', _inference_timeout + 5))
+keepalive = int(os.environ.get('WEB_KEEPALIVE', 5))
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('WEB_MAX_REQUESTS_JITTER', 0))
+
+accesslog = os.environ.get('ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info')
+
+
+# The master sends SIGKILL graceful_timeout after SIGTERM, and gunicorn only
+# runs worker_exit once open requests have finished or that time has passed,
+# so the pool drain gets what is left of it, less a margin for shutting down
+_DRAIN_MARGIN = 1.0
+_drain_deadline = None
+
+
+def post_worker_init(worker):
+    """Note when SIGTERM arrives and stop the job queue straight away"""
+    handle_exit = worker.handle_exit
+
+    def on_term(sig, frame):
+        global _drain_deadline
+        import jobs
+
+        if _drain_deadline is None:
+            _drain_deadline = time.monotonic() + graceful_timeout - _DRAIN_MARGIN
+            jobs.stop()
+        handle_exit(sig, frame)
+
+    signal.signal(signal.SIGTERM, on_term)
+
+
+def worker_int(worker):
+    """SIGINT and SIGQUIT stop the worker at once: leave the pool no time"""
+    global _drain_deadline
+    _drain_deadline = time.monotonic()
+
+
+def worker_exit(server, worker):
+    """Let analyses still running on this worker's pool finish, within the master's deadline"""
+    import inference_pool
+    import jobs
+
+    # Exits without a signal (max_requests) have the whole graceful period
+    deadline = _drain_deadline if _drain_deadline is not None else time.monotonic() + graceful_timeout
+    failed = jobs.stop()
+    if failed:
+        worker.log.warning("%d queued jobs failed at shutdown", failed)
+    if not inference_pool.drain(timeout=max(deadline - time.monotonic(), 0)):
+        worker.log.warning("Inference pool drain timed out; pending analyses were cancelled")
@@ -0,0 +1,144 @@
+import io
+import os
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Longest side, in pixels, that images are analyzed at; 0 keeps full resolution.
+# The pose model works on a 256 px input, so larger photos only cost decode
+# time and memory.
+MAX_IMAGE_SIDE = int(os.environ.get('MAX_IMAGE_SIDE', 1280))
+
+# cv2 decode flags that shrink the image while decoding (JPEG scales in the DCT)
+_REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                  (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+def decode_image(data):
+    """
+    Decode an encoded image held in memory
+    Parameters:
+        data: Encoded image as bytes, bytearray, memoryview or uint8 array
+    Returns:
+        BGR image as a numpy array, or None if the data could not be decoded
+    """
+    buffer = np.frombuffer(data, dtype=np.uint8) if not isinstance(data, np.ndarray) else data
+    if buffer.size == 0:
+        return None
+    return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+
+def image_size(data):
+    """
+    Read the (width, height) of an encoded image from its header without
+    decoding the pixels
+    Returns:
+        Tuple of (width, height), or None if the format is not recognised
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as header:
+            return header.size
+    except Exception:
+        return None
+
+
+def downscale(image, max_side):
+    """Shrink an image so its longest side is at most max_side (0 leaves it as is)"""
+    height, width = image.shape[:2]
+    if not max_side or max(height, width) <= max_side:
+        return image
+    scale = max_side / max(height, width)
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+def decode_scaled(data, max_side):
+    """
+    Decode an encoded image with its longest side bounded by max_side
+    The largest whole reduction that stays at or above max_side is applied
+    while decoding, and the remainder with an area resize.
+    Parameters:
+        data: Encoded image as bytes, bytearray, memoryview or uint8 array
+        max_side: Longest side in pixels, 0 for full resolution
+    Returns:
+        Tuple of (BGR image or None, (width, height) of the full-size image)
+    """
+    buffer = np.frombuffer(data, dtype=np.uint8) if not isinstance(data, np.ndarray) else data
+    if buffer.size == 0:
+        return None, None
+
+    full_size = image_size(buffer) if max_side else None
+    flag = cv2.IMREAD_COLOR
+    if full_size is not None:
+        for factor, reduced_flag in _REDUCED_FLAGS:
+            if max(full_size) // factor >= max_side:
+                flag = reduced_flag
+                break
+
+    image = cv2.imdecode(buffer, flag)
+    if image is None and flag != cv2.IMREAD_COLOR:
+        image = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+    if image is None:
+        return None, None
+
+    height, width = image.shape[:2]
+    if full_size is None:
+        full_size = (width, height)
+    elif (width > height) != (full_size[0] > full_size[1]):
+        # Decoding applied an EXIF rotation the header size does not reflect
+        full_size = full_size[::-1]
+    return downscale(image, max_side), full_size
+
+
+def load_image(image):
+    """
+    Accept an already-decoded image or an encoded buffer
+    Parameters:
+        image: BGR numpy array, or encoded image bytes
+    Returns:
+        BGR image as a numpy array, or None if it could not be decoded
+    """
+    if image is None:
+        return None
+    if isinstance(image, np.ndarray) and image.ndim > 1:
+        return image
+    return decode_image(image)
+
+
+def load_scaled_image(image, max_side):
+    """
+    Like load_image, bounding the longest side by max_side
+    Returns:
+        Tuple of (BGR image or None, (width, height) of the full-size image)
+    """
+    if image is None:
+        return None, None
+    if isinstance(image, np.ndarray) and image.ndim > 1:
+        height, width = image.shape[:2]
+        return downscale(image, max_side), (width, height)
+    return decode_scaled(image, max_side)
+
+
+IMAGE_FORMATS = {
+    'jpeg': ('.jpg', 'image/jpeg', cv2.IMWRITE_JPEG_QUALITY),
+    'webp': ('.webp', 'image/webp', cv2.IMWRITE_WEBP_QUALITY),
+}
+
+
+def encode_image(image, image_format='jpeg', quality=None):
+    """
+    Encode an image for transport
+    Parameters:
+        image: BGR image as a numpy array
+        image_format: 'jpeg' or 'webp'
+        quality: 1-100, or None for the encoder default
+    Returns:
+        Tuple of (encoded bytes, MIME type)
+    """
+    extension, mimetype, quality_flag = IMAGE_FORMATS[image_format]
+    params = [quality_flag, int(quality)] if quality is not None else []
+    ok, buffer = cv2.imencode(extension, image, params)
+    if not ok:
+        raise ValueError(f"Could not encode image as {image_format}")
+    return buffer.tobytes(), mimetype
@@ -0,0 +1,387 @@
+import math
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import landmark_cache
+from image_io import encode_image
+
+# Error code of images that could not be decoded; every other error code
+# (no pose, blank image, no person) has status 'no_pose'
+READ_ERROR = 'unreadable_image'
+
+
+class PoolSaturated(Exception):
+    """Raised when the pool already holds its maximum number of requests"""
+
+    def __init__(self, retry_after):
+        super().__init__('Inference pool is saturated')
+        self.retry_after = retry_after
+
+
+_executor = None
+_workers = 0
+_warm_instances = 1
+_slots = None
+_max_in_flight = 0
+_lock = threading.Lock()
+_start_lock = threading.Lock()
+_started = False
+_draining = False
+_start_error = None
+_in_flight = 0
+_completed = 0
+_rejected = 0
+_wait_times = deque(maxlen=200)
+_run_times = deque(maxlen=200)
+_worker_cache_stats = {}
+
+
+def _init_worker(warm_instances=1):
+    import person_detector
+    import pose_engine
+    import presence_gate
+    pose_engine.warm_up(instances=warm_instances)
+    presence_gate.warm_up()
+    person_detector.warm_up()
+
+
+def _noop():
+    return os.getpid()
+
+
+def _status(error):
+    if error is None:
+        return 'ok'
+    return 'error' if error == READ_ERROR else 'no_pose'
+
+
+def analyze_task(pose_type, image_data, draw=True, image_format='jpeg', quality=None, tier=None,
+                 preview_side=None, roi=None):
+    """
+    Run one analysis inside a worker and encode the annotated image there,
+    so only compact bytes cross the process boundary
+    Parameters:
+        pose_type: 'en_garde', 'lunge' or 'auto'
+        image_data: Encoded image bytes as uploaded
+        draw: Render and encode the annotated image
+        image_format: 'jpeg' or 'webp'
+        quality: Encoder quality 1-100, None for the default
+        tier: 'lite', 'full', 'heavy' or 'auto', None for the worker default
+        preview_side: Longest side of the annotated image, None for the
+            analysis size
+        roi: Run the model on a crop around the person, None for the
+            worker default (POSE_ROI)
+    Returns:
+        Dict with status ('ok', 'no_pose' or 'error'), pose_type (the
+        classified stance for 'auto'), classification, feedback, angles,
+        landmarks (33 x [x, y, z, visibility] lists), model_complexity,
+        image bytes and image_type, plus image_size, cache_hit, error_code
+        (see pipeline.ERROR_MESSAGES), inference_saved (model seconds the
+        presence gate avoided) and the seconds spent per stage under timings
+    """
+    from pipeline import analyze
+
+    result = analyze(image_data, pose_type, draw=draw, tier=tier, preview_side=preview_side, roi=roi)
+    status = _status(result.error)
+
+    image = image_type = None
+    if result.annotated_image is not None:
+        started = time.perf_counter()
+        image, image_type = encode_image(result.annotated_image, image_format, quality)
+        result.timings['encode'] = time.perf_counter() - started
+
+    return {
+        'status': status,
+        'pose_type': result.pose_type,
+        'classification': result.classification,
+        'feedback': result.feedback,
+        'angles': result.angles,
+        'landmarks': result.record.landmarks.round(5).tolist() if result.record is not None else None,
+        'model_complexity': result.record.model_complexity if result.record is not None else None,
+        'image': image,
+        'image_type': image_type,
+        'image_size': result.image_size,
+        'cache_hit': result.cache_hit,
+        'error_code': result.error,
+        'inference_saved': result.inference_saved,
+        'timings': result.timings,
+    }
+
+
+def analyze_fencers_task(pose_type, image_data, draw=True, image_format='jpeg', quality=None, tier=None,
+                         max_people=2, preview_side=None):
+    """
+    Multi-fencer counterpart of analyze_task
+    Returns:
+        The analyze_task dict, with a 'fencers' list (left to right) of
+        dicts with box, facing, pose_type, classification, angles,
+        feedback, landmarks and model_complexity. Top-level feedback prefixes every line with the
+        fencer's number; top-level angles and landmarks are None
+    """
+    from pipeline import analyze_fencers
+
+    result = analyze_fencers(image_data, pose_type, draw=draw, tier=tier, max_people=max_people,
+                             preview_side=preview_side)
+    status = _status(result.error)
+
+    image = image_type = None
+    if result.annotated_image is not None:
+        started = time.perf_counter()
+        image, image_type = encode_image(result.annotated_image, image_format, quality)
+        result.timings['encode'] = time.perf_counter() - started
+
+    fencers = [{
+        'box': list(fencer.box),
+        'facing': fencer.facing,
+        'pose_type': fencer.pose_type,
+        'classification': fencer.classification,
+        'angles': fencer.angles,
+        'feedback': fencer.feedback,
+        'landmarks': fencer.record.landmarks.round(5).tolist(),
+        'model_complexity': fencer.record.model_complexity,
+    } for fencer in result.fencers]
+    feedback = result.feedback + [f"Fencer {number} (facing {fencer['facing']}): {line}"
+                                  for number, fencer in enumerate(fencers, 1) for line in fencer['feedback']]
+
+    return {
+        'status': status,
+        'pose_type': result.pose_type,
+        'classification': None,
+        'feedback': feedback,
+        'angles': None,
+        'landmarks': None,
+        'model_complexity': max((fencer['model_complexity'] for fencer in fencers), default=None),
+        'fencers': fencers,
+        'image': image,
+        'image_type': image_type,
+        'image_size': result.image_size,
+        'cache_hit': result.cache_hit,
+        'error_code': result.error,
+        'inference_saved': result.inference_saved,
+        'timings': result.timings,
+    }
+
+
+def _timed_call(submitted_at, fn, args):
+    started_at = time.time()
+    result = fn(*args)
+    worker_stats = (os.getpid(), landmark_cache.stats())
+    return started_at - submitted_at, time.time() - started_at, worker_stats, result
+
+
+def configure(workers=None, max_in_flight=None, warm_instances=1):
+    """
+    Set the pool size and admission limit; processes start on start()
+    Parameters:
+        workers: Number of worker processes, defaults to the CPU count.
+            0 runs analyses on the calling thread (useful for debugging)
+        max_in_flight: Maximum running plus queued analyses before new
+            requests are rejected, defaults to twice the worker count
+        warm_instances: Pose instances each worker builds and warms per
+            model at startup
+    """
+    global _workers, _warm_instances, _slots, _max_in_flight, _draining
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if max_in_flight is None:
+        max_in_flight = max(workers, 1) * 2
+
+    shutdown_pool()
+    _workers = workers
+    _warm_instances = warm_instances
+    _max_in_flight = max_in_flight
+    _slots = threading.BoundedSemaphore(max_in_flight)
+    _draining = False
+
+
+def start():
+    """Start and warm every worker process; safe to call more than once"""
+    global _executor, _started
+
+    if _slots is None:
+        configure()
+
+    with _start_lock:
+        if _started:
+            return
+        if _workers > 0:
+            # Spawn rather than fork: MediaPipe graphs are not fork-safe
+            _executor = ProcessPoolExecutor(max_workers=_workers,
+                                            mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=_init_worker, initargs=(_warm_instances,))
+            for future in [_executor.submit(_noop) for _ in range(_workers)]:
+                future.result()
+        else:
+            _init_worker(_warm_instances)
+        _started = True
+
+
+def start_in_background():
+    """
+    Start the pool on a daemon thread and return at once, so the server can
+    answer liveness checks while the workers load the model; ready() turns
+    True when they are warm
+    """
+    def run():
+        global _start_error
+        try:
+            start()
+        except Exception as e:
+            _start_error = e
+
+    thread = threading.Thread(target=run, name='inference-pool-start', daemon=True)
+    thread.start()
+    return thread
+
+
+def ready():
+    """True once every worker has loaded and warmed the pose model, until draining starts"""
+    return _started and not _draining
+
+
+def drain(timeout=None):
+    """
+    Stop admitting analyses, wait for the ones in flight, then shut down
+    New submissions raise PoolSaturated while draining.
+    Parameters:
+        timeout: Seconds to wait for in-flight analyses, None waits for all
+    Returns:
+        True if every in-flight analysis finished, False if the timeout
+        passed first; queued analyses are then cancelled and running ones
+        stopped with their worker processes, so this never blocks much
+        beyond timeout
+    """
+    global _draining
+    _draining = True
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    while True:
+        with _lock:
+            pending = _in_flight
+        if pending == 0 or (deadline is not None and time.monotonic() >= deadline):
+            break
+        time.sleep(0.05)
+    shutdown_pool(cancel_pending=pending > 0)
+    return pending == 0
+
+
+def shutdown_pool(cancel_pending=False):
+    """
+    Shut the worker processes down
+    Parameters:
+        cancel_pending: Cancel queued analyses and terminate the workers
+            instead of waiting for the running ones
+    """
+    global _executor, _started
+    with _start_lock:
+        if _executor is not None:
+            if cancel_pending:
+                # ProcessPoolExecutor has no public way to stop a running
+                # task, and shutdown(wait=True) would wait for all of them.
+                # _processes is a CPython implementation detail (pid ->
+                # Process); without it the running tasks are left to finish
+                for process in list((getattr(_executor, '_processes', None) or {}).values()):
+                    process.terminate()
+            _executor.shutdown(wait=not cancel_pending, cancel_futures=cancel_pending)
+            _executor = None
+        _started = False
+    with _lock:
+        _worker_cache_stats.clear()
+
+
+def _retry_after():
+    run_time = sum(_run_times) / len(_run_times) if _run_times else 1.0
+    return max(1, math.ceil(run_time * _in_flight / max(_workers, 1)))
+
+
+def _on_done(future):
+    global _in_flight, _completed
+    with _lock:
+        _in_flight -= 1
+        _completed += 1
+        if not future.cancelled() and future.exception() is None:
+            wait_time, run_time, (pid, cache_stats), _ = future.result()
+            _wait_times.append(wait_time)
+            _run_times.append(run_time)
+            _worker_cache_stats[pid] = cache_stats
+    _slots.release()
+
+
+def submit(fn, *args):
+    """
+    Queue fn(*args) on the pool without blocking
+    Returns:
+        Future resolving to the return value of fn
+    Raises:
+        PoolSaturated: if max_in_flight analyses are already pending, or
+            the pool is draining
+    """
+    global _in_flight, _rejected
+
+    if not _draining and not _started:
+        start()
+
+    if _draining or not _slots.acquire(blocking=False):
+        with _lock:
+            _rejected += 1
+        raise PoolSaturated(_retry_after())
+
+    with _lock:
+        _in_flight += 1
+
+    if _executor is not None:
+        inner = _executor.submit(_timed_call, time.time(), fn, args)
+    else:
+        inner = Future()
+        try:
+            inner.set_result(_timed_call(time.time(), fn, args))
+        except Exception as e:
+            inner.set_exception(e)
+    inner.add_done_callback(_on_done)
+
+    outer = Future()
+
+    def _unwrap(f):
+        if f.cancelled():
+            outer.cancel()
+        elif f.exception() is not None:
+            outer.set_exception(f.exception())
+        else:
+            outer.set_result(f.result()[3])
+
+    inner.add_done_callback(_unwrap)
+    return outer
+
+
+def cache_stats():
+    """Landmark cache counters summed over every worker process"""
+    with _lock:
+        totals = {}
+        for worker_stats in _worker_cache_stats.values():
+            for name, value in worker_stats.items():
+                totals[name] = totals.get(name, 0) + value
+    lookups = totals.get('memory_hits', 0) + totals.get('disk_hits', 0) + totals.get('misses', 0)
+    totals['hit_rate'] = round((lookups - totals.get('misses', 0)) / lookups, 3) if lookups else 0.0
+    return totals
+
+
+def stats():
+    with _lock:
+        waits = list(_wait_times)
+        return {
+            'ready': _started and not _draining,
+            'draining': _draining,
+            'start_error': str(_start_error) if _start_error is not None else None,
+            'workers': _workers,
+            'max_in_flight': _max_in_flight,
+            'in_flight': _in_flight,
+            'queue_depth': max(_in_flight - _workers, 0),
+            'completed': _completed,
+            'rejected': _rejected,
+            'avg_wait_ms': round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+            'max_wait_ms': round(max(waits) * 1000, 1) if waits else 0.0,
+        }
@@ -0,0 +1,250 @@
+"""
+In-process job queue for analyses that should not hold an HTTP connection
+Jobs wait in a bounded queue, run on a few dispatcher threads (which in turn
+submit to the inference pool) and keep their result for a TTL once
+finished. State lives in this process only, so under gunicorn a job can be
+polled only on the worker that accepted it.
+"""
+
+import json
+import math
+import queue
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+from result_store import ResultStore
+
+class JobQueueFull(Exception):
+    """Raised by submit when the queue is full"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Job queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+_lock = threading.Lock()
+_queue_size = 100
+_queue_bytes = 256 * 1024 * 1024
+_held_bytes = 0  # payload bytes of queued and running jobs
+_concurrency = 2
+_webhook_hosts = frozenset()
+_webhook_timeout = 10
+_queue = None
+_active = {}  # job id -> job dict, while queued or running
+_finished = None  # ResultStore of job id -> job dict
+_threads = []
+_stopped = False
+_run_times = []
+_counts = {'submitted': 0, 'done': 0, 'failed': 0, 'rejected': 0, 'webhooks_failed': 0}
+
+
+def configure(queue_size=100, concurrency=2, result_ttl=3600, result_store_size=1000, webhook_hosts=(),
+              webhook_timeout=10, queue_bytes=256 * 1024 * 1024, result_store_bytes=256 * 1024 * 1024):
+    """
+    Size the queue and result store; dispatcher threads start on the first submit
+    Parameters:
+        queue_size: Jobs allowed to wait before submit raises JobQueueFull
+        concurrency: Dispatcher threads, i.e. jobs running at once
+        result_ttl: Seconds a finished job stays retrievable
+        result_store_size: Finished jobs kept before the oldest are evicted
+        webhook_hosts: Hosts callback URLs may point at; empty disables webhooks
+        webhook_timeout: Seconds to wait for a webhook receiver
+        queue_bytes: Upload bytes queued and running jobs may hold before
+            submit raises JobQueueFull; a job is always taken when no other
+            is held, however large
+        result_store_bytes: Serialized size of the finished jobs kept
+            before the oldest are evicted
+    """
+    global _queue_size, _queue_bytes, _concurrency, _webhook_hosts, _webhook_timeout, _queue, _finished
+
+    with _lock:
+        if _threads:
+            raise RuntimeError("jobs.configure must be called before the first job is submitted")
+        _queue_size = queue_size
+        _queue_bytes = queue_bytes
+        _concurrency = max(concurrency, 1)
+        _webhook_hosts = frozenset(host.strip().lower() for host in webhook_hosts if host.strip())
+        _webhook_timeout = webhook_timeout
+        _queue = queue.Queue(maxsize=queue_size)
+        _finished = ResultStore(max_items=result_store_size, ttl=result_ttl, max_bytes=result_store_bytes)
+
+
+def _start():
+    # Called with _lock held
+    while len(_threads) < _concurrency:
+        thread = threading.Thread(target=_dispatch, name=f"job-dispatcher-{len(_threads)}", daemon=True)
+        thread.start()
+        _threads.append(thread)
+
+
+def webhook_allowed(url):
+    """Whether a callback URL may be posted to: http(s) and one of the configured hosts"""
+    parsed = urllib.parse.urlsplit(url)
+    return parsed.scheme in ('http', 'https') and (parsed.hostname or '').lower() in _webhook_hosts
+
+
+def _retry_after():
+    run_time = sum(_run_times) / len(_run_times) if _run_times else 1.0
+    return max(1, math.ceil(run_time * _queue.qsize() / _concurrency))
+
+
+def submit(run, callback_url=None, size=0):
+    """
+    Queue a job without blocking
+    Parameters:
+        run: Callable returning the job's JSON-serializable result
+        callback_url: Optional URL the finished job is POSTed to; check it
+            with webhook_allowed first
+        size: Bytes of upload the job holds until it finishes
+    Returns:
+        The new job id
+    Raises:
+        JobQueueFull: if queue_size jobs are already waiting, or their
+            uploads would exceed queue_bytes
+    """
+    global _held_bytes
+
+    if _queue is None:
+        configure()
+
+    job = {
+        'id': uuid.uuid4().hex,
+        'status': 'queued',
+        'created_at': time.time(),
+        'started_at': None,
+        'finished_at': None,
+        'result': None,
+        'error': None,
+    }
+    with _lock:
+        if _stopped or (_held_bytes and _held_bytes + size > _queue_bytes):
+            _counts['rejected'] += 1
+            raise JobQueueFull(_retry_after())
+        _start()
+        try:
+            _queue.put_nowait((job, run, callback_url, size))
+        except queue.Full:
+            _counts['rejected'] += 1
+            raise JobQueueFull(_retry_after()) from None
+        _held_bytes += size
+        _active[job['id']] = job
+        _counts['submitted'] += 1
+    return job['id']
+
+
+def get(job_id):
+    """
+    Look up a job
+    Returns:
+        Copy of the job dict (id, status, timestamps, result, error), or
+        None if the id is unknown or its result has expired
+    """
+    with _lock:
+        job = _active.get(job_id)
+        if job is not None:
+            return dict(job)
+    job = _finished.get(job_id)
+    return dict(job) if job is not None else None
+
+
+def _dispatch():
+    while True:
+        job, run, callback_url, size = _queue.get()
+        with _lock:
+            job['status'] = 'running'
+            job['started_at'] = time.time()
+        try:
+            result = run()
+        except Exception as e:
+            result, error = None, str(e) or e.__class__.__name__
+        else:
+            error = None
+        # Let go of the upload before serializing the result
+        run = None
+        _finish(job, result, error, callback_url, size)
+
+
+def _finish(job, result, error, callback_url, size):
+    global _held_bytes
+
+    finished = {**job, 'status': 'failed' if error else 'done', 'finished_at': time.time(),
+                'result': result, 'error': error}
+    body = json.dumps(finished).encode('utf-8')
+    # Publish to the store before leaving _active so the job never disappears
+    _finished.put(job['id'], finished, size=len(body))
+    with _lock:
+        _held_bytes -= size
+        _active.pop(job['id'], None)
+        _counts[finished['status']] += 1
+        if finished['started_at'] is not None:
+            _run_times.append(finished['finished_at'] - finished['started_at'])
+            del _run_times[:-50]
+    _queue.task_done()
+
+    if callback_url:
+        threading.Thread(target=_notify, args=(callback_url, job['id'], body), daemon=True).start()
+
+
+def stop():
+    """
+    Stop taking jobs ahead of shutdown: submit raises JobQueueFull from now
+    on, and jobs still waiting in the queue fail at once rather than start
+    on a pool that is about to drain. Running jobs are left to finish.
+    Returns:
+        Number of queued jobs that were failed
+    """
+    global _stopped
+    with _lock:
+        _stopped = True
+    if _queue is None:
+        return 0
+    failed = 0
+    while True:
+        try:
+            job, _, callback_url, size = _queue.get_nowait()
+        except queue.Empty:
+            return failed
+        _finish(job, None, 'Server is shutting down', callback_url, size)
+        failed += 1
+
+
+class _NoRedirects(urllib.request.HTTPRedirectHandler):
+    """Refuse redirects: the allow-list only vouches for the callback URL's own host"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+_webhook_opener = urllib.request.build_opener(_NoRedirects)
+
+
+def _notify(callback_url, job_id, body):
+    request = urllib.request.Request(callback_url, data=body, method='POST',
+                                     headers={'Content-Type': 'application/json', 'X-Job-Id': job_id})
+    try:
+        with _webhook_opener.open(request, timeout=_webhook_timeout):
+            pass
+    except (urllib.error.URLError, OSError, ValueError):
+        with _lock:
+            _counts['webhooks_failed'] += 1
+
+
+def stats():
+    """Queue depth, running jobs and lifetime counters"""
+    with _lock:
+        running = sum(job['status'] == 'running' for job in _active.values())
+        return {
+            'queued': len(_active) - running,
+            'running': running,
+            'retained': len(_finished) if _finished is not None else 0,
+            'retained_bytes': _finished.nbytes() if _finished is not None else 0,
+            'held_bytes': _held_bytes,
+            'queue_size': _queue_size,
+            'concurrency': _concurrency,
+            **_counts,
+        }
+
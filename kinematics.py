@@ -0,0 +1,163 @@
+import numpy as np
+
+# MediaPipe Pose landmark indices (mp_pose.PoseLandmark) used for angles;
+# kept as plain ints so this module does not need mediapipe
+NUM_LANDMARKS = 33
+LEFT_SHOULDER, RIGHT_SHOULDER = 11, 12
+LEFT_ELBOW, RIGHT_ELBOW = 13, 14
+LEFT_WRIST, RIGHT_WRIST = 15, 16
+LEFT_HIP, RIGHT_HIP = 23, 24
+LEFT_KNEE, RIGHT_KNEE = 25, 26
+LEFT_ANKLE, RIGHT_ANKLE = 27, 28
+LEFT_HEEL, RIGHT_HEEL = 29, 30
+LEFT_FOOT_INDEX, RIGHT_FOOT_INDEX = 31, 32
+
+
+def landmarks_to_array(landmarks, image_width, image_height):
+    """
+    Convert MediaPipe landmarks to pixel coordinates in one pass
+    Parameters:
+        landmarks: Landmark list from MediaPipe, or a (33, >=3) array of
+            normalized x, y, z (extra columns such as visibility are ignored)
+        image_width: Width of the image
+        image_height: Height of the image
+    Returns:
+        (33, 3) float array of x, y, z in pixels (z on the same scale as x)
+    """
+    if isinstance(landmarks, np.ndarray):
+        normalized = np.asarray(landmarks[:, :3], dtype=np.float64)
+    else:
+        normalized = np.array([(lm.x, lm.y, lm.z) for lm in landmarks], dtype=np.float64)
+    return normalized * np.array([image_width, image_height, image_width], dtype=np.float64)
+
+
+def joint_angle(a, b, c):
+    """
+    Angle at b formed by a-b-c in degrees (0-180), vectorized
+    Parameters:
+        a, b, c: Arrays of shape (..., >=2) holding x, y coordinates
+    Returns:
+        Array of shape (...) of angles
+    """
+    radians = (np.arctan2(c[..., 1] - b[..., 1], c[..., 0] - b[..., 0])
+               - np.arctan2(a[..., 1] - b[..., 1], a[..., 0] - b[..., 0]))
+    angle = np.abs(np.degrees(radians))
+    return np.where(angle > 180.0, 360.0 - angle, angle)
+
+
+def calculate_angle(a, b, c):
+    """Angle at b formed by the points a-b-c in degrees"""
+    return float(joint_angle(np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64),
+                             np.asarray(c, dtype=np.float64)))
+
+
+def direction(start, end):
+    """Direction of the segment start->end in degrees, in [0, 360)"""
+    return np.degrees(np.arctan2(end[..., 1] - start[..., 1], end[..., 0] - start[..., 0])) % 360
+
+
+# Extra points appended after the 33 landmarks before angles are measured
+SHOULDER_MID, HIP_MID, FLOOR, RIGHT_ELBOW_H, LEFT_ELBOW_H = range(NUM_LANDMARKS, NUM_LANDMARKS + 5)
+
+# (a, b, c) triples measured at b, all evaluated in a single joint_angle call.
+# Right and left sides alternate so front/back can be picked per frame.
+ANGLE_TRIPLES = {
+    'right_knee': (RIGHT_HIP, RIGHT_KNEE, RIGHT_ANKLE),
+    'left_knee': (LEFT_HIP, LEFT_KNEE, LEFT_ANKLE),
+    'right_elbow': (RIGHT_SHOULDER, RIGHT_ELBOW, RIGHT_WRIST),
+    'left_elbow': (LEFT_SHOULDER, LEFT_ELBOW, LEFT_WRIST),
+    # Forearm against the horizontal, for either arm
+    'right_forearm': (RIGHT_ELBOW_H, RIGHT_ELBOW, RIGHT_WRIST),
+    'left_forearm': (LEFT_ELBOW_H, LEFT_ELBOW, LEFT_WRIST),
+    # Angle at the shoulder midpoint between straight down and the hip midpoint
+    'spine_vertical': (FLOOR, SHOULDER_MID, HIP_MID),
+}
+_A, _B, _C = (np.array(indices) for indices in zip(*ANGLE_TRIPLES.values()))
+
+# Back arm (shoulder->wrist) and back thigh (hip->knee) directions, right then left
+_SEGMENT_STARTS = np.array([RIGHT_SHOULDER, LEFT_SHOULDER, RIGHT_HIP, LEFT_HIP])
+_SEGMENT_ENDS = np.array([RIGHT_WRIST, LEFT_WRIST, RIGHT_KNEE, LEFT_KNEE])
+
+# Columns of [angles..., directions..., wrist y (r, l), elbow y (r, l)] to read
+# for the front and back side when facing right (0) or left (1)
+_FRONT_COLUMNS = np.array([[0, 2, 4, 11, 13], [1, 3, 5, 12, 14]])
+_BACK_COLUMNS = np.array([[1, 3, 8, 10], [0, 2, 7, 9]])
+
+
+def _extend(points, image_height):
+    mids = (points[..., [RIGHT_SHOULDER, RIGHT_HIP], :] + points[..., [LEFT_SHOULDER, LEFT_HIP], :]) / 2
+    floor = mids[..., :1, :].copy()
+    floor[..., 0, 1] = image_height
+    elbows_h = points[..., [RIGHT_ELBOW, LEFT_ELBOW], :] + np.array([1.0, 0.0])
+    return np.concatenate([points, mids, floor, elbows_h], axis=-2)
+
+
+# Angles compute_angles returns, besides the facing_right flag
+ANGLE_NAMES = ('right_knee', 'left_knee', 'right_elbow', 'left_elbow', 'front_knee', 'back_knee', 'front_elbow',
+               'back_elbow', 'spine_vertical', 'forearm_horizontal', 'arm_angle', 'leg_angle', 'arm_leg_alignment')
+
+
+def compute_angles(points, image_height):
+    """
+    Compute every joint angle used by the en-garde and lunge analyses
+    Parameters:
+        points: (33, >=2) pixel coordinates for one frame, or (N, 33, >=2)
+            for a batch of frames
+        image_height: Height of the image(s), scalar or shape (N,)
+    Returns:
+        Dict of arrays shaped () or (N,): right/left knee and elbow angles,
+        front/back knee and elbow angles, spine_vertical,
+        forearm_horizontal, arm_angle and leg_angle (directions of the back
+        arm and back leg), arm_leg_alignment and facing_right
+    """
+    points = _extend(np.asarray(points, dtype=np.float64)[..., :2], image_height)
+
+    columns = np.concatenate([
+        joint_angle(points[..., _A, :], points[..., _B, :], points[..., _C, :]),
+        direction(points[..., _SEGMENT_STARTS, :], points[..., _SEGMENT_ENDS, :]),
+        points[..., [RIGHT_WRIST, LEFT_WRIST, RIGHT_ELBOW, LEFT_ELBOW], 1],
+    ], axis=-1)
+
+    # The fencer faces right when the right ankle is left of the left ankle
+    facing_right = points[..., RIGHT_ANKLE, 0] < points[..., LEFT_ANKLE, 0]
+    side = np.where(facing_right, 0, 1)
+    front_knee, front_elbow, forearm_horizontal, wrist_y, elbow_y = np.moveaxis(
+        np.take_along_axis(columns, _FRONT_COLUMNS[side], axis=-1), -1, 0)
+    back_knee, back_elbow, arm_angle, leg_angle = np.moveaxis(
+        np.take_along_axis(columns, _BACK_COLUMNS[side], axis=-1), -1, 0)
+
+    # Wrist higher than elbow
+    forearm_horizontal = np.where(wrist_y < elbow_y, 180 - forearm_horizontal, forearm_horizontal)
+
+    arm_leg_alignment = np.abs(arm_angle - leg_angle)
+    arm_leg_alignment = np.where(arm_leg_alignment > 180, 360 - arm_leg_alignment, arm_leg_alignment)
+
+    return {
+        'right_knee': columns[..., 0],
+        'left_knee': columns[..., 1],
+        'right_elbow': columns[..., 2],
+        'left_elbow': columns[..., 3],
+        'front_knee': front_knee,
+        'back_knee': back_knee,
+        'front_elbow': front_elbow,
+        'back_elbow': back_elbow,
+        'spine_vertical': columns[..., 6],
+        'forearm_horizontal': forearm_horizontal,
+        'arm_angle': arm_angle,
+        'leg_angle': leg_angle,
+        'arm_leg_alignment': arm_leg_alignment,
+        'facing_right': facing_right,
+    }
+
+
+def determine_facing_direction(landmarks, image_width):
+    """
+    Determine if the fencer is facing right or left
+    Parameters:
+        landmarks: Pose landmarks from MediaPipe
+        image_width: Width of the image
+    Returns:
+        Boolean: True if facing right, False if facing left
+    """
+    # The right ankle is in front when it is left of the left ankle
+    return landmarks[RIGHT_ANKLE].x * image_width < landmarks[LEFT_ANKLE].x * image_width
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+Append-only, memory-mapped archive of analyzed poses
+Every pose is one row spread over per-column files in a directory:
+
+    landmarks.bin   float32 (33, 4) normalized x, y, z, visibility
+    image_size.bin  uint32 (2,) width, height of the analyzed image
+    athlete.bin     int32 id into names.json
+    session.bin     int32 id into names.json
+    pose_type.bin   uint8 id into names.json
+    timestamp.bin   float64 unix seconds
+
+Queries memory-map the columns and filter with numpy, so picking one
+athlete's month out of millions of rows reads a few bytes per row; angles
+and rule checks are recomputed from the stored landmarks in vectorized
+chunks, never by running the pose model again.
+
+    python landmark_archive.py ARCHIVE stats
+    python landmark_archive.py ARCHIVE rescore [--athlete NAME] [--output faults.npy]
+    python landmark_archive.py ARCHIVE trend --athlete NAME --angle front_knee [--days 30]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+import criteria
+import kinematics
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within one process
+    fcntl = None
+
+# Stance ids of archives written before stances were named in names.json
+DEFAULT_POSE_TYPES = ['en_garde', 'lunge', 'neither']
+COLUMNS = {
+    'landmarks': ('<f4', (kinematics.NUM_LANDMARKS, 4)),
+    'image_size': ('<u4', (2,)),
+    'athlete': ('<i4', ()),
+    'session': ('<i4', ()),
+    'pose_type': ('u1', ()),
+    'timestamp': ('<f8', ()),
+}
+# Rows per vectorized pass; bounds the temporary arrays to a few hundred MB
+CHUNK_ROWS = 1 << 18
+BUCKETS = {'hour': 3600, 'day': 86400, 'week': 7 * 86400}
+# Saved rescore results: each row number with its fault bitmask, in their own
+# integer types (stacked into one plain array both would become float64)
+FAULT_DTYPE = np.dtype([('row', '<i8'), ('faults', '<u8')])
+
+
+def fault_table(rows, faults):
+    """
+    Pair rescore results up for saving
+    Parameters:
+        rows: Row numbers that were scored
+        faults: uint64 fault bitmask per row, as returned by rescore
+    Returns:
+        Structured array of FAULT_DTYPE
+    """
+    table = np.empty(len(rows), dtype=FAULT_DTYPE)
+    table['row'] = rows
+    table['faults'] = faults
+    return table
+
+
+class LandmarkArchive:
+    """
+    One archive directory; safe to share between threads, and between
+    processes appending to the same directory where fcntl is available
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._names = None
+        self._names_mtime = None
+        self._mapped = (None, None)  # (row count, dict of column memmaps)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def _exclusive(self):
+        with self._lock, open(self._path('.lock'), 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load_names(self):
+        path = self._path('names.json')
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return {'athletes': [], 'sessions': [], 'pose_types': list(DEFAULT_POSE_TYPES)}
+        if mtime != self._names_mtime:
+            with open(path) as f:
+                self._names = json.load(f)
+            self._names.setdefault('pose_types', list(DEFAULT_POSE_TYPES))
+            self._names_mtime = mtime
+        return self._names
+
+    def _row_size(self, name):
+        dtype, shape = COLUMNS[name]
+        return np.dtype(dtype).itemsize * int(np.prod(shape, dtype=np.int64))
+
+    def __len__(self):
+        # A row exists once every column has it, so a reader never sees a
+        # half-written append
+        sizes = []
+        for name in COLUMNS:
+            try:
+                sizes.append(os.path.getsize(self._path(name + '.bin')) // self._row_size(name))
+            except FileNotFoundError:
+                return 0
+        return min(sizes)
+
+    def append(self, landmarks, image_size, pose_type, athlete, session='', timestamp=None):
+        """
+        Store one analyzed pose
+        Parameters:
+            landmarks: (33, 4) normalized x, y, z, visibility array or list
+            image_size: (width, height) of the analyzed image
+            pose_type: A stance from criteria.json, or 'neither'
+            athlete: Athlete name
+            session: Session name, e.g. a date or drill
+            timestamp: Unix seconds, defaults to now
+        Returns:
+            Row number of the pose
+        """
+        return self.append_many([landmarks], [image_size], [pose_type], athlete, session,
+                                [time.time() if timestamp is None else timestamp])
+
+    def append_many(self, landmarks, image_sizes, pose_types, athlete, session='', timestamps=None):
+        """
+        Store many poses of one athlete and session in one write per column
+        Returns:
+            Row number of the first pose
+        """
+        landmarks = np.asarray(landmarks, dtype='<f4').reshape(-1, *COLUMNS['landmarks'][1])
+        count = len(landmarks)
+        if timestamps is None:
+            timestamps = np.full(count, time.time())
+
+        with self._exclusive():
+            names = {key: list(values) for key, values in self._load_names().items()}
+            ids = []
+            for key, name in (('athletes', athlete), ('sessions', session)):
+                if name not in names[key]:
+                    names[key].append(name)
+                ids.append(names[key].index(name))
+            for pose_type in set(pose_types) - set(names['pose_types']):
+                names['pose_types'].append(pose_type)
+            codes = [names['pose_types'].index(pose_type) for pose_type in pose_types]
+            self._save_names(names)
+
+            first = len(self)
+            values = {
+                'landmarks': landmarks,
+                'image_size': np.asarray(image_sizes, dtype='<u4').reshape(count, 2),
+                'athlete': np.full(count, ids[0], dtype='<i4'),
+                'session': np.full(count, ids[1], dtype='<i4'),
+                'pose_type': np.asarray(codes, dtype='u1'),
+                'timestamp': np.asarray(timestamps, dtype='<f8').reshape(count),
+            }
+            for name, column in values.items():
+                with open(self._path(name + '.bin'), 'ab') as f:
+                    # Drop the tail of an append that was interrupted midway
+                    f.truncate(first * self._row_size(name))
+                    f.write(column.tobytes())
+        return first
+
+    def _save_names(self, names):
+        if names == self._names:
+            return
+        path = self._path('names.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(names, f)
+        os.replace(path + '.tmp', path)
+        self._names = names
+        self._names_mtime = os.stat(path).st_mtime_ns
+
+    def columns(self):
+        """
+        Read-only memmaps of every column, covering the rows present now
+        Returns:
+            Dict of column name to array with one entry per row
+        """
+        count = len(self)
+        if self._mapped[0] != count:
+            if count == 0:
+                mapped = {name: np.empty((0,) + shape, dtype=dtype) for name, (dtype, shape) in COLUMNS.items()}
+            else:
+                mapped = {name: np.memmap(self._path(name + '.bin'), dtype=dtype, mode='r', shape=(count,) + shape)
+                          for name, (dtype, shape) in COLUMNS.items()}
+            self._mapped = (count, mapped)
+        return self._mapped[1]
+
+    def athletes(self):
+        """Names of the athletes with stored poses"""
+        return list(self._load_names()['athletes'])
+
+    def sessions(self, athlete):
+        """Names of one athlete's sessions, in the order they were first stored"""
+        rows = self.select(athlete=athlete)
+        if len(rows) == 0:
+            return []
+        ids = self.columns()['session'][rows]
+        _, first = np.unique(ids, return_index=True)
+        names = self._load_names()['sessions']
+        return [names[ids[index]] for index in sorted(first)]
+
+    def select(self, athlete=None, session=None, pose_type=None, since=None, until=None):
+        """
+        Rows matching every given filter
+        Parameters:
+            athlete, session: Names
+            pose_type: Stored stance, e.g. 'en_garde', 'lunge' or 'neither'
+            since, until: Unix seconds, inclusive and exclusive
+        Returns:
+            Sorted int64 array of row numbers
+        """
+        columns = self.columns()
+        names = self._load_names()
+        mask = np.ones(len(columns['timestamp']), dtype=bool)
+        for column, key, value in (('athlete', 'athletes', athlete), ('session', 'sessions', session),
+                                   ('pose_type', 'pose_types', pose_type)):
+            if value is not None:
+                if value not in names[key]:
+                    return np.empty(0, dtype=np.int64)
+                mask &= columns[column] == names[key].index(value)
+        if since is not None:
+            mask &= columns['timestamp'] >= since
+        if until is not None:
+            mask &= columns['timestamp'] < until
+        return np.flatnonzero(mask)
+
+    def angles(self, rows):
+        """
+        Joint angles of stored poses, as Criteria.compute_angles returns them
+        Parameters:
+            rows: Array of row numbers (at most about CHUNK_ROWS at a time)
+        Returns:
+            Dict of (len(rows),) arrays
+        """
+        columns = self.columns()
+        sizes = columns['image_size'][rows].astype(np.float64)
+        points = columns['landmarks'][rows, :, :2] * sizes[:, None, :]
+        return criteria.get().compute_angles(points, sizes[:, 1])
+
+    def rescore(self, rows=None, pose_type=None, progress=None):
+        """
+        Re-apply the rules of criteria.json to stored poses without inference
+        Parameters:
+            rows: Row numbers to score, all rows by default
+            pose_type: Score every row as this stance instead of the stored one
+            progress: Optional callable(done, total) after each chunk
+        Returns:
+            Tuple of (summary dict per pose type with poses, clean and the
+            count breaking each rule; uint64 array per row with bit i set
+            when the i-th rule of its pose type is broken)
+        """
+        compiled = criteria.get()
+        columns = self.columns()
+        rows = np.arange(len(columns['timestamp'])) if rows is None else np.asarray(rows)
+        faults = np.zeros(len(rows), dtype=np.uint64)
+        summary = {}
+
+        for start in range(0, len(rows), CHUNK_ROWS):
+            chunk = rows[start:start + CHUNK_ROWS]
+            angles = self.angles(chunk)
+            # Every rule of every stance in one pass; each row then reads its own stance's columns
+            checked = compiled.check(angles)
+            stored = columns['pose_type'][chunk]
+            for code, name in enumerate(self._load_names()['pose_types']):
+                stance = pose_type or name
+                selected = np.ones(len(chunk), dtype=bool) if pose_type else stored == code
+                if stance not in compiled.stances or not selected.any():
+                    continue
+                broken = compiled.faults(stance, None, checked[selected])
+                totals = summary.setdefault(stance, {'poses': 0, 'clean': 0, 'faults': dict.fromkeys(broken, 0)})
+                bits = np.zeros(selected.sum(), dtype=np.uint64)
+                for bit, (rule, mask) in enumerate(broken.items()):
+                    bits |= mask.astype(np.uint64) << np.uint64(bit)
+                    totals['faults'][rule] += int(mask.sum())
+                totals['poses'] += len(bits)
+                totals['clean'] += int((bits == 0).sum())
+                faults[start:start + len(chunk)][selected] = bits
+                if pose_type:
+                    break
+            if progress is not None:
+                progress(min(start + CHUNK_ROWS, len(rows)), len(rows))
+        return summary, faults
+
+    def trend(self, athlete, angle, since=None, until=None, pose_type=None, bucket='day'):
+        """
+        How one angle moved over time for one athlete
+        Parameters:
+            athlete: Athlete name
+            angle: Any Criteria.angle_names entry, e.g. 'front_knee'
+            since, until: Unix seconds; defaults to everything stored
+            pose_type: Only poses stored as this stance
+            bucket: 'hour', 'day' or 'week' (UTC)
+        Returns:
+            List of dicts with start (ISO 8601), count, mean, min and max,
+            oldest first, for buckets that have poses
+        """
+        rows = self.select(athlete=athlete, pose_type=pose_type, since=since, until=until)
+        if len(rows) == 0:
+            return []
+        values = np.concatenate([np.asarray(self.angles(rows[start:start + CHUNK_ROWS])[angle], dtype=np.float64)
+                                 for start in range(0, len(rows), CHUNK_ROWS)])
+        width = BUCKETS[bucket]
+        # Weeks start on Monday; the epoch was a Thursday
+        offset = 3 * 86400 if bucket == 'week' else 0
+        buckets = np.floor((self.columns()['timestamp'][rows] + offset) / width).astype(np.int64)
+
+        order = np.argsort(buckets, kind='stable')
+        buckets, values = buckets[order], values[order]
+        starts, first = np.unique(buckets, return_index=True)
+        counts = np.diff(np.append(first, len(buckets)))
+        sums = np.add.reduceat(values, first)
+        return [{
+            'start': datetime.datetime.fromtimestamp(int(start) * width - offset, datetime.timezone.utc).isoformat(),
+            'count': int(count),
+            'mean': round(float(total / count), 2),
+            'min': round(float(low), 2),
+            'max': round(float(high), 2),
+        } for start, count, total, low, high in zip(starts, counts, sums, np.minimum.reduceat(values, first),
+                                                     np.maximum.reduceat(values, first))]
+
+    def stats(self):
+        """Row count, athletes, sessions and bytes on disk"""
+        names = self._load_names()
+        return {
+            'poses': len(self),
+            'athletes': len(names['athletes']),
+            'sessions': len(names['sessions']),
+            'bytes': sum(os.path.getsize(self._path(name + '.bin')) for name in COLUMNS
+                         if os.path.exists(self._path(name + '.bin'))),
+        }
+
+
+_archive = None
+
+
+def configure(directory):
+    """Open the archive analyses are stored in; None turns archiving off"""
+    global _archive
+    _archive = LandmarkArchive(directory) if directory else None
+
+
+def get_archive():
+    """The configured LandmarkArchive, or None when archiving is off"""
+    return _archive
+
+
+def parse_time(value):
+    """Unix seconds from an ISO 8601 date or datetime (UTC unless it has an offset)"""
+    parsed = datetime.datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query and re-score a landmark archive")
+    parser.add_argument('archive', help="Archive directory")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('stats', help="Row, athlete and session counts")
+
+    rescore = commands.add_parser('rescore', help="Re-apply the feedback rules to stored poses")
+    trend = commands.add_parser('trend', help="Per-bucket statistics of one angle")
+    for command in (rescore, trend):
+        command.add_argument('--athlete')
+        command.add_argument('--pose-type', help="Only poses stored as this stance, e.g. lunge or neither")
+        command.add_argument('--since', help="ISO 8601 date or time")
+        command.add_argument('--until', help="ISO 8601 date or time")
+    rescore.add_argument('--session')
+    rescore.add_argument('--as', dest='score_as', choices=criteria.get().stances,
+                         help="Score every pose as this stance instead of its stored one")
+    rescore.add_argument('--output', help="Save (row, fault bitmask) pairs as a structured .npy")
+    trend.add_argument('--angle', choices=criteria.get().angle_names, default='front_knee')
+    trend.add_argument('--days', type=float, default=30, help="Look back this far when --since is not given")
+    trend.add_argument('--bucket', choices=sorted(BUCKETS), default='day')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.archive):
+        sys.exit(f"No archive at {args.archive}")
+    archive = LandmarkArchive(args.archive)
+
+    if args.command == 'stats':
+        print(json.dumps(archive.stats(), indent=2))
+        return
+
+    since = parse_time(args.since) if args.since else None
+    until = parse_time(args.until) if args.until else None
+
+    if args.command == 'rescore':
+        started = time.perf_counter()
+        rows = archive.select(args.athlete, args.session, args.pose_type, since, until)
+        summary, faults = archive.rescore(
+            rows, args.score_as,
+            progress=lambda done, total: print(f"\r{done}/{total} poses", end='', file=sys.stderr))
+        elapsed = time.perf_counter() - started
+        print(file=sys.stderr)
+        print(json.dumps(summary, indent=2))
+        print(f"Re-scored {len(rows)} poses in {elapsed:.2f}s ({len(rows) / max(elapsed, 1e-9):.0f} poses/s)",
+              file=sys.stderr)
+        if args.output:
+            np.save(args.output, fault_table(rows, faults))
+        return
+
+    if not args.athlete:
+        parser.error("trend needs --athlete")
+    if since is None:
+        since = (until or time.time()) - args.days * 86400
+    started = time.perf_counter()
+    buckets = archive.trend(args.athlete, args.angle, since, until, args.pose_type, args.bucket)
+    elapsed = time.perf_counter() - started
+    for bucket in buckets:
+        print(f"{bucket['start'][:16]}  n={bucket['count']:<6} mean={bucket['mean']:7.1f}  "
+              f"min={bucket['min']:7.1f}  max={bucket['max']:7.1f}")
+    print(f"{len(buckets)} buckets in {elapsed * 1000:.1f} ms", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Landmarks are stored as a (33, 4) float32 array of x, y, z, visibility;
+# an empty (0, 4) array records that no pose was found in the image
+NO_POSE = np.zeros((0, 4), dtype=np.float32)
+
+_max_entries = int(os.environ.get('LANDMARK_CACHE_SIZE', 512))
+_cache_dir = os.environ.get('LANDMARK_CACHE_DIR') or None
+_entries = OrderedDict()
+_lock = threading.Lock()
+_counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+
+
+def configure(max_entries=None, cache_dir=None):
+    """
+    Set the cache bounds
+    Parameters:
+        max_entries: Number of results kept in memory, 0 keeps none
+        cache_dir: Directory for the on-disk tier, None to keep it off
+    """
+    global _max_entries, _cache_dir
+    with _lock:
+        if max_entries is not None:
+            _max_entries = max_entries
+        _cache_dir = cache_dir
+        while len(_entries) > _max_entries:
+            _entries.popitem(last=False)
+
+
+def make_key(image, settings):
+    """
+    Hash the decoded pixels together with the model settings
+    Parameters:
+        image: Decoded image as a numpy array
+        settings: Dict of pose model settings
+    Returns:
+        Hex digest identifying this image under these settings
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(json.dumps(settings, sort_keys=True).encode())
+    digest.update(str(image.shape).encode())
+    digest.update(np.ascontiguousarray(image).data)
+    return digest.hexdigest()
+
+
+def _disk_path(key):
+    return os.path.join(_cache_dir, key[:2], key + '.npy')
+
+
+def get(key):
+    """
+    Look up landmarks for a key
+    Returns:
+        Landmark array (possibly NO_POSE), or None on a miss
+    """
+    with _lock:
+        if key in _entries:
+            _entries.move_to_end(key)
+            _counters['memory_hits'] += 1
+            return _entries[key]
+
+    if _cache_dir is not None:
+        try:
+            landmarks = np.load(_disk_path(key))
+        except (OSError, ValueError):
+            landmarks = None
+        if landmarks is not None:
+            _remember(key, landmarks)
+            with _lock:
+                _counters['disk_hits'] += 1
+            return landmarks
+
+    with _lock:
+        _counters['misses'] += 1
+    return None
+
+
+def _remember(key, landmarks):
+    with _lock:
+        if _max_entries <= 0:
+            return
+        _entries[key] = landmarks
+        _entries.move_to_end(key)
+        while len(_entries) > _max_entries:
+            _entries.popitem(last=False)
+
+
+def put(key, landmarks):
+    """Store landmarks in memory and, if enabled, on disk"""
+    landmarks = np.asarray(landmarks, dtype=np.float32)
+    _remember(key, landmarks)
+
+    if _cache_dir is not None:
+        path = _disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # A temp file of its own per writer, so threads and processes storing
+        # the same image never write into one another's file
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix='.tmp', delete=False) as f:
+            np.save(f, landmarks)
+        os.replace(f.name, path)
+
+
+def stats():
+    with _lock:
+        counters = dict(_counters)
+        counters['entries'] = len(_entries)
+    return counters
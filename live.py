@@ -0,0 +1,419 @@
+"""
+Live coaching over a WebSocket
+The browser sends camera frames as binary messages and gets back small JSON
+deltas (landmarks for its own overlay, plus the angles, stance and feedback
+that changed) instead of annotated images. Every connection has its own
+tracking Pose, as a video stream does in video.py, and a one-frame mailbox:
+a frame that arrives while the previous one is still waiting replaces it,
+so a busy server drops stale frames rather than falling behind. A few
+scheduler threads shared by all sessions analyze whichever sessions have a
+frame waiting, in arrival order, so CPU use stays bounded by the thread
+count however many sessions are open. State lives in this process only.
+
+Protocol, client to server:
+    binary message: one encoded frame (JPEG, PNG or WebP)
+    text message:   JSON settings, e.g. {"pose_type": "lunge"}
+Server to client, all JSON text messages:
+    {"type": "ready", "pose_type": ..., "model_complexity": ...}
+    {"type": "pose", "frame": n, "detected": true, "landmarks": [...],
+     "angles": {...}, "stance": ..., "feedback": [...], "dropped": n, "ms": ...}
+    {"type": "error", "error": ..., "error_code": ...}
+"frame" counts received frames from 1; "landmarks" is x, y and visibility
+per landmark, flattened and in thousandths of the frame size (visibility in
+thousandths). "angles", "stance", "stance_confidence", "feedback" and
+"dropped" are only present when they changed since the last message, and
+everything is sent again after the pose was lost.
+"""
+
+import json
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import image_io
+import metrics
+import pipeline
+import pose_engine
+import renderer
+import stance_classifier
+
+# Frames are decoded with their longest side bounded by this; the tracking
+# model reads 256 x 256, so webcam frames gain nothing from more
+MAX_FRAME_SIDE = 640
+# Angles are resent once they move by at least this many degrees
+ANGLE_STEP = 0.5
+# Landmark pairs the browser joins when drawing its overlay
+OVERLAY_CONNECTIONS = renderer.POSE_CONNECTIONS.tolist()
+
+# Close codes (RFC 6455)
+NORMAL_CLOSURE = 1000
+POLICY_VIOLATION = 1008
+INTERNAL_ERROR = 1011
+TRY_AGAIN_LATER = 1013
+
+# Error codes of live sessions; unreadable frames report pipeline.READ_ERROR
+BUSY = 'busy'
+ANALYSIS_FAILED = 'analysis_failed'
+
+
+class LiveSessionsFull(Exception):
+    """Raised by open_session when max_sessions sessions are already open"""
+
+
+_lock = threading.Lock()
+_max_sessions = 16
+_workers = 2
+_ready = queue.Queue()  # sessions with a frame waiting, in arrival order
+_sessions = set()
+# Reset tracking graphs of closed sessions by model complexity; a graph takes
+# about a second and 100 MB to build, and open plus idle graphs are kept
+# within max_sessions
+_idle = {}
+_threads = []
+_counts = {'opened': 0, 'rejected': 0, 'received': 0, 'analyzed': 0, 'dropped': 0, 'unreadable': 0}
+
+
+def configure(max_sessions=16, workers=2):
+    """
+    Size the session limit and scheduler; threads start with the first session
+    Parameters:
+        max_sessions: Sessions allowed at once before open_session raises
+            LiveSessionsFull; each holds a tracking Pose and up to two frames
+        workers: Scheduler threads, i.e. frames analyzed at once
+    """
+    global _max_sessions, _workers
+
+    with _lock:
+        if _threads:
+            raise RuntimeError("live.configure must be called before the first session is opened")
+        _max_sessions = max_sessions
+        _workers = max(workers, 1)
+
+
+def _start():
+    # Called with _lock held
+    while len(_threads) < _workers:
+        thread = threading.Thread(target=_schedule, name=f"live-scheduler-{len(_threads)}", daemon=True)
+        thread.start()
+        _threads.append(thread)
+
+
+def _schedule():
+    while True:
+        session = _ready.get()
+        try:
+            session._run()
+        except Exception as e:
+            # A broken session must not take the scheduler thread with it
+            session._fail(str(e) or e.__class__.__name__)
+
+
+def _count(name, amount=1):
+    with _lock:
+        _counts[name] += amount
+
+
+def _take_pose(model_complexity):
+    """An idle tracking graph, or a new one; called for a session already in _sessions"""
+    spare = None
+    with _lock:
+        idle = _idle.get(model_complexity)
+        if idle:
+            return idle.pop()
+        if len(_sessions) + sum(len(graphs) for graphs in _idle.values()) > _max_sessions:
+            spare = next(graphs.pop() for graphs in _idle.values() if graphs)
+    if spare is not None:
+        spare.close()
+    return pose_engine.create_tracking_pose(model_complexity=model_complexity)
+
+
+def _put_pose(pose, model_complexity):
+    # reset() starts a new run, so the next stream starts with no tracking state
+    try:
+        pose.reset()
+    except Exception:
+        pose.close()
+        return
+    with _lock:
+        _idle.setdefault(model_complexity, []).append(pose)
+
+
+def encode(message):
+    """A message as compact JSON text"""
+    return json.dumps(message, separators=(',', ':'))
+
+
+def _angle_changed(previous, value):
+    if previous is None:
+        return True
+    if isinstance(value, float) and isinstance(previous, float):
+        return abs(value - previous) >= ANGLE_STEP
+    return value != previous
+
+
+class LiveSession:
+    """
+    One WebSocket connection's tracking state and frame mailbox
+    Frames go in through offer() from the connection's thread; a scheduler
+    thread analyzes the newest one and sends the result. A session is only
+    ever on the ready queue once, so its Pose serves one thread at a time.
+    """
+
+    def __init__(self, ws, pose_type, model_complexity):
+        self.ws = ws
+        self.pose_type = pose_type
+        self.model_complexity = model_complexity
+        self.pose = None
+        self.received = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._frame = None  # (frame number, encoded bytes, arrival time)
+        self._scheduled = False
+        self._closed = False
+        self._sent = {}  # fields as last sent, for deltas
+
+    def offer(self, data):
+        """Hand over an encoded frame, replacing one that is still waiting"""
+        with self._lock:
+            if self._closed:
+                return
+            self.received += 1
+            if self._frame is not None:
+                self.dropped += 1
+                _count('dropped')
+                metrics.increment('live_frames_total', outcome='dropped')
+            self._frame = (self.received, data, time.perf_counter())
+            schedule = not self._scheduled
+            self._scheduled = True
+        _count('received')
+        if schedule:
+            _ready.put(self)
+
+    def set_pose_type(self, pose_type):
+        """Give feedback for another stance from the next frame on"""
+        with self._lock:
+            self.pose_type = pose_type
+
+    def send(self, message):
+        """
+        Send one JSON message; safe from any thread
+        Returns:
+            False once the connection is gone
+        """
+        with self._send_lock:
+            if self._closed:
+                return False
+            try:
+                self.ws.send(encode(message))
+            except Exception:
+                # ConnectionClosed or a dead socket: the receive loop sees it too
+                self._closed = True
+                return False
+        return True
+
+    def close(self, reason=None, message=None):
+        """
+        Stop analyzing and close the connection; the Pose is released now,
+        or by the scheduler thread if it is analyzing a frame
+        """
+        with self._send_lock:
+            with self._lock:
+                was_closed, self._closed = self._closed, True
+                self._frame = None
+                release = not self._scheduled
+            if not was_closed and reason is not None:
+                try:
+                    self.ws.close(reason=reason, message=message)
+                except Exception:
+                    pass
+        if release:
+            self._release()
+
+    def _fail(self, error):
+        with self._lock:
+            self._scheduled = False
+        self.send({'type': 'error', 'error': error, 'error_code': ANALYSIS_FAILED})
+        self.close(INTERNAL_ERROR, 'Analysis failed')
+
+    def _release(self):
+        with self._lock:
+            pose, self.pose = self.pose, None
+        if pose is not None:
+            _put_pose(pose, self.model_complexity)
+        with _lock:
+            _sessions.discard(self)
+
+    def _run(self):
+        # Scheduler thread: analyze the newest frame, then requeue the
+        # session if another arrived meanwhile
+        with self._lock:
+            entry, self._frame = self._frame, None
+            pose_type = self.pose_type
+        if entry is not None:
+            number, data, arrived = entry
+            started = time.perf_counter()
+            message = self._analyze(data, pose_type)
+            message['frame'] = number
+            message['ms'] = round((time.perf_counter() - started) * 1000, 1)
+            if self.dropped != self._sent.get('dropped', 0):
+                message['dropped'] = self._sent['dropped'] = self.dropped
+            if self.send(message):
+                metrics.observe('live_frame_seconds', time.perf_counter() - arrived)
+
+        with self._lock:
+            if self._closed:
+                self._scheduled = False
+            elif self._frame is not None:
+                _ready.put(self)
+                return
+            else:
+                self._scheduled = False
+                return
+        self._release()
+
+    def _analyze(self, data, pose_type):
+        """The delta message for one encoded frame"""
+        image, _ = image_io.decode_scaled(data, MAX_FRAME_SIDE)
+        if image is None:
+            _count('unreadable')
+            metrics.increment('live_frames_total', outcome='unreadable')
+            return {'type': 'error', 'error': 'Could not read frame', 'error_code': pipeline.READ_ERROR}
+
+        image_height, image_width = image.shape[:2]
+        frame_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        frame_rgb.flags.writeable = False
+        results = self.pose.process(frame_rgb)
+        _count('analyzed')
+        metrics.increment('live_frames_total', outcome='analyzed')
+
+        if results.pose_landmarks is None:
+            # Lost: the next detection sends everything again
+            dropped = self._sent.get('dropped', 0)
+            self._sent = {'dropped': dropped}
+            return {'type': 'pose', 'detected': False}
+
+        landmarks = pose_engine.landmarks_to_array(results.pose_landmarks)
+        angles = pipeline.measure(pipeline.PoseRecord(landmarks, image_width, image_height))
+        frame_pose_type, classification = pipeline.resolve(pose_type, angles)
+        if classification is None:
+            classification = stance_classifier.classify(angles)
+
+        message = {'type': 'pose', 'detected': True,
+                   'landmarks': np.rint(landmarks[:, [0, 1, 3]] * 1000).astype(int).ravel().tolist()}
+        previous = self._sent.setdefault('angles', {})
+        changed = {}
+        for name, value in angles.items():
+            value = round(value, 1) if isinstance(value, float) else value
+            if _angle_changed(previous.get(name), value):
+                changed[name] = previous[name] = value
+        if changed:
+            message['angles'] = changed
+        if classification['stance'] != self._sent.get('stance'):
+            message['stance'] = self._sent['stance'] = classification['stance']
+            message['stance_confidence'] = classification['confidence']
+        feedback = pipeline.evaluate(frame_pose_type, angles)
+        if feedback != self._sent.get('feedback'):
+            message['feedback'] = self._sent['feedback'] = feedback
+        return message
+
+
+def open_session(ws, pose_type, model_complexity=None):
+    """
+    Register a session for a connection
+    Parameters:
+        ws: Connection with send(data), receive(timeout) and close(reason, message)
+        pose_type: 'en_garde', 'lunge', or 'auto' to follow the classified stance
+        model_complexity: 0, 1 or 2, defaults to pose_engine.TRACKING_SETTINGS
+    Returns:
+        LiveSession
+    Raises:
+        LiveSessionsFull: if max_sessions sessions are already open
+    """
+    if model_complexity is None:
+        model_complexity = pose_engine.TRACKING_SETTINGS['model_complexity']
+    session = LiveSession(ws, pose_type, model_complexity)
+    with _lock:
+        if len(_sessions) >= _max_sessions:
+            _counts['rejected'] += 1
+            raise LiveSessionsFull(f"{_max_sessions} live sessions are already open")
+        _start()
+        _sessions.add(session)
+        _counts['opened'] += 1
+    # Building a graph takes a while; doing it here keeps it off the
+    # scheduler threads other sessions are waiting on
+    try:
+        session.pose = _take_pose(model_complexity)
+    except Exception:
+        session.close()
+        raise
+    return session
+
+
+def serve(ws, pose_type, model_complexity=None, idle_timeout=30, pose_types=()):
+    """
+    Run a live session on an accepted WebSocket until it closes
+    Blocks the calling (connection) thread on receive; analysis happens on
+    the scheduler threads.
+    Parameters:
+        ws: Connection with send(data), receive(timeout) and close(reason, message)
+        pose_type: Initial pose type
+        model_complexity: 0, 1 or 2, defaults to pose_engine.TRACKING_SETTINGS
+        idle_timeout: Seconds without a message before the session is closed
+        pose_types: Pose types a settings message may switch to
+    """
+    try:
+        session = open_session(ws, pose_type, model_complexity)
+    except LiveSessionsFull:
+        metrics.increment('live_sessions_total', outcome='rejected')
+        ws.send(encode({'type': 'error', 'error': 'Too many live sessions, please retry shortly',
+                        'error_code': BUSY}))
+        ws.close(reason=TRY_AGAIN_LATER, message='Too many live sessions')
+        return
+    metrics.increment('live_sessions_total', outcome='opened')
+
+    try:
+        session.send({'type': 'ready', 'pose_type': pose_type, 'model_complexity': session.model_complexity})
+        while True:
+            message = ws.receive(timeout=idle_timeout)
+            if message is None:
+                session.close(NORMAL_CLOSURE, 'Idle timeout')
+                return
+            if isinstance(message, (bytes, bytearray)):
+                session.offer(message)
+                continue
+            try:
+                settings = json.loads(message)
+                new_type = settings['pose_type']
+            except (ValueError, TypeError, KeyError):
+                session.send({'type': 'error', 'error': 'Text messages must be JSON with a pose_type',
+                              'error_code': 'bad_request'})
+                continue
+            if new_type not in pose_types:
+                session.send({'type': 'error', 'error': f'pose_type must be one of {", ".join(pose_types)}',
+                              'error_code': 'bad_request'})
+                continue
+            session.set_pose_type(new_type)
+    finally:
+        session.close()
+
+
+def stats():
+    """Open sessions and frame counts since start"""
+    with _lock:
+        return {
+            'sessions': len(_sessions),
+            'max_sessions': _max_sessions,
+            'idle_graphs': sum(len(graphs) for graphs in _idle.values()),
+            'workers': _workers,
+            'queued': _ready.qsize(),
+            'sessions_opened': _counts['opened'],
+            'sessions_rejected': _counts['rejected'],
+            'frames_received': _counts['received'],
+            'frames_analyzed': _counts['analyzed'],
+            'frames_dropped': _counts['dropped'],
+            'frames_unreadable': _counts['unreadable'],
+        }
@@ -0,0 +1,231 @@
+"""
+Streaming lunge detection and phase segmentation for video
+Consumes one landmark array per frame, smooths it with a One-Euro filter
+and runs a small state machine over the stance width (ankle distance in leg
+lengths) and the angles from kinematics.compute_angles:
+
+    idle --width rises--> drive --width falls from its peak--> recovery
+         <--------------- width back near the en-garde baseline ---
+
+Only the current lunge's running aggregates are kept, so memory stays
+constant however long the session is.
+"""
+
+import math
+
+import numpy as np
+
+import kinematics
+
+# Stance width thresholds, in leg lengths above the en-garde baseline
+START_DELTA = 0.3  # the legs are driving into a lunge
+REST_DELTA = 0.1  # still at rest; the last such frame is the lunge's start
+EXTENSION_DROP = 0.15  # below the peak width: full extension has passed
+RECOVERED_DELTA = 0.15  # back in en garde
+BASELINE_SECONDS = 1.0  # time constant of the en-garde width average
+MAX_LUNGE_SECONDS = 5.0  # close a lunge that never recovers
+MAX_GAP_SECONDS = 0.5  # restart smoothing after this long without a pose
+
+ARM_EXTENDED = 160.0  # front elbow angle counted as an extended arm
+ARM_HYSTERESIS = 10.0
+# Furthest the arm is credited with leading the legs; an arm held straight
+# for longer (or since an earlier lunge) counts as extended this long before
+# the drive started
+MAX_ARM_LEAD_SECONDS = 1.0
+MIN_VISIBILITY = 0.5
+
+# Joints the segmenter reads; frames where any is poorly visible are skipped
+REQUIRED_JOINTS = [kinematics.LEFT_HIP, kinematics.RIGHT_HIP, kinematics.LEFT_KNEE, kinematics.RIGHT_KNEE,
+                   kinematics.LEFT_ANKLE, kinematics.RIGHT_ANKLE]
+
+
+class OneEuroFilter:
+    """
+    One-Euro low-pass filter (Casiez et al., 2012) over arrays of any shape
+    Slow movements are smoothed with a cutoff near min_cutoff; the cutoff
+    rises with speed (scaled by beta) so fast movements are not delayed.
+    """
+
+    def __init__(self, min_cutoff=1.5, beta=2.0, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        self._value = self._derivative = self._time = None
+
+    @staticmethod
+    def _alpha(dt, cutoff):
+        return 1.0 / (1.0 + 1.0 / (2 * math.pi * cutoff * dt))
+
+    def __call__(self, time_s, value):
+        """Filter the value observed at time_s (seconds, increasing)"""
+        value = np.asarray(value, dtype=np.float64)
+        if self._value is None:
+            self._value, self._derivative, self._time = value, np.zeros_like(value), time_s
+            return value
+
+        dt = max(time_s - self._time, 1e-3)
+        derivative = (value - self._value) / dt
+        alpha = self._alpha(dt, self.d_cutoff)
+        self._derivative = alpha * derivative + (1 - alpha) * self._derivative
+
+        alpha = self._alpha(dt, self.min_cutoff + self.beta * np.abs(self._derivative))
+        self._value = alpha * value + (1 - alpha) * self._value
+        self._time = time_s
+        return self._value
+
+
+class LungeSegmenter:
+    """
+    Detect lunges frame by frame
+    Feed every frame to update() in order and call finish() at the end of
+    the stream; both return the lunges completed by that call.
+    """
+
+    def __init__(self, smoothing=None):
+        self.smoothing = smoothing or OneEuroFilter()
+        self.state = 'idle'
+        self.baseline = None  # en-garde stance width, leg lengths
+        self._last_time = None
+        self._last_pose_time = None
+        self._rest = None  # (frame, time) of the last frame at rest
+        self._arm_extended_at = None  # time the front arm last became extended
+        self._lunge = None
+
+    def update(self, frame, time_s, landmarks, image_size):
+        """
+        Process one frame
+        Parameters:
+            frame: Frame index
+            time_s: Timestamp in seconds
+            landmarks: (33, 4) normalized x, y, z, visibility array, or None
+                when no pose was found
+            image_size: (width, height) of the frame
+        Returns:
+            List of lunge dicts completed at this frame (usually empty)
+        """
+        if self._last_time is not None and time_s <= self._last_time:
+            time_s = self._last_time + 1e-3
+        self._last_time = time_s
+
+        if landmarks is None or landmarks[REQUIRED_JOINTS, 3].min() < MIN_VISIBILITY:
+            return self._check_timeout(time_s)
+        dt = time_s - self._last_pose_time if self._last_pose_time is not None else 0.0
+        if dt > MAX_GAP_SECONDS:
+            self.smoothing.reset()
+        self._last_pose_time = time_s
+
+        image_width, image_height = image_size
+        smoothed = self.smoothing(time_s, landmarks[:, :2])
+        points = smoothed * (image_width, image_height)
+        angles = kinematics.compute_angles(points, image_height)
+
+        leg_length = np.mean([
+            np.linalg.norm(points[hip] - points[knee]) + np.linalg.norm(points[knee] - points[ankle])
+            for hip, knee, ankle in ((kinematics.LEFT_HIP, kinematics.LEFT_KNEE, kinematics.LEFT_ANKLE),
+                                     (kinematics.RIGHT_HIP, kinematics.RIGHT_KNEE, kinematics.RIGHT_ANKLE))])
+        if leg_length < 1:
+            return []
+        width = abs(points[kinematics.RIGHT_ANKLE, 0] - points[kinematics.LEFT_ANKLE, 0]) / leg_length
+
+        front_elbow = float(angles['front_elbow'])
+        if front_elbow >= ARM_EXTENDED:
+            if self._arm_extended_at is None:
+                self._arm_extended_at = time_s
+        elif front_elbow < ARM_EXTENDED - ARM_HYSTERESIS:
+            self._arm_extended_at = None
+
+        sample = {'frame': frame, 'time': time_s, 'dt': dt, 'width': width,
+                  'front_knee': float(angles['front_knee']), 'back_knee': float(angles['back_knee'])}
+        return self._step(sample)
+
+    def _step(self, sample):
+        if self.state == 'idle':
+            if self.baseline is None:
+                self.baseline = sample['width']
+            if sample['width'] > self.baseline + START_DELTA:
+                self._begin(sample)
+            else:
+                # Only en-garde frames move the baseline
+                self.baseline += (sample['width'] - self.baseline) * min(sample['dt'] / BASELINE_SECONDS, 1.0)
+                if sample['width'] <= self.baseline + REST_DELTA:
+                    self._rest = (sample['frame'], sample['time'], sample['width'])
+            return []
+
+        lunge = self._lunge
+        lunge['min_front_knee'] = min(lunge['min_front_knee'], sample['front_knee'])
+        lunge['max_back_knee'] = max(lunge['max_back_knee'], sample['back_knee'])
+        if lunge['arm_time'] is None and self.state == 'drive':
+            lunge['arm_time'] = self._arm_time(lunge['start_time'])
+
+        if self.state == 'drive':
+            if sample['width'] >= lunge['peak']['width']:
+                lunge['peak'] = sample
+            elif sample['width'] < lunge['peak']['width'] - EXTENSION_DROP:
+                self.state = 'recovery'
+        if self.state == 'recovery' and sample['width'] <= self.baseline + RECOVERED_DELTA:
+            return [self._close(sample, recovered=True)]
+        return self._check_timeout(sample['time'], sample)
+
+    def _arm_time(self, start_time):
+        """When the arm extended for the lunge that started at start_time, bounded to its window"""
+        if self._arm_extended_at is None:
+            return None
+        return max(self._arm_extended_at, start_time - MAX_ARM_LEAD_SECONDS)
+
+    def _begin(self, sample):
+        start_frame, start_time, start_width = self._rest or (sample['frame'], sample['time'], self.baseline)
+        self.state = 'drive'
+        self._lunge = {
+            'start_frame': start_frame,
+            'start_time': start_time,
+            'start_width': start_width,
+            'peak': sample,
+            'min_front_knee': sample['front_knee'],
+            'max_back_knee': sample['back_knee'],
+            'arm_time': self._arm_time(start_time),
+        }
+
+    def _check_timeout(self, time_s, sample=None):
+        if self._lunge is None or time_s - self._lunge['start_time'] <= MAX_LUNGE_SECONDS:
+            return []
+        return [self._close(sample, recovered=False)]
+
+    def _close(self, sample, recovered):
+        lunge, peak = self._lunge, self._lunge['peak']
+        self._lunge = None
+        self.state = 'idle'
+        self._rest = (sample['frame'], sample['time'], sample['width']) if sample and recovered else None
+        # An arm still straight after this lunge restarts its timing for the next
+        self._arm_extended_at = None
+
+        drive_s = max(peak['time'] - lunge['start_time'], 1e-3)
+        arm_time = lunge['arm_time']
+        return {
+            'start_frame': lunge['start_frame'],
+            'start_ms': round(lunge['start_time'] * 1000, 1),
+            'extension_frame': peak['frame'],
+            'extension_ms': round(peak['time'] * 1000, 1),
+            'recovery_frame': sample['frame'] if recovered else None,
+            'recovery_ms': round(sample['time'] * 1000, 1) if recovered else None,
+            'recovered': recovered,
+            'drive_ms': round(drive_s * 1000, 1),
+            'front_knee_at_extension': round(peak['front_knee'], 1),
+            'min_front_knee': round(lunge['min_front_knee'], 1),
+            'back_knee_at_extension': round(peak['back_knee'], 1),
+            'max_back_knee': round(lunge['max_back_knee'], 1),
+            'max_stance_width': round(peak['width'], 2),
+            # Leg lengths per second while the legs drive to full extension
+            'speed': round((peak['width'] - lunge['start_width']) / drive_s, 2),
+            'arm_extended_ms': round(arm_time * 1000, 1) if arm_time is not None else None,
+            # Positive when the arm was extended before the legs started driving
+            'arm_lead_ms': round((lunge['start_time'] - arm_time) * 1000, 1) if arm_time is not None else None,
+        }
+
+    def finish(self):
+        """Close a lunge still in progress at the end of the stream"""
+        if self._lunge is None:
+            return []
+        return [self._close(None, recovered=False)]
@@ -0,0 +1,143 @@
+import bisect
+import os
+import threading
+
+# Recording is a couple of dict lookups per observation; METRICS_ENABLED=0
+# turns every call into an immediate return and hides /metrics
+ENABLED = os.environ.get('METRICS_ENABLED', '1').lower() not in ('0', 'false', 'no')
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+MEGAPIXEL_BUCKETS = (0.1, 0.3, 0.5, 1.0, 2.0, 4.0, 8.0, 12.0, 16.0, 24.0, 48.0)
+
+# name: (help text, buckets)
+HISTOGRAMS = {
+    'analyze_stage_seconds': ("Time spent in each stage of an analysis", LATENCY_BUCKETS),
+    'analyze_request_seconds': ("End-to-end /analyze latency", LATENCY_BUCKETS),
+    'analyze_image_megapixels': ("Size of analyzed images before downscaling", MEGAPIXEL_BUCKETS),
+    'live_frame_seconds': ("Time from a live frame arriving to its result being sent", LATENCY_BUCKETS),
+}
+
+# name: help text
+COUNTERS = {
+    'analyze_results_total': "Analyses by pose type and outcome (ok, no_pose, error)",
+    'landmark_cache_lookups_total': "Landmark cache lookups seen by analyses, by outcome",
+    'analyze_errors_total': "Rejected or failed /analyze requests by reason",
+    'presence_gate_rejections_total': "Images the presence gate turned away before inference, by reason",
+    'presence_gate_saved_seconds_total': "Estimated pose model time the presence gate avoided",
+    'live_sessions_total': "Live coaching sessions by outcome (opened, rejected)",
+    'live_frames_total': "Live frames by outcome (analyzed, dropped for a newer frame, unreadable)",
+}
+
+_lock = threading.Lock()
+_histograms = {}  # (name, labels) -> [bucket counts..., +Inf count], sum
+_counters = {}  # (name, labels) -> value
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def observe(name, value, **labels):
+    """Add one observation to a histogram"""
+    if not ENABLED:
+        return
+    buckets = HISTOGRAMS[name][1]
+    index = bisect.bisect_left(buckets, value)
+    key = (name, _labels(labels))
+    with _lock:
+        entry = _histograms.get(key)
+        if entry is None:
+            entry = _histograms[key] = [[0] * (len(buckets) + 1), 0.0]
+        entry[0][index] += 1
+        entry[1] += value
+
+
+def increment(name, amount=1, **labels):
+    """Add to a counter"""
+    if not ENABLED:
+        return
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def record_analysis(pose_type, result):
+    """
+    Record the stage timings, image size and outcome of one analyze_task result
+    Parameters:
+        pose_type: 'en_garde' or 'lunge'
+        result: Dict from inference_pool.analyze_task
+    """
+    if not ENABLED:
+        return
+    for stage, seconds in (result.get('timings') or {}).items():
+        observe('analyze_stage_seconds', seconds, stage=stage, pose_type=pose_type)
+    if result.get('image_size'):
+        width, height = result['image_size']
+        observe('analyze_image_megapixels', width * height / 1e6, pose_type=pose_type)
+    if result.get('cache_hit') is not None:
+        increment('landmark_cache_lookups_total', outcome='hit' if result['cache_hit'] else 'miss')
+    increment('analyze_results_total', pose_type=pose_type, status=result['status'])
+    if result.get('inference_saved') is not None:
+        increment('presence_gate_rejections_total', reason=result['error_code'])
+        increment('presence_gate_saved_seconds_total', result['inference_saved'])
+
+
+def server_timing(timings):
+    """Format {stage: seconds} as a Server-Timing header value"""
+    return ', '.join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(gauges=None):
+    """
+    Prometheus text exposition of every histogram and counter
+    Parameters:
+        gauges: Optional dict of name to (help text, value) for point-in-time values
+    Returns:
+        str in the text format, version 0.0.4
+    """
+    with _lock:
+        histograms = {key: ([*counts], total) for key, (counts, total) in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = []
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for (metric, labels), (counts, total) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip([*buckets, '+Inf'], counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_number(total)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+
+    for name, help_text in COUNTERS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"{name}{_format_labels(labels)} {_format_number(value)}")
+
+    for name, (help_text, value) in (gauges or {}).items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {_format_number(value)}"]
+
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
@@ -0,0 +1,98 @@
+import os
+
+import cv2
+import numpy as np
+
+import pose_engine
+
+# People are searched for on a copy whose longest side is at most this;
+# fencers fill a good part of a bout photo, so detail beyond it only costs time
+DETECT_SIDE = int(os.environ.get('PERSON_DETECT_SIDE', 480))
+MIN_SCORE = float(os.environ.get('PERSON_MIN_SCORE', 0.3))
+# Boxes are grown by this fraction of their size on every side before
+# cropping, so extended arms, blades and lunging feet stay in the crop
+CROP_PADDING = 0.2
+NMS_THRESHOLD = 0.4
+
+
+
+def _create_detector():
+    detector = cv2.HOGDescriptor()
+    detector.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+    return detector
+
+
+# detectMultiScale is not documented as thread-safe
+_detectors = pose_engine.IdlePool(_create_detector)
+
+
+def acquire_detector():
+    """Check out a pooled HOG people detector, building one only when all are busy"""
+    return _detectors.acquire()
+
+
+def detect_people(image, max_people=2):
+    """
+    Find upright people with OpenCV's HOG + linear SVM pedestrian detector
+    Parameters:
+        image: BGR image
+        max_people: Keep at most this many, highest scores first
+    Returns:
+        List of (x, y, width, height) boxes in image pixels, best first
+    """
+    image_height, image_width = image.shape[:2]
+    scale = min(DETECT_SIDE / max(image_height, image_width), 1.0) if DETECT_SIDE > 0 else 1.0
+    small = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else image
+
+    with acquire_detector() as detector:
+        boxes, scores = detector.detectMultiScale(small, winStride=(8, 8), padding=(8, 8), scale=1.05)
+    if len(boxes) == 0:
+        return []
+
+    boxes = [[int(round(v / scale)) for v in box] for box in boxes]
+    scores = np.ravel(scores).astype(float).tolist()
+    keep = cv2.dnn.NMSBoxes(boxes, scores, MIN_SCORE, NMS_THRESHOLD)
+    return [tuple(boxes[i]) for i in np.ravel(keep)[:max_people]]
+
+
+def crop_box(box, image_width, image_height, padding=CROP_PADDING):
+    """
+    Grow a box by padding on every side and clip it to the image
+    Returns:
+        (x0, y0, x1, y1) pixel bounds
+    """
+    x, y, width, height = box
+    pad_x, pad_y = width * padding, height * padding
+    return (max(int(x - pad_x), 0), max(int(y - pad_y), 0),
+            min(int(x + width + pad_x), image_width), min(int(y + height + pad_y), image_height))
+
+
+def landmark_box(landmarks, image_width, image_height, min_visibility=0.3):
+    """
+    Pixel bounds of the visible landmarks of one pose
+    Parameters:
+        landmarks: (33, 4) normalized x, y, z, visibility array
+    Returns:
+        (x, y, width, height) box
+    """
+    visible = landmarks[landmarks[:, 3] >= min_visibility]
+    if len(visible) == 0:
+        visible = landmarks
+    x0, y0 = np.clip(visible[:, :2].min(axis=0), 0, 1) * (image_width, image_height)
+    x1, y1 = np.clip(visible[:, :2].max(axis=0), 0, 1) * (image_width, image_height)
+    return int(x0), int(y0), int(x1 - x0), int(y1 - y0)
+
+
+def overlap(a, b):
+    """Intersection over the smaller of two (x, y, width, height) boxes"""
+    width = min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0])
+    height = min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    return width * height / max(min(a[2] * a[3], b[2] * b[3]), 1)
+
+
+def warm_up():
+    """Build one detector so the first bout photo does not pay for it"""
+    with acquire_detector():
+        pass
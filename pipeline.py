@@ -0,0 +1,456 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import cv2
+import numpy as np
+
+import criteria
+import kinematics
+import person_detector
+import pose_engine
+import presence_gate
+import renderer
+import stance_classifier
+import image_io
+
+READ_ERROR_MESSAGE = "Error: Could not read image"
+NO_POSE_MESSAGE = "Error: No pose detected in the image"
+BLANK_IMAGE_MESSAGE = "Error: The image is blank"
+NO_PERSON_MESSAGE = "Error: No person detected in the image"
+
+# Error codes of analyses that found no one to give feedback on
+READ_ERROR = 'unreadable_image'
+NO_POSE = 'no_pose'
+ERROR_MESSAGES = {
+    READ_ERROR: READ_ERROR_MESSAGE,
+    NO_POSE: NO_POSE_MESSAGE,
+    presence_gate.BLANK_IMAGE: BLANK_IMAGE_MESSAGE,
+    presence_gate.NO_PERSON: NO_PERSON_MESSAGE,
+}
+
+# Person crops analyzed at once in a multi-fencer analysis; pose_engine gives
+# every thread its own pooled Pose instance
+FENCER_THREADS = int(os.environ.get('FENCER_THREADS', 2))
+_crop_executor = None
+
+# Region-of-interest inference for single-fencer analyses: locate the
+# fencer on the presence gate's downscaled copy and run the pose model on a
+# crop, so a small subject in a wide shot is not shrunk with the whole frame
+ROI_DEFAULT = os.environ.get('POSE_ROI', 'false').lower() in ('1', 'true', 'yes')
+# Share of the person box's size added on every side of the crop
+ROI_PADDING = 0.25
+# Crops covering more of the frame than this run on the whole frame instead
+ROI_MAX_AREA = 0.6
+# People smaller than the landmark model's 256 px input are cropped from a
+# higher-resolution decode when the analysis image was downscaled
+ROI_MIN_SIDE = 256
+
+
+@dataclass
+class PoseRecord:
+    """Landmarks of one detected pose and the image size they refer to"""
+    landmarks: np.ndarray  # (33, 4) normalized x, y, z, visibility
+    image_width: int  # full-size image, even when detection ran on a smaller copy
+    image_height: int
+    model_complexity: int = None  # model that produced the landmarks
+    points: np.ndarray = field(init=False, repr=False)  # (33, 3) pixel coordinates
+
+    def __post_init__(self):
+        self.points = kinematics.landmarks_to_array(self.landmarks, self.image_width, self.image_height)
+
+    def points_for(self, image):
+        """Pixel coordinates on an image of any size showing the same frame"""
+        image_height, image_width = image.shape[:2]
+        if (image_width, image_height) == (self.image_width, self.image_height):
+            return self.points
+        return kinematics.landmarks_to_array(self.landmarks, image_width, image_height)
+
+
+@dataclass
+class Analysis:
+    """Output of every pipeline stage for one image"""
+    pose_type: str
+    record: PoseRecord = None
+    angles: dict = None
+    feedback: list = field(default_factory=list)
+    annotated_image: np.ndarray = None
+    image_size: tuple = None  # (width, height) before downscaling
+    timings: dict = field(default_factory=dict)  # stage name -> seconds
+    classification: dict = None  # stance_classifier.classify result for pose_type 'auto'
+    error: str = None  # error code when no pose was analyzed, see ERROR_MESSAGES
+    inference_saved: float = None  # estimated model seconds the presence gate avoided
+    cache_hit: bool = None  # every model lookup was a landmark cache hit; None when the model was not reached
+
+
+@dataclass
+class Fencer:
+    """One person in a multi-fencer analysis"""
+    record: PoseRecord
+    angles: dict
+    feedback: list
+    box: tuple  # (x, y, width, height) of the visible landmarks, full-size pixels
+    facing: str  # 'right' or 'left', by determine_facing_direction's ankle rule
+    pose_type: str = None  # stance the feedback was given for
+    classification: dict = None  # for pose_type 'auto'
+
+
+@dataclass
+class BoutAnalysis:
+    """Output of analyze_fencers for one image"""
+    pose_type: str
+    fencers: list = field(default_factory=list)  # Fencer, ordered left to right
+    feedback: list = field(default_factory=list)  # error message when no one was found
+    annotated_image: np.ndarray = None
+    image_size: tuple = None
+    timings: dict = field(default_factory=dict)
+    error: str = None
+    inference_saved: float = None
+    cache_hit: bool = None
+
+
+def gate(image, timings, locate=False):
+    """
+    Presence gate stage: a few milliseconds on a downscaled copy that turn
+    away blank images and images without a person before the pose model
+    Parameters:
+        image: Decoded BGR image
+        timings: Stage timings to add 'gate' to
+        locate: Also find the person's box for ROI inference, running the
+            segmentation even when the gate is off and searching tiles
+            for people too small to find in the whole frame
+    Returns:
+        Tuple of (None to go on, otherwise the presence_gate error code;
+        (x, y, width, height) person box in image pixels, or None)
+    """
+    if not (presence_gate.ENABLED or locate):
+        return None, None
+    started = time.perf_counter()
+    error, person = presence_gate.screen(image, tiles=locate)
+    timings['gate'] = time.perf_counter() - started
+    if not presence_gate.ENABLED:
+        error = None
+    return error, person if locate else None
+
+
+def roi_bounds(source, image, full_size, person):
+    """
+    Where ROI inference runs the model: the person's box grown by
+    ROI_PADDING on every side. When the person is smaller than the landmark
+    model's input on a downscaled image, the crop is cut from a
+    higher-resolution copy (the caller's decoded image as is, or encoded
+    bytes decoded at the smallest JPEG reduction that is large enough) so
+    the model gets real pixels rather than upsampled ones.
+    Parameters:
+        source: What analyze was given (decoded image or encoded bytes)
+        image: The image being analyzed, possibly downscaled
+        full_size: (width, height) of the full-size image
+        person: (x, y, width, height) box from the presence gate, in image pixels
+    Returns:
+        Tuple of (image to crop, (x0, y0, x1, y1) bounds in its pixels), or
+        (image, None) when the crop would be most of the frame anyway
+    """
+    image_height, image_width = image.shape[:2]
+    x0, y0, x1, y1 = person_detector.crop_box(person, image_width, image_height, ROI_PADDING)
+    if (x1 - x0) * (y1 - y0) > ROI_MAX_AREA * image_width * image_height:
+        return image, None
+    upscale = ROI_MIN_SIDE / max(person[2:])
+    if upscale <= 1 or full_size[0] <= image_width:
+        return image, (x0, y0, x1, y1)
+
+    if isinstance(source, np.ndarray) and source.ndim > 1:
+        larger = source
+    else:
+        # The smallest whole JPEG reduction that is large enough, decoded
+        # without a further resize
+        needed = max(image_width, image_height) * upscale
+        factor = next((factor for factor in (8, 4, 2) if max(full_size) / factor >= needed), 1)
+        larger, _ = image_io.decode_scaled(source, -(-max(full_size) // factor))
+    if larger is None or (larger.shape[1] > larger.shape[0]) != (image_width > image_height):
+        return image, (x0, y0, x1, y1)
+    larger_height, larger_width = larger.shape[:2]
+    scale = larger_width / image_width
+    return larger, (int(x0 * scale), int(y0 * scale),
+                    min(int(np.ceil(x1 * scale)), larger_width), min(int(np.ceil(y1 * scale)), larger_height))
+
+
+def detect(image, full_size=None, tier=None, bounds=None, lookups=None):
+    """
+    Inference stage: find the pose in a BGR image
+    Parameters:
+        image: BGR image, possibly downscaled
+        full_size: (width, height) of the original image; landmarks are
+            normalized, so they map back to it unchanged
+        tier: Speed tier, see pose_engine.detect_tiered
+        bounds: Optional (x0, y0, x1, y1) crop to run the model on; the
+            landmarks are mapped back to the whole image
+        lookups: Optional list collecting landmark cache hits, see
+            pose_engine.detect_tiered
+    Returns:
+        PoseRecord, or None if no pose was detected
+    """
+    image_height, image_width, _ = image.shape
+    x0, y0, x1, y1 = bounds or (0, 0, image_width, image_height)
+    landmarks, model_complexity = pose_engine.detect_tiered(
+        cv2.cvtColor(image[y0:y1, x0:x1], cv2.COLOR_BGR2RGB), tier, lookups)
+    if landmarks is None:
+        return None
+    if bounds is not None:
+        # Cached arrays are shared, so map a copy
+        crop_width, crop_height = x1 - x0, y1 - y0
+        landmarks = landmarks.copy()
+        landmarks[:, 0] = (x0 + landmarks[:, 0] * crop_width) / image_width
+        landmarks[:, 1] = (y0 + landmarks[:, 1] * crop_height) / image_height
+        landmarks[:, 2] *= crop_width / image_width
+    return PoseRecord(landmarks, *(full_size or (image_width, image_height)), model_complexity)
+
+
+def measure(record):
+    """
+    Metrics stage: every joint angle for a pose record
+    Returns:
+        Dict of angle name to float (facing_right is a bool)
+    """
+    angles = criteria.get().compute_angles(record.points, record.image_height)
+    return {name: (bool(value) if name == 'facing_right' else float(value))
+            for name, value in angles.items()}
+
+
+def no_stance_message():
+    """Feedback for a pose matching none of the stances, named by their criteria.json titles"""
+    titles = list(criteria.get().titles.values())
+    names = ' or '.join([', '.join(titles[:-1]), titles[-1]] if len(titles) > 1 else titles)
+    return f"No {names} stance recognized"
+
+
+def evaluate(pose_type, angles):
+    """Feedback stage: apply the pose type's rules (from criteria.json) to measured angles"""
+    if pose_type == stance_classifier.NO_STANCE:
+        return [no_stance_message()]
+    return criteria.get().evaluate(pose_type, angles)
+
+
+def resolve(pose_type, angles):
+    """
+    Classification stage for pose_type 'auto'
+    Returns:
+        Tuple of (pose type to give feedback for, classification dict or
+        None when the pose type was given)
+    """
+    if pose_type != stance_classifier.AUTO:
+        return pose_type, None
+    classification = stance_classifier.classify(angles)
+    return classification['stance'], classification
+
+
+def stance_label(pose_type):
+    """Text drawn in the corner of an annotated image"""
+    return criteria.get().labels.get(pose_type, "Stance: unrecognized")
+
+
+def render(image, record, angles, pose_type, in_place=False, max_side=None):
+    """
+    Rendering stage: draw landmarks, stance label and joint angles
+    Parameters:
+        image: BGR image of the frame the record was detected on, at any size
+        record: PoseRecord from detect
+        angles: Dict from measure
+        pose_type: 'en_garde' or 'lunge'
+        in_place: Draw on image itself instead of a copy
+        max_side: Draw on a preview downscaled to this longest side instead
+    Returns:
+        Annotated BGR image
+    """
+    return renderer.render(image, record.landmarks, angles, stance_label(pose_type), in_place, max_side)
+
+
+def analyze(image, pose_type, draw=True, max_side=None, tier=None, preview_side=None, roi=None):
+    """
+    Run inference -> pose record -> angles -> feedback -> optional rendering,
+    each stage consuming the previous stage's output
+    Parameters:
+        image: Decoded BGR image, or encoded image bytes
+        pose_type: 'en_garde', 'lunge', or 'auto' to classify the stance
+            from the measured angles and give feedback for it
+        draw: Render the annotated image; skip it when only numbers are needed
+        max_side: Longest side to analyze and draw at, defaults to
+            image_io.MAX_IMAGE_SIDE (0 keeps full resolution)
+        tier: 'lite', 'full', 'heavy' or 'auto', defaults to pose_engine.DEFAULT_TIER
+        preview_side: Draw the annotated image downscaled to this longest
+            side, e.g. for a thumbnail (None draws at the analysis size)
+        roi: Run the model on a padded crop around the person the presence
+            gate segments instead of the whole frame, falling back to the
+            whole frame when the crop finds no pose (None for ROI_DEFAULT)
+    Returns:
+        Analysis. Landmarks and angles refer to the full-size image; the
+        annotated image is drawn at the reduced size. When the image is
+        unreadable, fails the presence gate or shows no pose, error holds
+        the code, feedback the message and nothing is drawn (the caller
+        already has the image). timings holds the seconds spent in each
+        stage that ran. With 'auto', pose_type is the classified stance
+        ('neither' when it is none of them) and classification holds the
+        confidence
+    """
+    source = image
+    clock = time.perf_counter
+    started = clock()
+    image, full_size = image_io.load_scaled_image(image, image_io.MAX_IMAGE_SIDE if max_side is None else max_side)
+    timings = {'decode': clock() - started}
+    if image is None:
+        return Analysis(pose_type, feedback=[READ_ERROR_MESSAGE], timings=timings, error=READ_ERROR)
+    roi = ROI_DEFAULT if roi is None else roi
+    error, person = gate(image, timings, locate=roi)
+    if error is not None:
+        return Analysis(pose_type, feedback=[ERROR_MESSAGES[error]], image_size=full_size, timings=timings,
+                        error=error, inference_saved=pose_engine.expected_seconds(tier))
+
+    started = clock()
+    record = None
+    lookups = []
+    if person is not None:
+        crop_source, bounds = roi_bounds(source, image, full_size, person)
+        if bounds is not None:
+            record = detect(crop_source, full_size, tier, bounds, lookups)
+    if record is None:
+        record = detect(image, full_size, tier, lookups=lookups)
+    timings['inference'] = clock() - started
+    if record is None:
+        return Analysis(pose_type, feedback=[NO_POSE_MESSAGE], image_size=full_size, timings=timings,
+                        error=NO_POSE, cache_hit=all(lookups))
+
+    started = clock()
+    angles = measure(record)
+    pose_type, classification = resolve(pose_type, angles)
+    feedback = evaluate(pose_type, angles)
+    timings['feedback'] = clock() - started
+
+    annotated_image = None
+    if draw:
+        started = clock()
+        # Only copy before drawing when the pixels belong to the caller
+        annotated_image = render(image, record, angles, pose_type, in_place=image is not source,
+                                 max_side=preview_side)
+        timings['drawing'] = clock() - started
+    return Analysis(pose_type, record, angles, feedback, annotated_image, full_size, timings, classification,
+                    cache_hit=all(lookups))
+
+
+def _detect_crops(image, full_size, tier, bounds, lookups):
+    global _crop_executor
+
+    if len(bounds) < 2 or FENCER_THREADS < 2:
+        return [detect(image, full_size, tier, crop, lookups) for crop in bounds]
+    if _crop_executor is None:
+        _crop_executor = ThreadPoolExecutor(max_workers=FENCER_THREADS, thread_name_prefix='pose-crop')
+    return list(_crop_executor.map(lambda crop: detect(image, full_size, tier, crop, lookups), bounds))
+
+
+def _mask_people(image, boxes):
+    """Copy of image with every (x, y, width, height) box filled with the mean color"""
+    image_height, image_width = image.shape[:2]
+    masked = image.copy()
+    fill = image.mean(axis=(0, 1))
+    for box in boxes:
+        x0, y0, x1, y1 = person_detector.crop_box(box, image_width, image_height, padding=0.1)
+        masked[y0:y1, x0:x1] = fill
+    return masked
+
+
+def analyze_fencers(image, pose_type, draw=True, max_side=None, tier=None, max_people=2, preview_side=None):
+    """
+    Multi-person analysis for bout photos: find the people, run pose on
+    each person's crop in parallel and evaluate every fencer on their own.
+    People the detector misses (it looks for upright pedestrians, so deep
+    lunges can slip through) are picked up by full-frame passes with the
+    fencers found so far masked out.
+    Parameters:
+        image: Decoded BGR image, or encoded image bytes
+        pose_type: 'en_garde', 'lunge' or 'auto' (classified per fencer)
+        draw: Render every fencer on one annotated image
+        max_side: Longest side to analyze and draw at, see analyze
+        tier: Speed tier, see analyze
+        max_people: Fencers to look for
+        preview_side: See analyze
+    Returns:
+        BoutAnalysis, with errors reported as by analyze. timings adds a
+        'people' stage for the person detector
+    """
+    source = image
+    clock = time.perf_counter
+    started = clock()
+    image, full_size = image_io.load_scaled_image(image, image_io.MAX_IMAGE_SIDE if max_side is None else max_side)
+    timings = {'decode': clock() - started}
+    if image is None:
+        return BoutAnalysis(pose_type, feedback=[READ_ERROR_MESSAGE], timings=timings, error=READ_ERROR)
+    error, _ = gate(image, timings)
+    if error is not None:
+        return BoutAnalysis(pose_type, feedback=[ERROR_MESSAGES[error]], image_size=full_size, timings=timings,
+                            error=error, inference_saved=pose_engine.expected_seconds(tier))
+    image_height, image_width = image.shape[:2]
+
+    started = clock()
+    people = person_detector.detect_people(image, max_people)
+    timings['people'] = clock() - started
+
+    started = clock()
+    records, boxes = [], []
+
+    def add(record):
+        if record is None:
+            return False
+        box = person_detector.landmark_box(record.landmarks, image_width, image_height)
+        # Overlapping crops can find the same person twice
+        if any(person_detector.overlap(box, other) >= 0.6 for other in boxes):
+            return False
+        records.append(record)
+        boxes.append(box)
+        return True
+
+    crops = [person_detector.crop_box(box, image_width, image_height) for box in people]
+    lookups = []
+    for record in _detect_crops(image, full_size, tier, crops, lookups):
+        if len(records) < max_people:
+            add(record)
+    while len(records) < max_people:
+        if not add(detect(_mask_people(image, boxes) if boxes else image, full_size, tier, lookups=lookups)):
+            break
+    timings['inference'] = clock() - started
+
+    if not records:
+        return BoutAnalysis(pose_type, feedback=[NO_POSE_MESSAGE], image_size=full_size, timings=timings,
+                            error=NO_POSE, cache_hit=all(lookups))
+
+    started = clock()
+    fencers = []
+    hips = [kinematics.LEFT_HIP, kinematics.RIGHT_HIP]
+    for record in sorted(records, key=lambda record: float(record.landmarks[hips, 0].mean())):
+        angles = measure(record)
+        fencer_pose_type, classification = resolve(pose_type, angles)
+        fencers.append(Fencer(record, angles, evaluate(fencer_pose_type, angles),
+                              person_detector.landmark_box(record.landmarks, *full_size),
+                              'right' if angles['facing_right'] else 'left', fencer_pose_type, classification))
+    timings['feedback'] = clock() - started
+
+    annotated_image = None
+    if draw:
+        started = clock()
+        annotated_image = image_io.downscale(image, preview_side)
+        if annotated_image is source:
+            annotated_image = image.copy()
+        scale = annotated_image.shape[1] / full_size[0]
+        for number, fencer in enumerate(fencers, 1):
+            # Each fencer's stance label sits above their "Fencer N" tag,
+            # not in the shared top-left corner
+            x, y = (int(v * scale) for v in fencer.box[:2])
+            tag_y = max(y - 10, 55)
+            label = stance_label(fencer.pose_type)
+            label_width = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 1, 2)[0][0]
+            label_x = max(0, min(x, annotated_image.shape[1] - label_width - 10))
+            renderer.draw_pose(annotated_image, fencer.record.landmarks, fencer.angles, label,
+                               (label_x, tag_y - 30))
+            cv2.putText(annotated_image, f"Fencer {number}", (x, tag_y),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
+        timings['drawing'] = clock() - started
+    return BoutAnalysis(pose_type, fencers, [], annotated_image, full_size, timings,
+                        cache_hit=all(lookups))
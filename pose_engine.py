@@ -0,0 +1,313 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+import kinematics
+import landmark_cache
+
+_mp_pose = None
+
+# Settings shared by the en-garde and lunge analyzers
+POSE_SETTINGS = {
+    'static_image_mode': True,
+    'model_complexity': 2,
+    'enable_segmentation': False,
+    'min_detection_confidence': 0.5,
+}
+
+# Video uses MediaPipe's tracking pipeline: full detection only runs when
+# tracking is lost, and the lighter model keeps up with real time on CPU
+TRACKING_SETTINGS = {
+    'static_image_mode': False,
+    'model_complexity': 1,
+    'smooth_landmarks': True,
+    'enable_segmentation': False,
+    'min_detection_confidence': 0.5,
+    'min_tracking_confidence': 0.5,
+}
+
+# Speed tiers: the BlazePose lite, full and heavy models. 'auto' runs lite
+# first and only escalates to heavy when the joints the feedback rules read
+# are poorly visible. Without POSE_TIER, POSE_SETTINGS decides.
+TIERS = {'lite': 0, 'full': 1, 'heavy': 2}
+AUTO_TIER = 'auto'
+DEFAULT_TIER = os.environ.get('POSE_TIER') or None
+AUTO_MIN_VISIBILITY = float(os.environ.get('AUTO_TIER_MIN_VISIBILITY', 0.5))
+
+# Joints read by the en-garde and lunge feedback rules
+FEEDBACK_JOINTS = [
+    kinematics.LEFT_SHOULDER, kinematics.RIGHT_SHOULDER, kinematics.LEFT_ELBOW, kinematics.RIGHT_ELBOW,
+    kinematics.LEFT_WRIST, kinematics.RIGHT_WRIST, kinematics.LEFT_HIP, kinematics.RIGHT_HIP,
+    kinematics.LEFT_KNEE, kinematics.RIGHT_KNEE, kinematics.LEFT_ANKLE, kinematics.RIGHT_ANKLE,
+]
+
+
+
+class IdlePool:
+    """
+    Long-lived model instances (MediaPipe graphs, OpenCV detectors) that are
+    not thread-safe, so each serves one thread at a time. The most recently
+    used idle instance is handed out first, and a new one is only built when
+    every existing one is busy.
+    """
+
+    def __init__(self, create):
+        self.create = create
+        self._idle = queue.LifoQueue()
+
+    @contextmanager
+    def acquire(self):
+        """Context manager yielding an idle instance, returned to the pool afterwards"""
+        try:
+            instance = self._idle.get_nowait()
+        except queue.Empty:
+            instance = self.create()
+        try:
+            yield instance
+        finally:
+            self._idle.put(instance)
+
+    def put(self, instance):
+        """Add an instance built ahead of time"""
+        self._idle.put(instance)
+
+    def idle(self):
+        return self._idle.qsize()
+
+
+# Pools of Pose instances per model complexity
+_pools = {}
+_lock = threading.Lock()
+_created = 0
+# Moving average of recent model runs per (complexity, pose found), in
+# seconds, so callers that skip the model can tell what they saved; without
+# a pose only the detector runs, which is much cheaper
+_model_seconds = {}
+
+
+def _pose_solution():
+    """
+    mediapipe.solutions.pose, imported on first use
+    Importing mediapipe takes most of a second, so tooling that never runs
+    the model does not pay for it; servers load it in warm_up.
+    """
+    global _mp_pose
+    if _mp_pose is None:
+        from mediapipe.python.solutions import pose
+        _mp_pose = pose
+    return _mp_pose
+
+
+def __getattr__(name):
+    # Keeps pose_engine.mp_pose working without importing mediapipe up front
+    if name == 'mp_pose':
+        return _pose_solution()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _settings(model_complexity):
+    if model_complexity is None:
+        return POSE_SETTINGS
+    return {**POSE_SETTINGS, 'model_complexity': model_complexity}
+
+
+def _pool(model_complexity):
+    with _lock:
+        pool = _pools.get(model_complexity)
+        if pool is None:
+            pool = _pools[model_complexity] = IdlePool(lambda: _create_pose(model_complexity))
+        return pool
+
+
+def _create_pose(model_complexity):
+    global _created
+    with _lock:
+        _created += 1
+    return _pose_solution().Pose(**_settings(model_complexity))
+
+
+def tier_complexities(tier=None):
+    """Model complexities a tier may run, in the order they are tried"""
+    tier = tier or DEFAULT_TIER
+    if tier is None:
+        return [POSE_SETTINGS['model_complexity']]
+    if tier == AUTO_TIER:
+        return [TIERS['lite'], TIERS['heavy']]
+    if tier not in TIERS:
+        raise ValueError(f"Unknown pose tier: {tier}")
+    return [TIERS[tier]]
+
+
+@contextmanager
+def acquire_pose(model_complexity=None):
+    """
+    Check out a long-lived Pose instance for the calling thread
+    MediaPipe graphs are not thread-safe, so each instance is used by one
+    thread at a time and returned to the idle pool afterwards. A new instance
+    is only built when every existing one is busy.
+    Parameters:
+        model_complexity: 0, 1 or 2, defaults to POSE_SETTINGS
+    Returns:
+        Context manager yielding a mp_pose.Pose
+    """
+    with _pool(_settings(model_complexity)['model_complexity']).acquire() as pose:
+        yield pose
+
+
+def create_tracking_pose(**overrides):
+    """
+    Build a Pose instance for a single video stream
+    Tracking state belongs to one stream, so these are never pooled; use
+    the instance as a context manager and close it when the stream ends.
+    Parameters:
+        overrides: Settings that replace TRACKING_SETTINGS entries
+    Returns:
+        mp_pose.Pose
+    """
+    return _pose_solution().Pose(**{**TRACKING_SETTINGS, **overrides})
+
+
+def process(image_rgb, model_complexity=None):
+    """
+    Run pose inference on an RGB image using a pooled Pose instance
+    Parameters:
+        image_rgb: RGB image as a numpy array
+        model_complexity: 0, 1 or 2, defaults to POSE_SETTINGS
+    Returns:
+        MediaPipe results object
+    """
+    model_complexity = _settings(model_complexity)['model_complexity']
+    with acquire_pose(model_complexity) as pose:
+        started = time.perf_counter()
+        results = pose.process(image_rgb)
+    elapsed = time.perf_counter() - started
+    key = model_complexity, results.pose_landmarks is not None
+    with _lock:
+        previous = _model_seconds.get(key)
+        _model_seconds[key] = elapsed if previous is None else 0.9 * previous + 0.1 * elapsed
+    return results
+
+
+def landmarks_to_array(pose_landmarks):
+    """Convert a NormalizedLandmarkList to a (33, 4) x, y, z, visibility array"""
+    return np.array([[lm.x, lm.y, lm.z, lm.visibility] for lm in pose_landmarks.landmark],
+                    dtype=np.float32)
+
+
+def array_to_landmarks(array):
+    """Rebuild a NormalizedLandmarkList from a (33, 4) array"""
+    from mediapipe.framework.formats import landmark_pb2
+
+    pose_landmarks = landmark_pb2.NormalizedLandmarkList()
+    for x, y, z, visibility in array.tolist():
+        pose_landmarks.landmark.add(x=x, y=y, z=z, visibility=visibility)
+    return pose_landmarks
+
+
+def detect_landmark_array(image_rgb, model_complexity=None):
+    """
+    Find pose landmarks, reusing earlier results for identical images
+    Parameters:
+        image_rgb: RGB image as a numpy array
+        model_complexity: 0, 1 or 2, defaults to POSE_SETTINGS
+    Returns:
+        Tuple of ((33, 4) float32 array of normalized x, y, z, visibility,
+        or None if no pose was detected; True if it came from the cache)
+    """
+    key = landmark_cache.make_key(image_rgb, _settings(model_complexity))
+    cached = landmark_cache.get(key)
+    cache_hit = cached is not None
+    if not cache_hit:
+        results = process(image_rgb, model_complexity)
+        cached = (landmarks_to_array(results.pose_landmarks) if results.pose_landmarks
+                  else landmark_cache.NO_POSE)
+        landmark_cache.put(key, cached)
+
+    if len(cached) == 0:
+        return None, cache_hit
+    return cached, cache_hit
+
+
+def feedback_visibility(landmarks):
+    """Lowest visibility among the joints the feedback rules read"""
+    return float(landmarks[FEEDBACK_JOINTS, 3].min())
+
+
+def detect_tiered(image_rgb, tier=None, lookups=None):
+    """
+    Find pose landmarks with the models of a speed tier
+    With 'auto' the lite model runs first, and the heavy model only when
+    lite finds no pose or a feedback joint is less visible than
+    AUTO_MIN_VISIBILITY.
+    Parameters:
+        image_rgb: RGB image as a numpy array
+        tier: 'lite', 'full', 'heavy' or 'auto', defaults to DEFAULT_TIER
+            (POSE_SETTINGS when unset)
+        lookups: Optional list; whether each model run was a landmark cache
+            hit is appended to it
+    Returns:
+        Tuple of (landmarks array, model complexity that produced it), or
+        (None, None) if no model found a pose
+    """
+    found = None, None
+    for model_complexity in tier_complexities(tier):
+        landmarks, cache_hit = detect_landmark_array(image_rgb, model_complexity)
+        if lookups is not None:
+            lookups.append(cache_hit)
+        if landmarks is None:
+            continue
+        found = landmarks, model_complexity
+        if feedback_visibility(landmarks) >= AUTO_MIN_VISIBILITY:
+            break
+    return found
+
+
+def expected_seconds(tier=None):
+    """
+    Typical model time of an image without a pose under a tier (every model
+    of the tier runs), from recent runs. Before any run without a pose, runs
+    that found one stand in; 0 before the first run
+    """
+    with _lock:
+        return sum(_model_seconds.get((model_complexity, False), _model_seconds.get((model_complexity, True), 0.0))
+                   for model_complexity in tier_complexities(tier))
+
+
+def detect_landmarks(image_rgb):
+    """
+    Same as detect_landmark_array, returned as a NormalizedLandmarkList
+    """
+    landmarks, _ = detect_landmark_array(image_rgb)
+    if landmarks is None:
+        return None
+    return array_to_landmarks(landmarks)
+
+
+def warm_up(instances=1, tier=None):
+    """
+    Build and pre-warm Pose instances so the first request does not pay
+    graph construction and model load
+    Parameters:
+        instances: Number of Pose instances per model to have ready in the pool
+        tier: Tier whose models to load, defaults to DEFAULT_TIER
+    """
+    blank = np.zeros((256, 256, 3), dtype=np.uint8)
+    for model_complexity in tier_complexities(tier):
+        pool = _pool(model_complexity)
+        poses = []
+        for _ in range(max(instances - pool.idle(), 0)):
+            pose = _create_pose(model_complexity)
+            pose.process(blank)
+            poses.append(pose)
+        for pose in poses:
+            pool.put(pose)
+
+
+def stats():
+    with _lock:
+        idle = {model_complexity: pool.idle() for model_complexity, pool in _pools.items()}
+    return {'instances': _created, 'idle': sum(idle.values()), 'idle_by_complexity': idle}
@@ -0,0 +1,178 @@
+import os
+
+import cv2
+import numpy as np
+
+import pose_engine
+
+# Cheap checks run before the pose model so uploads without a usable person
+# (blank frames, screenshots, bot traffic) are turned away in a few
+# milliseconds instead of after a full heavy-model pass. PRESENCE_GATE=0
+# sends everything to the model as before.
+ENABLED = os.environ.get('PRESENCE_GATE', '1').lower() not in ('0', 'false', 'no')
+# Longest side the person check runs at; MediaPipe's selfie segmentation
+# model reads 256 x 256, so more detail is only resized away
+GATE_SIDE = int(os.environ.get('PRESENCE_GATE_SIDE', 256))
+# Frames whose grey levels vary less than this (standard deviation on the
+# downscaled frame) are blank: lens cap, solid colour, failed capture
+MIN_CONTRAST = float(os.environ.get('PRESENCE_GATE_MIN_CONTRAST', 2.0))
+# Share of the gate frame that must look like a person; every photo the full
+# model found a pose in during tuning was above 0.25%, so this errs on letting
+# images through
+MIN_PERSON_FRACTION = float(os.environ.get('PRESENCE_GATE_MIN_PERSON', 0.001))
+PERSON_THRESHOLD = 0.5
+# The segmentation model cannot see people much under a third of the frame
+# height; locating a fencer for ROI inference then also searches a grid of
+# TILE_GRID x TILE_GRID overlapping tiles, each TILE_SIZE of the frame
+TILE_GRID = 3
+TILE_SIZE = 0.4
+
+# Error codes of rejected images
+BLANK_IMAGE = 'blank_image'
+NO_PERSON = 'no_person'
+
+_mp_segmentation = None
+
+
+def _segmentation_solution():
+    """mediapipe.solutions.selfie_segmentation, imported on first use"""
+    global _mp_segmentation
+    if _mp_segmentation is None:
+        from mediapipe.python.solutions import selfie_segmentation
+        _mp_segmentation = selfie_segmentation
+    return _mp_segmentation
+
+
+_segmenters = pose_engine.IdlePool(lambda: _segmentation_solution().SelfieSegmentation(model_selection=0))
+
+
+def acquire_segmenter():
+    """Check out a pooled selfie segmentation graph, building one only when all are busy"""
+    return _segmenters.acquire()
+
+
+def gate_frame(image):
+    """Copy of a BGR image downscaled to GATE_SIDE, or the image itself when already small"""
+    image_height, image_width = image.shape[:2]
+    scale = min(GATE_SIDE / max(image_height, image_width), 1.0)
+    if scale >= 1:
+        return image
+    return cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+def is_blank(image):
+    """True when an image has next to no contrast"""
+    _, deviation = cv2.meanStdDev(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+    return float(deviation[0, 0]) < MIN_CONTRAST
+
+
+def person_mask(image):
+    """
+    Pixels of an image segmented as a person
+    Parameters:
+        image: BGR image, best already reduced by gate_frame
+    Returns:
+        Boolean mask the size of the image
+    """
+    with acquire_segmenter() as segmenter:
+        mask = segmenter.process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB)).segmentation_mask
+    return mask > PERSON_THRESHOLD
+
+
+def mask_box(mask):
+    """
+    Box around the main person in a mask: the largest connected region plus
+    any other at least a quarter its size (a limb or blade the mask split
+    off, or a second fencer)
+    Returns:
+        (x, y, width, height) in mask pixels
+    """
+    count, _, regions, _ = cv2.connectedComponentsWithStats(mask.view(np.uint8), connectivity=8)
+    regions = regions[1:count]
+    areas = regions[:, cv2.CC_STAT_AREA]
+    kept = regions[areas * 4 >= areas.max()]
+    x0, y0 = kept[:, cv2.CC_STAT_LEFT].min(), kept[:, cv2.CC_STAT_TOP].min()
+    x1 = (kept[:, cv2.CC_STAT_LEFT] + kept[:, cv2.CC_STAT_WIDTH]).max()
+    y1 = (kept[:, cv2.CC_STAT_TOP] + kept[:, cv2.CC_STAT_HEIGHT]).max()
+    return int(x0), int(y0), int(x1 - x0), int(y1 - y0)
+
+
+def _tiled_box(image):
+    """
+    Person box found on overlapping tiles, for people too small to segment
+    in the whole frame; boxes from neighbouring tiles that overlap the best
+    one are merged, as a person can straddle a tile edge
+    Returns:
+        (x, y, width, height) in image pixels, or None
+    """
+    image_height, image_width = image.shape[:2]
+    tile_height, tile_width = int(image_height * TILE_SIZE), int(image_width * TILE_SIZE)
+    found = []  # (person pixels, box)
+    for y in np.linspace(0, image_height - tile_height, TILE_GRID).astype(int):
+        for x in np.linspace(0, image_width - tile_width, TILE_GRID).astype(int):
+            tile = gate_frame(image[y:y + tile_height, x:x + tile_width])
+            mask = person_mask(tile)
+            pixels = np.count_nonzero(mask)
+            if pixels >= MIN_PERSON_FRACTION * mask.size:
+                found.append((pixels, _scale_box(mask_box(mask), tile_width / tile.shape[1], x, y)))
+    if not found:
+        return None
+    best = max(found, key=lambda entry: entry[0])[1]
+    x0, y0, x1, y1 = best[0], best[1], best[0] + best[2], best[1] + best[3]
+    for _, (x, y, width, height) in found:
+        if x < x1 and x + width > x0 and y < y1 and y + height > y0:
+            x0, y0, x1, y1 = min(x0, x), min(y0, y), max(x1, x + width), max(y1, y + height)
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def _scale_box(box, scale, x_offset=0, y_offset=0):
+    x, y, width, height = box
+    return (x_offset + int(x * scale), y_offset + int(y * scale),
+            int(np.ceil(width * scale)), int(np.ceil(height * scale)))
+
+
+def screen(image, tiles=False):
+    """
+    Run the gate's checks and find where the person is, whether or not the
+    gate is enabled
+    Parameters:
+        image: Decoded BGR image, possibly downscaled
+        tiles: Search overlapping tiles when the whole frame shows no one,
+            to locate small people for ROI inference (costs about ten
+            segmentation passes on images without a person)
+    Returns:
+        Tuple of (None or the error code, (x, y, width, height) box around
+        the person in image pixels or None when rejected)
+    """
+    small = gate_frame(image)
+    if is_blank(small):
+        return BLANK_IMAGE, None
+    mask = person_mask(small)
+    if np.count_nonzero(mask) >= MIN_PERSON_FRACTION * mask.size:
+        return None, _scale_box(mask_box(mask), image.shape[1] / small.shape[1])
+    person = _tiled_box(image) if tiles else None
+    if person is None:
+        return NO_PERSON, None
+    return None, person
+
+
+def check(image):
+    """
+    Decide whether an image is worth running the pose model on
+    Parameters:
+        image: Decoded BGR image, possibly downscaled
+    Returns:
+        None when it may show a person, otherwise the error code
+        (BLANK_IMAGE or NO_PERSON)
+    """
+    if not ENABLED:
+        return None
+    return screen(image)[0]
+
+
+def warm_up():
+    """Load the segmentation model so the first upload does not pay for it"""
+    if not ENABLED:
+        return
+    with acquire_segmenter() as segmenter:
+        segmenter.process(np.zeros((GATE_SIDE, GATE_SIDE, 3), dtype=np.uint8))
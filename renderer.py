@@ -0,0 +1,176 @@
+"""
+Overlay rendering for analyzed poses
+Draws the same skeleton as mediapipe's draw_landmarks with the default pose
+style, plus the stance label and joint-angle arcs, without mediapipe: the
+style and connections are constants here, landmark geometry is computed
+with numpy (for a whole batch of video frames at once), and only the
+OpenCV drawing calls run per joint.
+"""
+
+import math
+
+import cv2
+import numpy as np
+
+import image_io
+import kinematics
+
+# mediapipe.solutions.drawing_styles.get_default_pose_landmarks_style():
+# landmarks on the left side orange, right side cyan, nose white (BGR)
+LEFT_COLOR = (0, 138, 255)
+RIGHT_COLOR = (231, 217, 0)
+WHITE = (224, 224, 224)
+BORDER_COLOR = (224, 224, 224)  # drawing_utils.WHITE_COLOR
+LANDMARK_THICKNESS = 2
+LANDMARK_RADIUS = 2
+BORDER_RADIUS = max(LANDMARK_RADIUS + 1, int(LANDMARK_RADIUS * 1.2))
+CONNECTION_COLOR = (224, 224, 224)
+CONNECTION_THICKNESS = 2
+VISIBILITY_THRESHOLD = 0.5
+
+_LEFT = [1, 2, 3, 7, 9, 11, 13, 15, 17, 19, 21, 23, 25, 27, 29, 31]
+LANDMARK_COLORS = [WHITE if index == 0 else LEFT_COLOR if index in _LEFT else RIGHT_COLOR
+                   for index in range(kinematics.NUM_LANDMARKS)]
+
+# mediapipe.solutions.pose.POSE_CONNECTIONS
+POSE_CONNECTIONS = np.array([
+    (0, 1), (0, 4), (1, 2), (2, 3), (3, 7), (4, 5), (5, 6), (6, 8), (9, 10), (11, 12), (11, 13), (11, 23),
+    (12, 14), (12, 24), (13, 15), (14, 16), (15, 17), (15, 19), (15, 21), (16, 18), (16, 20), (16, 22),
+    (17, 19), (18, 20), (23, 24), (23, 25), (24, 26), (25, 27), (26, 28), (27, 29), (27, 31), (28, 30),
+    (28, 32), (29, 31), (30, 32),
+])
+
+# Joints whose angles are drawn: (a, b, c, angle name), arc at b
+DRAWN_ANGLES = [
+    (kinematics.RIGHT_HIP, kinematics.RIGHT_KNEE, kinematics.RIGHT_ANKLE, 'right_knee'),
+    (kinematics.LEFT_HIP, kinematics.LEFT_KNEE, kinematics.LEFT_ANKLE, 'left_knee'),
+    (kinematics.RIGHT_SHOULDER, kinematics.RIGHT_ELBOW, kinematics.RIGHT_WRIST, 'right_elbow'),
+    (kinematics.LEFT_SHOULDER, kinematics.LEFT_ELBOW, kinematics.LEFT_WRIST, 'left_elbow'),
+]
+_ARC_A, _ARC_B, _ARC_C = (np.array(indices) for indices in zip(*[triple[:3] for triple in DRAWN_ANGLES]))
+ARC_RADIUS = 30
+ARC_COLOR = (255, 255, 0)
+ANGLE_TEXT_COLOR = (255, 0, 0)
+LABEL_COLOR = (0, 255, 0)
+LABEL_ORIGIN = (10, 30)  # baseline of the stance label, top-left corner
+
+
+def geometry(landmarks, image_width, image_height):
+    """
+    Everything the overlay needs in pixels, for one frame or a batch
+    Parameters:
+        landmarks: (33, 4) or (N, 33, 4) normalized x, y, z, visibility
+        image_width, image_height: Size of the canvas drawn on
+    Returns:
+        Dict of arrays with a leading frame axis: landmark pixels (N, 33, 2)
+        and whether each is drawn (N, 33); arc centers (N, 4, 2), start
+        angles and sweeps in degrees (N, 4)
+    """
+    landmarks = np.asarray(landmarks, dtype=np.float64).reshape(-1, kinematics.NUM_LANDMARKS, 4)
+    normalized = landmarks[..., :2]
+    size = np.array([image_width, image_height])
+
+    # As mediapipe's _normalized_to_pixel_coordinates: floor, clamp, and
+    # skip landmarks outside the image or below the visibility threshold
+    pixels = np.minimum(np.floor(normalized * size), size - 1).astype(np.int32)
+    drawn = ((landmarks[..., 3] >= VISIBILITY_THRESHOLD)
+             & (normalized >= 0).all(axis=-1) & (normalized <= 1).all(axis=-1))
+
+    # Arcs use truncated pixel coordinates, as draw_angle does
+    points = (normalized * size).astype(np.int32)
+    a, b, c = points[:, _ARC_A], points[:, _ARC_B], points[:, _ARC_C]
+    start = np.degrees(np.arctan2(a[..., 1] - b[..., 1], a[..., 0] - b[..., 0]))
+    sweep = np.degrees(np.arctan2(c[..., 1] - b[..., 1], c[..., 0] - b[..., 0])) - start
+    sweep = np.where(sweep > 180, sweep - 360, np.where(sweep < -180, sweep + 360, sweep))
+    return {'pixels': pixels, 'drawn': drawn, 'centers': b, 'start': start, 'sweep': sweep}
+
+
+def _draw(image, pixels, drawn, centers, start, sweep, texts, label, label_origin=LABEL_ORIGIN):
+    pixels = pixels.tolist()
+    drawn = drawn.tolist()
+    for first, second in POSE_CONNECTIONS.tolist():
+        if drawn[first] and drawn[second]:
+            cv2.line(image, pixels[first], pixels[second], CONNECTION_COLOR, CONNECTION_THICKNESS)
+    for index, point in enumerate(pixels):
+        if drawn[index]:
+            cv2.circle(image, point, BORDER_RADIUS, BORDER_COLOR, LANDMARK_THICKNESS)
+            cv2.circle(image, point, LANDMARK_RADIUS, LANDMARK_COLORS[index], LANDMARK_THICKNESS)
+
+    cv2.putText(image, label, label_origin, cv2.FONT_HERSHEY_SIMPLEX, 1, LABEL_COLOR, 2)
+
+    for (x, y), arc_start, arc_sweep, text in zip(centers.tolist(), start.tolist(), sweep.tolist(), texts):
+        cv2.ellipse(image, (x, y), (ARC_RADIUS, ARC_RADIUS), 0, arc_start, arc_start + arc_sweep, ARC_COLOR, 2)
+        cv2.putText(image, text, (x + 20, y - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.7, ANGLE_TEXT_COLOR, 2)
+
+
+def draw_angle(image, p1, p2, p3, text):
+    """Draw the arc of the angle p1-p2-p3 at p2 and its text, for pixel points"""
+    (x1, y1), (x2, y2), (x3, y3) = ((int(p[0]), int(p[1])) for p in (p1, p2, p3))
+    start = math.degrees(math.atan2(y1 - y2, x1 - x2))
+    sweep = math.degrees(math.atan2(y3 - y2, x3 - x2)) - start
+    if sweep > 180:
+        sweep -= 360
+    elif sweep < -180:
+        sweep += 360
+    cv2.ellipse(image, (x2, y2), (ARC_RADIUS, ARC_RADIUS), 0, start, start + sweep, ARC_COLOR, 2)
+    cv2.putText(image, text, (x2 + 20, y2 - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.7, ANGLE_TEXT_COLOR, 2)
+
+
+def angle_texts(angles):
+    """Labels of the drawn angles for one frame"""
+    return [f"{float(angles[name]):.1f} deg" for *_, name in DRAWN_ANGLES]
+
+
+def draw_pose(image, landmarks, angles, label, label_origin=LABEL_ORIGIN):
+    """
+    Draw skeleton, stance label and angle arcs onto image in place
+    Parameters:
+        image: BGR canvas showing the frame the landmarks belong to, any size
+        landmarks: (33, 4) normalized landmark array
+        angles: Dict with the DRAWN_ANGLES values, e.g. from pipeline.measure
+        label: Stance text
+        label_origin: (x, y) pixel baseline of the label, the top-left
+            corner by default; set it per pose when several share a frame
+    """
+    image_height, image_width = image.shape[:2]
+    shapes = geometry(landmarks, image_width, image_height)
+    _draw(image, *(shapes[key][0] for key in ('pixels', 'drawn', 'centers', 'start', 'sweep')),
+          angle_texts(angles), label, label_origin)
+
+
+def render(image, landmarks, angles, label, in_place=False, max_side=None):
+    """
+    Annotated copy of image, drawn on the image itself, or a smaller preview
+    Parameters:
+        image: BGR image
+        landmarks, angles, label: As for draw_pose
+        in_place: Draw on image itself; only for buffers the caller owns
+        max_side: Draw on a preview downscaled to this longest side instead
+            (the resize is the only copy made)
+    Returns:
+        Annotated BGR image
+    """
+    canvas = image_io.downscale(image, max_side) if max_side else image
+    if canvas is image and not in_place:
+        canvas = image.copy()
+    draw_pose(canvas, landmarks, angles, label)
+    return canvas
+
+
+def render_batch(frames, landmarks, angles, labels):
+    """
+    Draw overlays onto many same-sized frames in place, e.g. buffered video
+    frames; the geometry for all of them is computed in one numpy pass
+    Parameters:
+        frames: List of BGR frames
+        landmarks: (N, 33, 4) array or list of (33, 4) arrays, one per frame
+        angles: List of angle dicts, one per frame
+        labels: List of stance labels, one per frame
+    """
+    if not frames:
+        return
+    image_height, image_width = frames[0].shape[:2]
+    shapes = geometry(np.stack(landmarks), image_width, image_height)
+    for index, frame in enumerate(frames):
+        _draw(frame, *(shapes[key][index] for key in ('pixels', 'drawn', 'centers', 'start', 'sweep')),
+              angle_texts(angles[index]), labels[index])
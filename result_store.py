@@ -0,0 +1,68 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultStore:
+    """
+    Thread-safe, size-bounded store of results that expire after a TTL
+    The oldest entries are evicted first once max_items is reached, or once
+    the entries' sizes add up to more than max_bytes (the newest entry is
+    always kept, however large).
+    """
+
+    def __init__(self, max_items=256, ttl=600, max_bytes=0):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        while self._items:
+            key, (expires_at, _, _) = next(iter(self._items.items()))
+            if expires_at > now:
+                break
+            self._pop(key)
+
+    def _pop(self, key):
+        _, value, size = self._items.pop(key)
+        self._bytes -= size
+        return value
+
+    def put(self, key, value, size=0):
+        """
+        Store a value under key
+        Parameters:
+            size: Bytes the value holds, counted against max_bytes
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if key in self._items:
+                self._pop(key)
+            self._items[key] = (now + self.ttl, value, size)
+            self._bytes += size
+            while len(self._items) > self.max_items or (
+                    self.max_bytes and self._bytes > self.max_bytes and len(self._items) > 1):
+                self._pop(next(iter(self._items)))
+
+    def get(self, key):
+        """Return the stored value, or None if it is unknown or expired"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._items.get(key)
+            return entry[1] if entry is not None else None
+
+    def nbytes(self):
+        """Total size of the stored values, as given to put"""
+        with self._lock:
+            self._expire(time.monotonic())
+            return self._bytes
+
+    def __len__(self):
+        with self._lock:
+            self._expire(time.monotonic())
+            return len(self._items)
@@ -6,22 +6,13 @@ Run this script to start the Flask application
 
 import sys
 import os
+import time
+from importlib.util import find_spec
 
 def check_dependencies():
-    """Check if all required dependencies are installed"""
+    """Check if all required dependencies are installed, without importing them"""
     required_packages = ['flask', 'cv2', 'mediapipe', 'numpy', 'PIL']
-    missing_packages = []
-    
-    for package in required_packages:
-        try:
-            if package == 'cv2':
-                import cv2
-            elif package == 'PIL':
-                import PIL
-            else:
-                __import__(package)
-        except ImportError:
-            missing_packages.append(package)
+    missing_packages = [package for package in required_packages if find_spec(package) is None]
     
     if missing_packages:
         print("❌ Missing dependencies:")
@@ -45,12 +36,23 @@ def main():
     # Import and run the Flask app
     try:
         from app import app
+        import inference_pool
+        host = os.environ.get('HOST', '0.0.0.0')
+        port = int(os.environ.get('PORT', 5000))
+        debug = os.environ.get('FLASK_DEBUG', '1').lower() in ('1', 'true', 'yes')
+        # With the debug reloader, only the child process that serves
+        # requests loads the model
+        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true' or not debug:
+            print("🧠 Loading pose model in inference workers...")
+            started = time.perf_counter()
+            inference_pool.start()
+            print(f"✅ Pose model ready in {time.perf_counter() - started:.1f}s")
         print("🌐 Starting Flask server...")
-        print("📱 Open your browser and go to: http://localhost:5000")
+        print(f"📱 Open your browser and go to: http://localhost:{port}")
         print("⏹️  Press Ctrl+C to stop the server")
         print("-" * 50)
         
-        app.run(debug=True, host='0.0.0.0', port=5000)
+        app.run(debug=debug, host=host, port=port)
         
     except ImportError as e:
         print(f"❌ Error importing app: {e}")
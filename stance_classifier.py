@@ -0,0 +1,55 @@
+import numpy as np
+
+import criteria
+
+# pose_type that asks for the stance to be classified, and the label for
+# frames that are neither stance
+AUTO = 'auto'
+NO_STANCE = 'neither'
+
+# Each stance's typical angle ranges are the "profile" of its entry in
+# criteria.json, read from the angles kinematics.compute_angles already
+# produces. En garde bends both knees and keeps the front elbow bent; a
+# lunge straightens the back leg and the sword arm while the front knee
+# bends towards 90 degrees.
+# Degrees outside a range that cost a factor of e in the stance's score
+TOLERANCE = 20.0
+
+
+def stance_scores(angles):
+    """
+    Probability of each stance, vectorized over frames
+    Each stance with a profile scores exp(-sum((degrees outside range /
+    TOLERANCE)^2)), 'neither' takes what the best stance leaves, and all
+    are normalized to sum to 1. Every stance is scored in the same pass.
+    Parameters:
+        angles: Dict from kinematics.compute_angles (or pipeline.measure),
+            values shaped () or (N,)
+    Returns:
+        Dict of stance name (including NO_STANCE) to probability arrays
+    """
+    compiled = criteria.get()
+    scores = np.exp(-compiled.profile_distance(angles) / TOLERANCE ** 2)
+    neither = 1 - scores.max(axis=-1)
+    total = scores.sum(axis=-1) + neither
+    probabilities = {stance: scores[..., index] / total for index, stance in enumerate(compiled.classified_stances)}
+    probabilities[NO_STANCE] = neither / total
+    return probabilities
+
+
+def classify(angles):
+    """
+    Classify one pose as one of the stances in criteria.json, or neither
+    Parameters:
+        angles: Dict of angles for a single frame
+    Returns:
+        Dict with stance (e.g. 'en_garde', 'lunge' or 'neither'), confidence
+        (probability of that stance) and scores (every probability)
+    """
+    probabilities = {stance: float(probability) for stance, probability in stance_scores(angles).items()}
+    stance = max(probabilities, key=probabilities.get)
+    return {
+        'stance': stance,
+        'confidence': round(probabilities[stance], 3),
+        'scores': {name: round(probability, 3) for name, probability in probabilities.items()},
+    }
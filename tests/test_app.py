@@ -0,0 +1,40 @@
+import io
+
+import pytest
+
+import app as server
+
+
+@pytest.fixture
+def client():
+    server.app.config['TESTING'] = True
+    return server.app.test_client()
+
+
+def test_pose_type_is_read_from_the_query_string_too(client):
+    response = client.post('/analyze?pose_type=plank', data={'image': (io.BytesIO(b'x'), 'a.jpg')})
+
+    assert response.status_code == 400
+    assert response.get_json()['error_code'] == 'bad_request'
+
+
+def test_job_pose_type_is_read_from_the_query_string_too(client):
+    response = client.post('/jobs?pose_type=plank', data={'image': (io.BytesIO(b'x'), 'a.jpg')})
+
+    assert response.status_code == 400
+    assert 'pose_type' in response.get_json()['error']
+
+
+@pytest.mark.parametrize('data, error', [
+    ({'tier': 'fastest', 'images': (io.BytesIO(b'x'), 'a.jpg')}, 'tier'),
+    ({'pose_type': 'plank', 'images': (io.BytesIO(b'x'), 'a.jpg')}, 'pose_type'),
+    ({}, 'No images provided'),
+    ({'archive': (io.BytesIO(b'not a zip'), 'photos.zip')}, 'not a valid zip'),
+])
+def test_batch_rejects_bad_requests_with_400(client, data, error):
+    response = client.post('/analyze/batch', data=data)
+
+    assert response.status_code == 400
+    body = response.get_json()
+    assert body['error_code'] == 'bad_request'
+    assert error in body['error']
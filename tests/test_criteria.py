@@ -0,0 +1,119 @@
+import copy
+import json
+
+import numpy as np
+import pytest
+
+import criteria
+import kinematics
+import pipeline
+
+SIZE = 1000
+
+# Pixel positions of two facing-right poses; the front (right) side leads
+SITTING_GUARD = {
+    'right_shoulder': (500, 300), 'right_elbow': (400, 300), 'right_wrist': (400, 200),
+    'left_shoulder': (500, 300), 'left_elbow': (600, 350), 'left_wrist': (650, 400),
+    'right_hip': (500, 500), 'right_knee': (500, 700), 'right_ankle': (300, 700),
+    'left_hip': (500, 500), 'left_knee': (500, 700), 'left_ankle': (700, 500),
+}
+TEXTBOOK_LUNGE = {
+    'right_shoulder': (500, 300), 'right_elbow': (400, 300), 'right_wrist': (300, 300),
+    'left_shoulder': (500, 300), 'left_elbow': (575, 375), 'left_wrist': (650, 450),
+    'right_hip': (500, 500), 'right_knee': (500, 700), 'right_ankle': (300, 700),
+    'left_hip': (500, 500), 'left_knee': (650, 650), 'left_ankle': (800, 800),
+}
+
+
+def landmarks(pose):
+    array = np.zeros((kinematics.NUM_LANDMARKS, 4), dtype=np.float32)
+    array[:, 3] = 1.0
+    for joint, (x, y) in pose.items():
+        array[getattr(kinematics, joint.upper()), :2] = (x / SIZE, y / SIZE)
+    return array
+
+
+def feedback(pose, stance):
+    angles = pipeline.measure(pipeline.PoseRecord(landmarks(pose), SIZE, SIZE))
+    return pipeline.evaluate(stance, angles)
+
+
+@pytest.fixture(scope='module')
+def config():
+    with open(criteria.CRITERIA_PATH) as f:
+        return json.load(f)
+
+
+def test_shipped_file_compiles(config):
+    compiled = criteria.Criteria(config)
+
+    assert compiled.stances == ['en_garde', 'lunge']
+    assert compiled.titles == {'en_garde': 'En Garde', 'lunge': 'Lunge'}
+    assert compiled.classified_stances == ['en_garde', 'lunge']
+    assert len(compiled.rule_names) == len(compiled.rule_stances) == 13
+
+
+def test_en_garde_feedback():
+    assert feedback(SITTING_GUARD, 'en_garde') == [
+        "Front knee angle: 90.0 deg - You're sitting too low",
+        "Front forearm angle: 90.0 deg - Keep your arm up",
+    ]
+
+
+def test_lunge_feedback():
+    assert feedback(SITTING_GUARD, 'lunge') == [
+        "Back knee angle: 45.0 deg - Fully extend your back leg",
+        "Front elbow angle: 90.0 deg - Fully extend your arm",
+        "Arm-leg alignment: Back arm should be roughly parallel with the back leg",
+    ]
+    assert feedback(TEXTBOOK_LUNGE, 'lunge') == []
+
+
+def test_evaluate_all_matches_each_stance():
+    compiled = criteria.get()
+    angles = pipeline.measure(pipeline.PoseRecord(landmarks(SITTING_GUARD), SIZE, SIZE))
+
+    assert compiled.evaluate_all(angles) == {stance: compiled.evaluate(stance, angles)
+                                             for stance in compiled.stances}
+
+
+def rule(**overrides):
+    return {'name': 'knee', 'angle': 'front_knee', 'below': 90, 'message': "{value:.1f}", **overrides}
+
+
+@pytest.mark.parametrize('change, error', [
+    (lambda c: c.update(stances={}), 'no stances'),
+    (lambda c: c['stances']['lunge']['rules'].append(rule(angle='wingspan')), 'unknown angle'),
+    (lambda c: c['stances']['lunge']['rules'].append(rule(message='')), 'needs a name and a message'),
+    (lambda c: c['stances']['lunge']['rules'].append(rule(colour='red')), 'unknown keys'),
+    (lambda c: c['stances']['lunge']['rules'].append(rule(below=None, target=90)), 'target needs a tolerance'),
+    (lambda c: c['stances']['lunge']['rules'].append({'name': 'knee', 'angle': 'front_knee', 'message': 'x'}),
+     'needs below, above or target'),
+    (lambda c: c['stances']['lunge']['rules'].append(rule(message='{angle}')), 'bad message'),
+    (lambda c: c['stances']['lunge']['rules'].extend([rule(), rule()]), 'same name'),
+    (lambda c: c['stances']['lunge']['profile'].update(wingspan=[0, 1]), 'unknown angle'),
+    (lambda c: c['angles'].update(front_knee={'joints': ['hip', 'knee', 'ankle'], 'side': 'front'}),
+     'already defined'),
+    (lambda c: c['angles'].update(hand={'joints': ['elbow', 'wrist', 'finger'], 'side': 'front'}), 'three joints'),
+    (lambda c: c['angles'].update(hand={'joints': ['elbow', 'wrist', 'shoulder'], 'side': 'up'}), 'side'),
+])
+def test_malformed_criteria_are_rejected(config, change, error):
+    config = copy.deepcopy(config)
+    change(config)
+
+    with pytest.raises(ValueError, match=error):
+        criteria.Criteria(config)
+
+
+def test_custom_angles_follow_the_facing_direction(config):
+    config = copy.deepcopy(config)
+    config['angles']['back_hip'] = {'joints': ['shoulder', 'hip', 'knee'], 'side': 'back'}
+    config['stances']['lunge']['rules'].append(
+        {'name': 'back_hip', 'angle': 'back_hip', 'below': 170, 'message': "Back hip: {value:.1f} deg"})
+    compiled = criteria.Criteria(config)
+
+    points = landmarks(TEXTBOOK_LUNGE)[:, :2] * SIZE
+    angles = compiled.compute_angles(points, SIZE)
+
+    assert float(angles['back_hip']) == pytest.approx(135.0)
+    assert compiled.evaluate('lunge', angles) == ["Back hip: 135.0 deg"]
@@ -0,0 +1,47 @@
+import io
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+import image_io
+
+FULL_SIZE = (4000, 3000)
+MARKER = (2900, 700, 3100, 900)  # x0, y0, x1, y1 of a dark square
+
+
+def encoded_photo(orientation=None):
+    """JPEG of a light image with one dark square, optionally with an EXIF orientation tag"""
+    width, height = FULL_SIZE
+    pixels = np.full((height, width, 3), 220, dtype=np.uint8)
+    x0, y0, x1, y1 = MARKER
+    pixels[y0:y1, x0:x1] = 20
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, 'JPEG', quality=95, exif=exif)
+    return buffer.getvalue()
+
+
+def marker_center(image):
+    """Normalized (x, y) of the dark square's center, as landmarks are reported"""
+    ys, xs = np.nonzero(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) < 120)
+    height, width = image.shape[:2]
+    return np.array([(xs.mean() + 0.5) / width, (ys.mean() + 0.5) / height])
+
+
+@pytest.mark.parametrize('orientation, size', [(None, FULL_SIZE), (6, FULL_SIZE[::-1])])
+def test_scaled_decode_maps_back_to_the_full_image(orientation, size):
+    data = encoded_photo(orientation)
+
+    full, full_size = image_io.decode_scaled(data, 0)
+    scaled, scaled_size = image_io.decode_scaled(data, 1280)
+
+    assert full_size == scaled_size == size
+    assert (full.shape[1], full.shape[0]) == size
+    assert max(scaled.shape[:2]) == 1280
+    # Same normalized position, so angles measured at full_size agree
+    assert np.allclose(marker_center(scaled), marker_center(full), atol=1 / 1280)
+    assert np.allclose(marker_center(scaled) * scaled_size, marker_center(full) * full_size, atol=4)
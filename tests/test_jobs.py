@@ -0,0 +1,81 @@
+import http.server
+import threading
+import time
+
+import pytest
+
+import jobs
+
+
+@pytest.fixture(autouse=True)
+def fresh_jobs(monkeypatch):
+    for name, value in (('_threads', []), ('_active', {}), ('_stopped', False), ('_run_times', []),
+                        ('_counts', dict(jobs._counts))):
+        monkeypatch.setattr(jobs, name, value)
+    monkeypatch.setattr(jobs, '_held_bytes', 0)
+    jobs.configure(queue_size=10, concurrency=1, queue_bytes=1000, webhook_hosts=['127.0.0.1'])
+
+
+def test_stop_fails_queued_jobs_and_refuses_new_ones():
+    release = threading.Event()
+    started = threading.Event()
+    running = jobs.submit(lambda: started.set() or release.wait(5) and 'done')
+    assert started.wait(5)
+    queued = [jobs.submit(lambda: 'never run') for _ in range(3)]
+
+    assert jobs.stop() == 3
+    release.set()
+
+    for job_id in queued:
+        job = jobs.get(job_id)
+        assert job['status'] == 'failed'
+        assert job['error'] == 'Server is shutting down'
+    with pytest.raises(jobs.JobQueueFull):
+        jobs.submit(lambda: None)
+    jobs._queue.join()
+    assert jobs.get(running)['status'] == 'done'
+
+
+def test_queue_is_bounded_by_upload_bytes():
+    release = threading.Event()
+    # Nothing else is held, so a job over the budget is still taken
+    first = jobs.submit(lambda: release.wait(5) and 'done', size=5000)
+
+    with pytest.raises(jobs.JobQueueFull):
+        jobs.submit(lambda: 'done', size=1)
+    release.set()
+    jobs._queue.join()
+
+    assert jobs.get(first)['status'] == 'done'
+    assert jobs.stats()['held_bytes'] == 0
+    jobs.submit(lambda: 'done', size=1000)
+    jobs._queue.join()
+
+
+def test_webhooks_do_not_follow_redirects():
+    hits = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_POST(self):
+            hits.append(self.path)
+            self.rfile.read(int(self.headers['Content-Length']))
+            self.send_response(307 if self.path == '/hook' else 200)
+            self.send_header('Location', '/elsewhere')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.HTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        jobs.submit(lambda: 'done', f'http://127.0.0.1:{server.server_port}/hook')
+        deadline = time.monotonic() + 5
+        while jobs.stats()['webhooks_failed'] == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        server.shutdown()
+
+    assert hits == ['/hook']
+    assert jobs.stats()['webhooks_failed'] == 1
@@ -0,0 +1,35 @@
+import sys
+
+import numpy as np
+
+import landmark_archive
+
+
+def test_fault_table_round_trips_high_bit_masks(tmp_path):
+    rows = np.array([0, 7, 2 ** 40], dtype=np.int64)
+    faults = np.array([2 ** 63 + 1, 2 ** 53 + 1, 0], dtype=np.uint64)
+    path = tmp_path / 'faults.npy'
+
+    np.save(path, landmark_archive.fault_table(rows, faults))
+    loaded = np.load(path)
+
+    assert loaded.dtype == landmark_archive.FAULT_DTYPE
+    assert loaded['row'].tolist() == rows.tolist()
+    assert loaded['faults'].tolist() == faults.tolist()
+
+
+def test_rescore_output_keeps_integer_types(tmp_path, monkeypatch):
+    archive = landmark_archive.LandmarkArchive(str(tmp_path / 'poses'))
+    landmarks = np.random.default_rng(0).random((3, 33, 4), dtype=np.float32)
+    archive.append_many(landmarks, [(640, 480)] * 3, ['en_garde', 'lunge', 'neither'], 'ana')
+    output = tmp_path / 'faults.npy'
+
+    monkeypatch.setattr(sys, 'argv', ['landmark_archive.py', str(tmp_path / 'poses'), 'rescore',
+                                      '--output', str(output)])
+    landmark_archive.main()
+
+    saved = np.load(output)
+    _, faults = archive.rescore()
+    assert saved.dtype == landmark_archive.FAULT_DTYPE
+    assert saved['row'].tolist() == [0, 1, 2]
+    assert saved['faults'].tolist() == faults.tolist()
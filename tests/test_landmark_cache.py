@@ -0,0 +1,20 @@
+import threading
+
+import numpy as np
+
+import landmark_cache
+
+
+def test_concurrent_puts_of_one_key_leave_a_whole_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(landmark_cache, '_cache_dir', str(tmp_path))
+    landmarks = np.random.default_rng(0).random((33, 4), dtype=np.float32)
+    key = landmark_cache.make_key(np.zeros((4, 4, 3), dtype=np.uint8), {'model_complexity': 1})
+
+    threads = [threading.Thread(target=landmark_cache.put, args=(key, landmarks)) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert np.array_equal(np.load(landmark_cache._disk_path(key)), landmarks)
+    assert not list(tmp_path.rglob('*.tmp'))
@@ -0,0 +1,74 @@
+import numpy as np
+
+import kinematics
+import lunge_segmenter
+
+FPS = 30
+SIZE = (1000, 1000)
+
+
+def pose(width, arm_straight):
+    """Synthetic fencer facing right with the ankles width apart (normalized)"""
+    landmarks = np.zeros((kinematics.NUM_LANDMARKS, 4), dtype=np.float32)
+    landmarks[:, 3] = 1.0
+    front, back = 0.5 - width / 2, 0.5 + width / 2
+    landmarks[kinematics.LEFT_HIP, :2] = landmarks[kinematics.RIGHT_HIP, :2] = (0.5, 0.5)
+    landmarks[kinematics.RIGHT_KNEE, :2] = ((0.5 + front) / 2, 0.7)
+    landmarks[kinematics.LEFT_KNEE, :2] = ((0.5 + back) / 2, 0.7)
+    landmarks[kinematics.RIGHT_ANKLE, :2] = (front, 0.9)
+    landmarks[kinematics.LEFT_ANKLE, :2] = (back, 0.9)
+    landmarks[kinematics.RIGHT_SHOULDER, :2] = landmarks[kinematics.LEFT_SHOULDER, :2] = (0.5, 0.3)
+    landmarks[kinematics.RIGHT_ELBOW, :2] = (0.4, 0.3)
+    landmarks[kinematics.RIGHT_WRIST, :2] = (0.3, 0.3) if arm_straight else (0.4, 0.4)
+    landmarks[kinematics.LEFT_ELBOW, :2] = (0.6, 0.4)
+    landmarks[kinematics.LEFT_WRIST, :2] = (0.6, 0.5)
+    return landmarks
+
+
+def widths(lunges, rest_seconds=2.0):
+    """Stance widths of rest, then lunges (0.3 s drive, 0.2 s hold, 0.3 s recovery) each followed by rest"""
+    rest = [0.3] * int(rest_seconds * FPS)
+    drive = list(np.linspace(0.3, 0.8, int(0.3 * FPS)))
+    lunge = drive + [0.8] * int(0.2 * FPS) + drive[::-1]
+    return rest + (lunge + rest) * lunges
+
+
+def run(widths, arm_straight):
+    segmenter = lunge_segmenter.LungeSegmenter()
+    lunges = []
+    for frame, (width, straight) in enumerate(zip(widths, arm_straight)):
+        lunges += segmenter.update(frame, frame / FPS, pose(width, straight), SIZE)
+    return lunges + segmenter.finish()
+
+
+def test_repeated_lunges_are_segmented_alike():
+    stance = widths(3)
+    lunges = run(stance, [False] * len(stance))
+
+    assert len(lunges) == 3
+    assert all(lunge['recovered'] for lunge in lunges)
+    assert all(lunge['arm_lead_ms'] is None for lunge in lunges)
+    assert len({lunge['drive_ms'] for lunge in lunges}) == 1
+
+
+def test_arm_held_straight_does_not_carry_over_between_lunges():
+    stance = widths(3)
+    lunges = run(stance, [True] * len(stance))
+
+    assert len(lunges) == 3
+    leads = [lunge['arm_lead_ms'] for lunge in lunges]
+    assert leads == [leads[0]] * 3
+    assert 0 < leads[0] <= lunge_segmenter.MAX_ARM_LEAD_SECONDS * 1000
+    for lunge in lunges:
+        assert lunge['arm_extended_ms'] == round(lunge['start_ms'] - lunge['arm_lead_ms'], 1)
+
+
+def test_arm_extended_just_before_the_drive_leads_by_that_much():
+    stance = widths(1)
+    drive_frame = int(2.0 * FPS)
+    lunges = run(stance, [frame >= drive_frame - 9 for frame in range(len(stance))])
+
+    assert len(lunges) == 1
+    # Smoothing delays the elbow angle by a frame or two
+    assert abs(lunges[0]['arm_extended_ms'] - (drive_frame - 9) / FPS * 1000) <= 100
+    assert 0 < lunges[0]['arm_lead_ms'] < lunge_segmenter.MAX_ARM_LEAD_SECONDS * 1000
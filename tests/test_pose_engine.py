@@ -0,0 +1,31 @@
+import numpy as np
+
+import pose_engine
+
+
+def test_detect_landmark_array_reports_its_own_cache_hit():
+    image = np.full((64, 64, 3), 17, dtype=np.uint8)
+
+    assert pose_engine.detect_landmark_array(image, 1) == (None, False)
+    assert pose_engine.detect_landmark_array(image, 1) == (None, True)
+
+
+def test_detect_tiered_collects_lookups():
+    image = np.full((64, 64, 3), 23, dtype=np.uint8)
+    lookups = []
+
+    pose_engine.detect_tiered(image, 'full', lookups)
+    pose_engine.detect_tiered(image, 'full', lookups)
+
+    assert lookups == [False, True]
+
+
+def test_idle_pool_reuses_instances_and_builds_only_when_all_are_busy():
+    pool = pose_engine.IdlePool(object)
+
+    with pool.acquire() as first:
+        with pool.acquire() as second:
+            assert second is not first
+    assert pool.idle() == 2
+    with pool.acquire() as again:
+        assert again is first
@@ -0,0 +1,21 @@
+from result_store import ResultStore
+
+
+def test_oldest_entries_are_evicted_past_max_bytes():
+    store = ResultStore(max_items=10, ttl=60, max_bytes=100)
+    store.put('a', 'first', size=60)
+    store.put('b', 'second', size=30)
+    store.put('c', 'third', size=30)
+
+    assert store.get('a') is None
+    assert store.get('b') == 'second' and store.get('c') == 'third'
+    assert store.nbytes() == 60
+
+
+def test_newest_entry_is_kept_however_large():
+    store = ResultStore(max_items=10, ttl=60, max_bytes=100)
+    store.put('a', 'small', size=10)
+    store.put('b', 'huge', size=500)
+
+    assert store.get('a') is None
+    assert store.get('b') == 'huge'
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Video analysis of fencing footage
+Streams frames from a file, camera or URL through one tracking Pose instance
+and reports en-garde or lunge angles for every frame. Every frame with a
+pose is also labelled en_garde, lunge or neither, so lunges can be cut out
+of footage, and --lunges segments every lunge into start, full extension and
+recovery with per-lunge metrics (see lunge_segmenter).
+
+    python video.py bout.mp4 --pose-type lunge --output bout_annotated.mp4 --json frames.ndjson
+    python video.py session.mp4 --lunges lunges.ndjson
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import cv2
+
+import criteria
+import lunge_segmenter
+import pipeline
+import pose_engine
+import renderer
+import stance_classifier
+
+# Frames buffered for the annotated output, so overlay geometry is computed
+# for all of them in one numpy pass
+RENDER_BATCH = 8
+
+
+def open_capture(source):
+    """
+    Open a video file, stream URL or camera index
+    Parameters:
+        source: Path, URL, or integer camera index (a digit string also works)
+    Returns:
+        cv2.VideoCapture
+    """
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise ValueError(f"Could not open video source: {source}")
+    return capture
+
+
+def iter_frames(capture):
+    """Yield (frame index, timestamp in ms, BGR frame) one frame at a time"""
+    index = 0
+    while True:
+        ok, frame = capture.read()
+        if not ok:
+            return
+        yield index, capture.get(cv2.CAP_PROP_POS_MSEC), frame
+        index += 1
+
+
+def analyze_video(source, pose_type, output_path=None, segmenter=None, **pose_settings):
+    """
+    Analyze every frame of a video as it is read
+    Only the current frame is held in memory (up to RENDER_BATCH frames
+    while writing an annotated video), so arbitrarily long footage and live
+    streams can be processed.
+    Parameters:
+        source: Path, URL or camera index
+        pose_type: 'en_garde', 'lunge', or 'auto' to give each frame the
+            feedback of its classified stance
+        output_path: Optional path of an annotated .mp4 to write
+        segmenter: Optional lunge_segmenter.LungeSegmenter fed every frame;
+            call its finish() once the frames run out
+        pose_settings: Overrides for pose_engine.TRACKING_SETTINGS
+    Yields:
+        Dict per frame with frame index, time_ms, detected, stance and
+        stance_confidence (from stance_classifier), angles and feedback,
+        plus the lunges the segmenter completed at that frame when given
+    """
+    capture = open_capture(source)
+    writer = None
+    pending = []  # (frame, landmarks, angles, label) awaiting annotation and writing
+
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        if output_path:
+            size = (int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)), int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+            writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+
+        with pose_engine.create_tracking_pose(**pose_settings) as pose:
+            for index, time_ms, frame in iter_frames(capture):
+                image_height, image_width, _ = frame.shape
+                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                frame_rgb.flags.writeable = False
+                results = pose.process(frame_rgb)
+
+                record = {'frame': index, 'time_ms': round(time_ms, 1),
+                          'detected': results.pose_landmarks is not None,
+                          'stance': None, 'stance_confidence': None, 'angles': None, 'feedback': []}
+
+                landmarks = None
+                if results.pose_landmarks:
+                    landmarks = pose_engine.landmarks_to_array(results.pose_landmarks)
+                    pose_record = pipeline.PoseRecord(landmarks, image_width, image_height)
+                    angles = pipeline.measure(pose_record)
+                    classification = stance_classifier.classify(angles)
+                    record['stance'] = classification['stance']
+                    record['stance_confidence'] = classification['confidence']
+                    frame_pose_type = classification['stance'] if pose_type == stance_classifier.AUTO else pose_type
+                    record['angles'] = {name: round(value, 1) if isinstance(value, float) else value
+                                        for name, value in angles.items()}
+                    record['feedback'] = pipeline.evaluate(frame_pose_type, angles)
+                    if writer is not None:
+                        pending.append((frame, landmarks, angles, pipeline.stance_label(frame_pose_type)))
+
+                if segmenter is not None:
+                    # Cameras report no position, so fall back to the frame rate
+                    time_s = time_ms / 1000 if time_ms > 0 or index == 0 else index / fps
+                    record['lunges'] = segmenter.update(index, time_s, landmarks, (image_width, image_height))
+
+                if writer is not None:
+                    if not pending or pending[-1][0] is not frame:
+                        pending.append((frame, None, None, None))
+                    if len(pending) >= RENDER_BATCH:
+                        _write_frames(writer, pending)
+
+                yield record
+
+            if writer is not None:
+                _write_frames(writer, pending)
+    finally:
+        capture.release()
+        if writer is not None:
+            writer.release()
+
+
+def _write_frames(writer, pending):
+    # The frames are ours, so the overlays are drawn on them in place
+    posed = [item for item in pending if item[1] is not None]
+    if posed:
+        renderer.render_batch(*(list(column) for column in zip(*posed)))
+    for frame, *_ in pending:
+        writer.write(frame)
+    pending.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze fencing video frame by frame")
+    parser.add_argument('source', help="Video file, stream URL or camera index")
+    parser.add_argument('--pose-type', choices=criteria.get().stances + [stance_classifier.AUTO], default='lunge',
+                        help="Stance to give feedback for; 'auto' follows each frame's classified stance")
+    parser.add_argument('--output', help="Write an annotated video to this .mp4 path")
+    parser.add_argument('--json', help="Write per-frame results as NDJSON to this path ('-' for stdout)")
+    parser.add_argument('--lunges', help="Detect lunges and write one JSON line per lunge to this path ('-' for stdout)")
+    parser.add_argument('--model-complexity', type=int, choices=[0, 1, 2],
+                        default=pose_engine.TRACKING_SETTINGS['model_complexity'])
+    args = parser.parse_args()
+
+    json_file = None
+    if args.json == '-':
+        json_file = sys.stdout
+    elif args.json:
+        json_file = open(args.json, 'w')
+
+    lunge_file = None
+    if args.lunges == '-':
+        lunge_file = sys.stdout
+    elif args.lunges:
+        lunge_file = open(args.lunges, 'w')
+    segmenter = lunge_segmenter.LungeSegmenter() if lunge_file is not None else None
+
+    frames = detected = lunges = 0
+    stances = {}
+    start = time.perf_counter()
+    try:
+        for record in analyze_video(args.source, args.pose_type, args.output, segmenter,
+                                    model_complexity=args.model_complexity):
+            frames += 1
+            for lunge in record.pop('lunges', []):
+                lunges += 1
+                lunge_file.write(json.dumps(lunge) + '\n')
+            detected += record['detected']
+            if record['stance'] is not None:
+                stances[record['stance']] = stances.get(record['stance'], 0) + 1
+            if json_file is not None:
+                json_file.write(json.dumps(record) + '\n')
+        if segmenter is not None:
+            for lunge in segmenter.finish():
+                lunges += 1
+                lunge_file.write(json.dumps(lunge) + '\n')
+    finally:
+        for output_file in (json_file, lunge_file):
+            if output_file is not None and output_file is not sys.stdout:
+                output_file.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Processed {frames} frames in {elapsed:.1f}s ({frames / max(elapsed, 1e-9):.1f} fps), "
+          f"pose found in {detected}", file=sys.stderr)
+    if segmenter is not None:
+        print(f"Lunges detected: {lunges}", file=sys.stderr)
+    if stances:
+        print("Frames by stance: " + ", ".join(f"{stance} {count}" for stance, count in sorted(stances.items())),
+              file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()